@@ -0,0 +1,95 @@
+"""
+/debug コマンド
+Botの内部状態(トレースなど)を表示します
+"""
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+from utils.logger import get_logger
+from utils.tracing import tracer
+
+logger = get_logger()
+
+
+class Debug(commands.Cog):
+    """
+    デバッグコマンドのCog
+    """
+    
+    debug = app_commands.Group(
+        name="debug",
+        description="Botの内部状態を表示します"
+    )
+    
+    def __init__(self, bot):
+        """
+        初期化
+        
+        Args:
+            bot: Botインスタンス
+        """
+        self.bot = bot
+    
+    @debug.command(name="trace", description="コマンドの処理時間の内訳(トレース)を表示します", extras={"defer_ephemeral": True})
+    @app_commands.describe(
+        mode="表示するトレースの種類",
+        count="表示する件数"
+    )
+    @app_commands.choices(
+        mode=[
+            app_commands.Choice(name="直近", value="recent"),
+            app_commands.Choice(name="遅い順", value="slowest")
+        ]
+    )
+    @app_commands.checks.has_permissions(administrator=True)
+    async def trace(
+        self,
+        interaction: discord.Interaction,
+        mode: app_commands.Choice[str] = None,
+        count: app_commands.Range[int, 1, 10] = 3
+    ):
+        """
+        トレース表示コマンドのメイン処理
+        
+        Args:
+            interaction: インタラクション
+            mode: 直近/遅い順
+            count: 表示件数
+        """
+        if mode is None or mode.value == 'recent':
+            spans = tracer.recent(count)
+            title = "直近のトレース"
+        else:
+            spans = tracer.slowest(count)
+            title = "最も遅いトレース"
+        
+        if not spans:
+            await interaction.response.send_message("📭 記録されたトレースはありません。", ephemeral=True)
+            return
+        
+        lines = []
+        for span in spans:
+            lines.extend(span.format())
+            lines.append("")
+        
+        # Discordのメッセージ上限(2000文字)に収める
+        text = "\n".join(lines)
+        if len(text) > 1900:
+            text = text[:1900] + "\n…"
+        
+        await interaction.response.send_message(
+            f"🔍 **{title}**\n```\n{text}\n```",
+            ephemeral=True
+        )
+        logger.info(f'{interaction.user.name}がトレースを表示しました ({title})')
+
+
+async def setup(bot):
+    """
+    Cogのセットアップ
+    
+    Args:
+        bot: Botインスタンス
+    """
+    await bot.add_cog(Debug(bot))
@@ -6,9 +6,8 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-import json
+from utils.guild_settings import ROLE_COLUMNS
 from utils.logger import get_logger
-from utils.database import Database
 
 logger = get_logger()
 
@@ -26,13 +25,7 @@ class Role(commands.Cog):
             bot: Botインスタンス
         """
         self.bot = bot
-        self.db = Database()
-    
-    async def cog_load(self):
-        """
-        Cog読み込み時の処理
-        """
-        await self.db.initialize()
+        self.db = bot.db
     
     @app_commands.command(name="role", description="管理者ロールとBotロールの管理")
     @app_commands.describe(
@@ -68,22 +61,14 @@ class Role(commands.Cog):
             role: 対象ロール
         """
         # データベースのカラム名を決定
-        column_name = 'admin_role_ids' if role_type.value == 'administrator' else 'bot_role_ids'
+        column_name = ROLE_COLUMNS[role_type.value]
         
         try:
-            # 現在の設定を取得
-            cursor = await self.db.connection.execute(f'''
-                SELECT {column_name} FROM guild_settings
-                WHERE guild_id = ?
-            ''', (interaction.guild_id,))
-            
-            row = await cursor.fetchone()
+            # 現在の設定を取得(キャッシュ)
+            settings = await self.db.guild_settings.get(interaction.guild_id)
             
             # 現在のロールIDリストを取得
-            if row and row[0]:
-                role_ids = json.loads(row[0])
-            else:
-                role_ids = []
+            role_ids = set(settings[column_name])
             
             # 操作に応じて処理
             if operation.value == 'add':
@@ -96,17 +81,10 @@ class Role(commands.Cog):
                     return
                 
                 # ロールIDを追加
-                role_ids.append(role.id)
-                
-                # データベースに保存
-                await self.db.connection.execute(f'''
-                    INSERT INTO guild_settings (guild_id, {column_name})
-                    VALUES (?, ?)
-                    ON CONFLICT(guild_id) DO UPDATE SET
-                        {column_name} = ?
-                ''', (interaction.guild_id, json.dumps(role_ids), json.dumps(role_ids)))
+                role_ids.add(role.id)
                 
-                await self.db.connection.commit()
+                # データベースに保存(キャッシュも更新される)
+                await self.db.guild_settings.set_role_ids(interaction.guild_id, role_type.value, role_ids)
                 
                 # 成功メッセージ
                 embed = discord.Embed(
@@ -134,14 +112,8 @@ class Role(commands.Cog):
                 # ロールIDを削除
                 role_ids.remove(role.id)
                 
-                # データベースに保存
-                await self.db.connection.execute(f'''
-                    UPDATE guild_settings
-                    SET {column_name} = ?
-                    WHERE guild_id = ?
-                ''', (json.dumps(role_ids), interaction.guild_id))
-                
-                await self.db.connection.commit()
+                # データベースに保存(キャッシュも更新される)
+                await self.db.guild_settings.set_role_ids(interaction.guild_id, role_type.value, role_ids)
                 
                 # 成功メッセージ
                 embed = discord.Embed(
@@ -9,7 +9,6 @@ from discord.ext import commands
 import os
 from datetime import datetime
 from utils.logger import get_logger
-from utils.database import Database
 
 logger = get_logger()
 
@@ -27,13 +26,7 @@ class Info(commands.Cog):
             bot: Botインスタンス
         """
         self.bot = bot
-        self.db = Database()
-    
-    async def cog_load(self):
-        """
-        Cog読み込み時の処理
-        """
-        await self.db.initialize()
+        self.db = bot.db
     
     @app_commands.command(name="info", description="Bot、管理者、ユーザー、サーバーの情報を表示します")
     @app_commands.describe(
@@ -8,7 +8,6 @@ from discord import app_commands
 from discord.ext import commands
 from datetime import datetime
 from utils.logger import get_logger
-from utils.database import Database
 
 logger = get_logger()
 
@@ -26,13 +25,7 @@ class Logs(commands.Cog):
             bot: Botインスタンス
         """
         self.bot = bot
-        self.db = Database()
-    
-    async def cog_load(self):
-        """
-        Cog読み込み時の処理
-        """
-        await self.db.initialize()
+        self.db = bot.db
     
     @app_commands.command(name="logs", description="ログチャンネルの設定を行います")
     @app_commands.describe(
@@ -133,24 +126,8 @@ class Logs(commands.Cog):
         else:
             # 通常モード: ログチャンネルを設定
             try:
-                # データベースのカラム名を決定
-                column_map = {
-                    'public': 'public_log_channel_id',
-                    'private': 'private_log_channel_id',
-                    'report': 'report_log_channel_id'
-                }
-                
-                column = column_map[log_type.value]
-                
-                # データベースに保存
-                await self.db.connection.execute(f'''
-                    INSERT INTO guild_settings (guild_id, {column})
-                    VALUES (?, ?)
-                    ON CONFLICT(guild_id) DO UPDATE SET
-                        {column} = ?
-                ''', (interaction.guild_id, channel.id, channel.id))
-                
-                await self.db.connection.commit()
+                # データベースに保存(キャッシュも更新される)
+                await self.db.guild_settings.set_log_channel(interaction.guild_id, log_type.value, channel.id)
                 
                 # 成功メッセージ
                 log_type_names = {
@@ -8,7 +8,6 @@ from discord import app_commands
 from discord.ext import commands
 from datetime import datetime
 from utils.logger import get_logger
-from utils.database import Database
 
 logger = get_logger()
 
@@ -18,10 +17,7 @@ class Ban(commands.Cog):
     
     def __init__(self, bot):
         self.bot = bot
-        self.db = Database()
-    
-    async def cog_load(self):
-        await self.db.initialize()
+        self.db = bot.db
     
     @app_commands.command(name="ban", description="指定したユーザーをBANします")
     @app_commands.describe(
@@ -72,24 +68,56 @@ class Ban(commands.Cog):
             )
             return
         
+        # DMを先に送るため、権限不足で失敗する操作は事前に断る
+        me = interaction.guild.me
+        if (not me.guild_permissions.ban_members or user.id == interaction.guild.owner_id
+                or user.top_role >= me.top_role):
+            await interaction.response.send_message(
+                "❌ BANの権限がありません。",
+                ephemeral=True
+            )
+            return
+        
         reason_text = reason.name if reason.value != "other" else other_reason
         
         try:
+            # 対象ユーザーへのDM通知
+            # BAN後は共通のサーバーが無くなりDMを送れないため、BANの前に優先して送信する
+            # (期限内に送れなかった場合は送信キューから再試行)
+            dm_embed = discord.Embed(
+                title="🔨 BAN通知",
+                description=f"{interaction.guild.name}でBANされました。",
+                color=discord.Color.red(),
+                timestamp=datetime.now()
+            )
+            dm_embed.add_field(name="理由", value=reason_text, inline=False)
+            await self.bot.dm_notifier.send_now(
+                interaction.guild_id,
+                user.id,
+                dm_embed,
+                f'ban:{interaction.guild_id}:{user.id}'
+            )
+            
             await user.ban(reason=reason_text)
             
             # モデレーションログ
-            await self.db.connection.execute('''
-                INSERT INTO moderation_logs
-                (guild_id, moderator_id, target_id, action_type, reason)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (
-                interaction.guild_id,
-                interaction.user.id,
-                user.id,
-                'ban',
-                reason_text
-            ))
-            await self.db.connection.commit()
+            async with self.db.transaction() as connection:
+                await connection.execute('''
+                    INSERT INTO moderation_logs
+                    (guild_id, moderator_id, target_id, action_type, reason)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (
+                    interaction.guild_id,
+                    interaction.user.id,
+                    user.id,
+                    'ban',
+                    reason_text
+                ))
+                await self.db.record_activity(
+                    interaction.guild_id,
+                    'moderation:ban',
+                    connection=connection
+                )
             
             embed = discord.Embed(
                 title="🔨 BAN実行",
@@ -103,17 +131,8 @@ class Ban(commands.Cog):
             
             await interaction.response.send_message(embed=embed)
             
-            try:
-                dm_embed = discord.Embed(
-                    title="🔨 BAN通知",
-                    description=f"{interaction.guild.name}でBANされました。",
-                    color=discord.Color.red(),
-                    timestamp=datetime.now()
-                )
-                dm_embed.add_field(name="理由", value=reason_text, inline=False)
-                await user.send(embed=dm_embed)
-            except discord.Forbidden:
-                logger.warning(f'{user.name}へのDM送信に失敗しました(BAN通知)')
+            # 処罰の記録をログチャンネル(非公開)に送信する
+            self.bot.log_sink.log(interaction.guild, 'private', embed.copy())
             
             logger.info(f'{interaction.user.name}が{user.name}をBANしました (理由: {reason_text})')
         
@@ -170,18 +189,23 @@ class Ban(commands.Cog):
             
             await interaction.guild.unban(user.user, reason=reason_text)
             
-            await self.db.connection.execute('''
-                INSERT INTO moderation_logs
-                (guild_id, moderator_id, target_id, action_type, reason)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (
-                interaction.guild_id,
-                interaction.user.id,
-                user.user.id,
-                'unban',
-                reason_text
-            ))
-            await self.db.connection.commit()
+            async with self.db.transaction() as connection:
+                await connection.execute('''
+                    INSERT INTO moderation_logs
+                    (guild_id, moderator_id, target_id, action_type, reason)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (
+                    interaction.guild_id,
+                    interaction.user.id,
+                    user.user.id,
+                    'unban',
+                    reason_text
+                ))
+                await self.db.record_activity(
+                    interaction.guild_id,
+                    'moderation:unban',
+                    connection=connection
+                )
             
             embed = discord.Embed(
                 title="✅ BAN解除",
@@ -195,17 +219,23 @@ class Ban(commands.Cog):
             
             await interaction.response.send_message(embed=embed)
             
-            try:
-                dm_embed = discord.Embed(
-                    title="✅ BAN解除通知",
-                    description=f"{interaction.guild.name}でBANが解除されました。",
-                    color=discord.Color.green(),
-                    timestamp=datetime.now()
-                )
-                dm_embed.add_field(name="理由", value=reason_text, inline=False)
-                await user.user.send(embed=dm_embed)
-            except discord.Forbidden:
-                logger.warning(f'{user.user.name}へのDM送信に失敗しました(BAN解除通知)')
+            # 処罰の記録をログチャンネル(非公開)に送信する
+            self.bot.log_sink.log(interaction.guild, 'private', embed.copy())
+            
+            # 対象ユーザーへのDM通知(送信キュー経由でバックグラウンド送信)
+            dm_embed = discord.Embed(
+                title="✅ BAN解除通知",
+                description=f"{interaction.guild.name}でBANが解除されました。",
+                color=discord.Color.green(),
+                timestamp=datetime.now()
+            )
+            dm_embed.add_field(name="理由", value=reason_text, inline=False)
+            await self.bot.dm_notifier.enqueue(
+                interaction.guild_id,
+                user.user.id,
+                dm_embed,
+                f'unban:{interaction.guild_id}:{user.user.id}'
+            )
             
             logger.info(f'{interaction.user.name}が{user.user.name}のBANを解除しました (理由: {reason_text})')
         
@@ -8,7 +8,6 @@ from discord import app_commands
 from discord.ext import commands
 from datetime import datetime
 from utils.logger import get_logger
-from utils.database import Database
 
 logger = get_logger()
 
@@ -18,10 +17,7 @@ class Kick(commands.Cog):
     
     def __init__(self, bot):
         self.bot = bot
-        self.db = Database()
-    
-    async def cog_load(self):
-        await self.db.initialize()
+        self.db = bot.db
     
     @app_commands.command(name="kick", description="指定したユーザーをキックします")
     @app_commands.describe(
@@ -72,24 +68,56 @@ class Kick(commands.Cog):
             )
             return
         
+        # DMを先に送るため、権限不足で失敗する操作は事前に断る
+        me = interaction.guild.me
+        if (not me.guild_permissions.kick_members or user.id == interaction.guild.owner_id
+                or user.top_role >= me.top_role):
+            await interaction.response.send_message(
+                "❌ キックの権限がありません。",
+                ephemeral=True
+            )
+            return
+        
         reason_text = reason.name if reason.value != "other" else other_reason
         
         try:
+            # 対象ユーザーへのDM通知
+            # キック後は共通のサーバーが無くなりDMを送れないため、キックの前に優先して送信する
+            # (期限内に送れなかった場合は送信キューから再試行)
+            dm_embed = discord.Embed(
+                title="👢 キック通知",
+                description=f"{interaction.guild.name}でキックされました。",
+                color=discord.Color.orange(),
+                timestamp=datetime.now()
+            )
+            dm_embed.add_field(name="理由", value=reason_text, inline=False)
+            await self.bot.dm_notifier.send_now(
+                interaction.guild_id,
+                user.id,
+                dm_embed,
+                f'kick:{interaction.guild_id}:{user.id}'
+            )
+            
             await user.kick(reason=reason_text)
             
             # モデレーションログ
-            await self.db.connection.execute('''
-                INSERT INTO moderation_logs
-                (guild_id, moderator_id, target_id, action_type, reason)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (
-                interaction.guild_id,
-                interaction.user.id,
-                user.id,
-                'kick',
-                reason_text
-            ))
-            await self.db.connection.commit()
+            async with self.db.transaction() as connection:
+                await connection.execute('''
+                    INSERT INTO moderation_logs
+                    (guild_id, moderator_id, target_id, action_type, reason)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (
+                    interaction.guild_id,
+                    interaction.user.id,
+                    user.id,
+                    'kick',
+                    reason_text
+                ))
+                await self.db.record_activity(
+                    interaction.guild_id,
+                    'moderation:kick',
+                    connection=connection
+                )
             
             embed = discord.Embed(
                 title="👢 キック実行",
@@ -103,17 +131,8 @@ class Kick(commands.Cog):
             
             await interaction.response.send_message(embed=embed)
             
-            try:
-                dm_embed = discord.Embed(
-                    title="👢 キック通知",
-                    description=f"{interaction.guild.name}でキックされました。",
-                    color=discord.Color.orange(),
-                    timestamp=datetime.now()
-                )
-                dm_embed.add_field(name="理由", value=reason_text, inline=False)
-                await user.send(embed=dm_embed)
-            except discord.Forbidden:
-                logger.warning(f'{user.name}へのDM送信に失敗しました(キック通知)')
+            # 処罰の記録をログチャンネル(非公開)に送信する
+            self.bot.log_sink.log(interaction.guild, 'private', embed.copy())
             
             logger.info(f'{interaction.user.name}が{user.name}をキックしました (理由: {reason_text})')
         
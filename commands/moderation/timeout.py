@@ -8,7 +8,6 @@ from discord import app_commands
 from discord.ext import commands
 from datetime import timedelta, datetime
 from utils.logger import get_logger
-from utils.database import Database
 
 logger = get_logger()
 
@@ -26,13 +25,7 @@ class Timeout(commands.Cog):
             bot: Botインスタンス
         """
         self.bot = bot
-        self.db = Database()
-    
-    async def cog_load(self):
-        """
-        Cog読み込み時の処理
-        """
-        await self.db.initialize()
+        self.db = bot.db
     
     @app_commands.command(name="timeout", description="指定したユーザーをタイムアウトします")
     @app_commands.describe(
@@ -116,29 +109,33 @@ class Timeout(commands.Cog):
             await user.timeout(duration, reason=reason_text)
             
             # データベースに記録
-            await self.db.connection.execute('''
-                INSERT INTO user_stats (guild_id, user_id, timeout_count, last_updated)
-                VALUES (?, ?, 1, ?)
-                ON CONFLICT(guild_id, user_id) DO UPDATE SET
-                    timeout_count = timeout_count + 1,
-                    last_updated = ?
-            ''', (interaction.guild_id, user.id, datetime.now(), datetime.now()))
-            
-            # モデレーションログに記録
-            await self.db.connection.execute('''
-                INSERT INTO moderation_logs
-                (guild_id, moderator_id, target_id, action_type, reason, duration)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
-                interaction.guild_id,
-                interaction.user.id,
-                user.id,
-                'timeout',
-                reason_text,
-                minutes
-            ))
-            
-            await self.db.connection.commit()
+            async with self.db.transaction() as connection:
+                await connection.execute('''
+                    INSERT INTO user_stats (guild_id, user_id, timeout_count, last_updated)
+                    VALUES (?, ?, 1, ?)
+                    ON CONFLICT(guild_id, user_id) DO UPDATE SET
+                        timeout_count = timeout_count + 1,
+                        last_updated = ?
+                ''', (interaction.guild_id, user.id, datetime.now(), datetime.now()))
+
+                # モデレーションログに記録
+                await connection.execute('''
+                    INSERT INTO moderation_logs
+                    (guild_id, moderator_id, target_id, action_type, reason, duration)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (
+                    interaction.guild_id,
+                    interaction.user.id,
+                    user.id,
+                    'timeout',
+                    reason_text,
+                    minutes
+                ))
+                await self.db.record_activity(
+                    interaction.guild_id,
+                    'moderation:timeout',
+                    connection=connection
+                )
             
             # 成功メッセージ
             embed = discord.Embed(
@@ -155,26 +152,30 @@ class Timeout(commands.Cog):
             
             await interaction.response.send_message(embed=embed)
             
-            # 対象ユーザーにDM送信
-            try:
-                dm_embed = discord.Embed(
-                    title="⏱️ タイムアウト通知",
-                    description=f"{interaction.guild.name}でタイムアウトされました。",
-                    color=discord.Color.orange(),
-                    timestamp=datetime.now()
-                )
-                dm_embed.add_field(name="時間", value=f"{minutes}分", inline=True)
-                dm_embed.add_field(name="理由", value=reason_text, inline=False)
-                dm_embed.add_field(
-                    name="タイムアウト終了時刻",
-                    value=f"<t:{int((datetime.now() + duration).timestamp())}:F>",
-                    inline=False
-                )
-                
-                await user.send(embed=dm_embed)
-            except discord.Forbidden:
-                # DMが送信できない場合はログに記録
-                logger.warning(f'{user.name}へのDM送信に失敗しました(タイムアウト通知)')
+            # 処罰の記録をログチャンネル(非公開)に送信する
+            self.bot.log_sink.log(interaction.guild, 'private', embed.copy())
+            
+            # 対象ユーザーへのDM通知(送信キュー経由でバックグラウンド送信)
+            dm_embed = discord.Embed(
+                title="⏱️ タイムアウト通知",
+                description=f"{interaction.guild.name}でタイムアウトされました。",
+                color=discord.Color.orange(),
+                timestamp=datetime.now()
+            )
+            dm_embed.add_field(name="時間", value=f"{minutes}分", inline=True)
+            dm_embed.add_field(name="理由", value=reason_text, inline=False)
+            dm_embed.add_field(
+                name="タイムアウト終了時刻",
+                value=f"<t:{int((datetime.now() + duration).timestamp())}:F>",
+                inline=False
+            )
+            
+            await self.bot.dm_notifier.enqueue(
+                interaction.guild_id,
+                user.id,
+                dm_embed,
+                f'timeout:{interaction.guild_id}:{user.id}'
+            )
             
             logger.info(
                 f'{interaction.user.name}が{user.name}を{minutes}分間タイムアウトしました '
@@ -246,19 +247,23 @@ class Timeout(commands.Cog):
             await user.timeout(None, reason=reason_text)
             
             # モデレーションログに記録
-            await self.db.connection.execute('''
-                INSERT INTO moderation_logs
-                (guild_id, moderator_id, target_id, action_type, reason)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (
-                interaction.guild_id,
-                interaction.user.id,
-                user.id,
-                'untimeout',
-                reason_text
-            ))
-            
-            await self.db.connection.commit()
+            async with self.db.transaction() as connection:
+                await connection.execute('''
+                    INSERT INTO moderation_logs
+                    (guild_id, moderator_id, target_id, action_type, reason)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (
+                    interaction.guild_id,
+                    interaction.user.id,
+                    user.id,
+                    'untimeout',
+                    reason_text
+                ))
+                await self.db.record_activity(
+                    interaction.guild_id,
+                    'moderation:untimeout',
+                    connection=connection
+                )
             
             # 成功メッセージ
             embed = discord.Embed(
@@ -274,19 +279,24 @@ class Timeout(commands.Cog):
             
             await interaction.response.send_message(embed=embed)
             
-            # 対象ユーザーにDM送信
-            try:
-                dm_embed = discord.Embed(
-                    title="✅ タイムアウト解除通知",
-                    description=f"{interaction.guild.name}でタイムアウトが解除されました。",
-                    color=discord.Color.green(),
-                    timestamp=datetime.now()
-                )
-                dm_embed.add_field(name="理由", value=reason_text, inline=False)
-                
-                await user.send(embed=dm_embed)
-            except discord.Forbidden:
-                logger.warning(f'{user.name}へのDM送信に失敗しました(タイムアウト解除通知)')
+            # 処罰の記録をログチャンネル(非公開)に送信する
+            self.bot.log_sink.log(interaction.guild, 'private', embed.copy())
+            
+            # 対象ユーザーへのDM通知(送信キュー経由でバックグラウンド送信)
+            dm_embed = discord.Embed(
+                title="✅ タイムアウト解除通知",
+                description=f"{interaction.guild.name}でタイムアウトが解除されました。",
+                color=discord.Color.green(),
+                timestamp=datetime.now()
+            )
+            dm_embed.add_field(name="理由", value=reason_text, inline=False)
+            
+            await self.bot.dm_notifier.enqueue(
+                interaction.guild_id,
+                user.id,
+                dm_embed,
+                f'untimeout:{interaction.guild_id}:{user.id}'
+            )
             
             logger.info(
                 f'{interaction.user.name}が{user.name}のタイムアウトを解除しました '
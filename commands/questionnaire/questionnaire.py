@@ -6,10 +6,14 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
+import asyncio
+import os
+import time
 import uuid
 from datetime import datetime
 from utils.logger import get_logger
-from utils.database import Database
+from utils.questionnaire_tally import QuestionnaireTally
+from utils.rest_scheduler import PRIORITY_INTERACTIVE
 
 logger = get_logger()
 
@@ -27,64 +31,48 @@ class Questionnaire(commands.Cog):
             bot: Botインスタンス
         """
         self.bot = bot
-        self.db = Database()
+        self.db = bot.db
+        self.tally = QuestionnaireTally(self.db)
+        
+        # リアルタイム結果表示の更新間隔(秒)
+        self.live_interval = float(os.getenv('QUESTIONNAIRE_LIVE_INTERVAL', '10'))
+        # questionnaire_id -> 更新待ちタスク
+        self._live_tasks = {}
+        # questionnaire_id -> 最後に更新した時刻
+        self._live_last_edit = {}
+        # questionnaire_id -> 表示中のEmbed
+        self._live_embeds = {}
     
     async def cog_load(self):
         """
-        Cog読み込み時の処理
+        Cog読み込み時にリアクションの振り分け先として登録
         """
-        await self.db.initialize()
-        # アンケート参加者テーブルを作成
-        await self._create_questionnaire_participants_table()
+        self.bot.reaction_router.register('questionnaire', self.handle_reaction_add, self.handle_reaction_remove)
     
-    async def _create_questionnaire_participants_table(self):
+    async def cog_unload(self):
         """
-        アンケート参加者テーブルを作成
+        Cog解除時に振り分け先の登録を解除
         """
-        await self.db.connection.execute('''
-            CREATE TABLE IF NOT EXISTS questionnaire_participants (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                questionnaire_id TEXT,
-                user_id INTEGER,
-                emoji TEXT,
-                added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(questionnaire_id, user_id, emoji)
-            )
-        ''')
-        
-        # questionnairesテーブルにpublic_resultsカラムを追加(既存の場合はエラーを無視)
-        try:
-            await self.db.connection.execute('''
-                ALTER TABLE questionnaires ADD COLUMN public_results BOOLEAN DEFAULT FALSE
-            ''')
-        except:
-            pass  # カラムが既に存在する場合は無視
+        self.bot.reaction_router.unregister('questionnaire')
         
-        await self.db.connection.commit()
+        for task in self._live_tasks.values():
+            task.cancel()
+        self._live_tasks.clear()
     
-    @commands.Cog.listener()
-    async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
+    async def handle_reaction_add(self, payload: discord.RawReactionActionEvent):
         """
-        リアクションが追加された時のイベント
+        アンケートへのリアクションが追加された時の処理
         終了したアンケートへのリアクションを防ぎ、参加者を記録
+        (ReactionRouterから呼ばれます)
         
         Args:
             payload: リアクションイベント
         """
-        # Bot自身のリアクションは無視
-        if payload.user_id == self.bot.user.id:
-            return
-        
         # このメッセージがアンケートかチェック
-        cursor = await self.db.connection.execute('''
-            SELECT questionnaire_id, status FROM questionnaires
-            WHERE message_id = ? AND guild_id = ?
-        ''', (payload.message_id, payload.guild_id))
-        
-        row = await cursor.fetchone()
+        info = await self.tally.get_by_message(payload.message_id, payload.guild_id)
         
-        if row:
-            questionnaire_id, status = row
+        if info:
+            questionnaire_id, status = info['questionnaire_id'], info['status']
             
             # 終了したアンケートの場合、リアクションを削除
             if status == 'closed':
@@ -116,54 +104,112 @@ class Questionnaire(commands.Cog):
                 except Exception as e:
                     logger.error(f'終了アンケートのリアクション削除エラー: {e}')
             
-            # オープンなアンケートの場合、参加者を記録
+            # オープンなアンケートの場合、参加者を記録して票数を更新
             elif status == 'open':
                 try:
-                    await self.db.connection.execute('''
-                        INSERT OR IGNORE INTO questionnaire_participants
-                        (questionnaire_id, user_id, emoji)
-                        VALUES (?, ?, ?)
-                    ''', (questionnaire_id, payload.user_id, str(payload.emoji)))
-                    await self.db.connection.commit()
+                    changed = await self.tally.add_vote(questionnaire_id, payload.user_id, str(payload.emoji))
+                    if changed and info['live_results']:
+                        self._schedule_live_update(info)
                 except Exception as e:
                     logger.error(f'アンケート参加者記録エラー: {e}')
     
-    @commands.Cog.listener()
-    async def on_raw_reaction_remove(self, payload: discord.RawReactionActionEvent):
+    async def handle_reaction_remove(self, payload: discord.RawReactionActionEvent):
         """
-        リアクションが削除された時のイベント
+        アンケートへのリアクションが削除された時の処理
         参加者記録を削除
+        (ReactionRouterから呼ばれます)
         
         Args:
             payload: リアクションイベント
         """
-        # Bot自身のリアクションは無視
-        if payload.user_id == self.bot.user.id:
-            return
-        
         # このメッセージがアンケートかチェック
-        cursor = await self.db.connection.execute('''
-            SELECT questionnaire_id, status FROM questionnaires
-            WHERE message_id = ? AND guild_id = ?
-        ''', (payload.message_id, payload.guild_id))
+        info = await self.tally.get_by_message(payload.message_id, payload.guild_id)
         
-        row = await cursor.fetchone()
-        
-        if row:
-            questionnaire_id, status = row
-            
+        if info:
             # オープンなアンケートの場合のみ削除
-            if status == 'open':
+            if info['status'] == 'open':
                 try:
-                    await self.db.connection.execute('''
-                        DELETE FROM questionnaire_participants
-                        WHERE questionnaire_id = ? AND user_id = ? AND emoji = ?
-                    ''', (questionnaire_id, payload.user_id, str(payload.emoji)))
-                    await self.db.connection.commit()
+                    changed = await self.tally.remove_vote(info['questionnaire_id'], payload.user_id, str(payload.emoji))
+                    if changed and info['live_results']:
+                        self._schedule_live_update(info)
                 except Exception as e:
                     logger.error(f'アンケート参加者削除エラー: {e}')
     
-    @app_commands.command(name="questionnaire_add", description="アンケートを作成します")
+    def _schedule_live_update(self, info: dict):
+        """
+        リアルタイム結果表示の更新を予約する
+        投票が続いても更新はlive_interval秒に1回までにまとめます
+        
+        Args:
+            info: アンケート情報
+        """
+        questionnaire_id = info['questionnaire_id']
+        if questionnaire_id in self._live_tasks:
+            return
+        
+        self._live_tasks[questionnaire_id] = asyncio.create_task(self._live_update(info))
+    
+    async def _live_update(self, info: dict):
+        """
+        アンケートのEmbedに現在の結果を反映する
+        
+        Args:
+            info: アンケート情報
+        """
+        questionnaire_id = info['questionnaire_id']
+        
+        try:
+            # 前回の更新からlive_interval秒経つまで待つ
+            last_edit = self._live_last_edit.get(questionnaire_id, 0)
+            delay = last_edit + self.live_interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        finally:
+            self._live_tasks.pop(questionnaire_id, None)
+        
+        if info['status'] != 'open':
+            return
+        
+        self._live_last_edit[questionnaire_id] = time.monotonic()
+        
+        try:
+            channel = self.bot.get_channel(info['channel_id'])
+            if not channel:
+                return
+            
+            # 元のEmbedは初回のみ取得し、以降はメモリ上のものを更新する
+            embed = self._live_embeds.get(questionnaire_id)
+            if embed is None:
+                message = await channel.fetch_message(info['message_id'])
+                if not message.embeds:
+                    return
+                embed = message.embeds[0]
+                self._live_embeds[questionnaire_id] = embed
+            
+            counts = await self.tally.counts(questionnaire_id)
+            total_votes = sum(counts.values())
+            
+            lines = []
+            for field in embed.fields:
+                if "選択肢" in field.name:
+                    emoji = field.name.split()[0] if field.name else "❓"
+                    lines.append(f"{emoji} {counts.get(emoji, 0)}票")
+            lines.append(f"合計: {total_votes}票")
+            
+            value = "\n".join(lines)
+            for index, field in enumerate(embed.fields):
+                if field.name == "📈 現在の結果":
+                    embed.set_field_at(index, name=field.name, value=value, inline=False)
+                    break
+            else:
+                embed.add_field(name="📈 現在の結果", value=value, inline=False)
+            
+            await channel.get_partial_message(info['message_id']).edit(embed=embed)
+        
+        except Exception as e:
+            logger.error(f'アンケート結果の更新エラー: {e}')
+    
+    @app_commands.command(name="questionnaire_add", description="アンケートを作成します", extras={"defer_ephemeral": True})
     @app_commands.describe(
         content="アンケートの内容",
         option1="選択肢1",
@@ -172,7 +218,8 @@ class Questionnaire(commands.Cog):
         emoji1="選択肢1の絵文字(デフォルト: 1️⃣)",
         emoji2="選択肢2の絵文字(デフォルト: 2️⃣)",
         emoji3="選択肢3の絵文字(デフォルト: 3️⃣)",
-        public_results="結果を公開するか(参加者名を表示)"
+        public_results="結果を公開するか(参加者名を表示)",
+        live_results="投票中に現在の票数を表示するか"
     )
     async def questionnaire_add(
         self,
@@ -184,7 +231,8 @@ class Questionnaire(commands.Cog):
         emoji1: str = "1️⃣",
         emoji2: str = "2️⃣",
         emoji3: str = "3️⃣",
-        public_results: bool = False
+        public_results: bool = False,
+        live_results: bool = False
     ):
         """
         アンケート作成コマンドのメイン処理
@@ -199,6 +247,7 @@ class Questionnaire(commands.Cog):
             emoji2: 選択肢2の絵文字
             emoji3: 選択肢3の絵文字
             public_results: 結果公開フラグ
+            live_results: リアルタイム結果表示フラグ
         """
         # UUIDでIDを生成
         questionnaire_id = str(uuid.uuid4())[:8]
@@ -242,23 +291,33 @@ class Questionnaire(commands.Cog):
                 inline=False
             )
             
+            # リアルタイム表示の場合は票数欄を用意
+            if live_results:
+                embed.add_field(
+                    name="📈 現在の結果",
+                    value="\n".join(f"{emoji} 0票" for emoji in emojis) + "\n合計: 0票",
+                    inline=False
+                )
+            
             embed.set_footer(text=f"ID: {questionnaire_id} | 作成者: {interaction.user.name}")
             
             # メッセージを送信
             message = await interaction.channel.send(embed=embed)
             
-            # リアクションを追加
-            for emoji in emojis:
-                try:
-                    await message.add_reaction(emoji)
-                except discord.HTTPException as e:
-                    logger.warning(f'リアクション追加失敗 ({emoji}): {e}')
+            # リアクションの振り分け対象に追加(Bot自身のリアクションより先に登録しておく)
+            self.bot.reaction_router.track(message.id, 'questionnaire')
+            self.tally.register(message.id, questionnaire_id, interaction.channel.id, live_results)
+            
+            # リアクションを追加(送信キュー経由で順番に追加)
+            failures = await self.bot.rest_scheduler.add_reactions(message, emojis, PRIORITY_INTERACTIVE)
+            for emoji, error in failures:
+                logger.warning(f'リアクション追加失敗 ({emoji}): {error}')
             
             # データベースに保存
-            await self.db.connection.execute('''
+            await self.db.execute('''
                 INSERT INTO questionnaires
-                (questionnaire_id, guild_id, channel_id, message_id, creator_id, content, status, public_results)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                (questionnaire_id, guild_id, channel_id, message_id, creator_id, content, status, public_results, live_results)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (
                 questionnaire_id,
                 interaction.guild_id,
@@ -267,11 +326,10 @@ class Questionnaire(commands.Cog):
                 interaction.user.id,
                 content,
                 'open',
-                public_results
+                public_results,
+                live_results
             ))
             
-            await self.db.connection.commit()
-            
             # 成功メッセージ
             await interaction.response.send_message(
                 f"✅ アンケートを作成しました!\n"
@@ -280,7 +338,10 @@ class Questionnaire(commands.Cog):
                 ephemeral=True
             )
             
-            logger.info(f'{interaction.user.name}がアンケート({questionnaire_id})を作成しました (公開: {public_results})')
+            logger.info(
+                f'{interaction.user.name}がアンケート({questionnaire_id})を作成しました '
+                f'(公開: {public_results}, リアルタイム表示: {live_results})'
+            )
         
         except Exception as e:
             await interaction.response.send_message(
@@ -289,7 +350,7 @@ class Questionnaire(commands.Cog):
             )
             logger.error(f'アンケート作成エラー: {e}')
     
-    @app_commands.command(name="questionnaire_close", description="アンケートを終了します")
+    @app_commands.command(name="questionnaire_close", description="アンケートを終了します", extras={"defer_ephemeral": True})
     @app_commands.describe(
         questionnaire_id="アンケートID(省略すると最後に作成したアンケート)"
     )
@@ -308,7 +369,7 @@ class Questionnaire(commands.Cog):
         try:
             # IDが指定されていない場合、最後に作成したアンケートを取得
             if not questionnaire_id:
-                cursor = await self.db.connection.execute('''
+                row = await self.db.fetchone('''
                     SELECT questionnaire_id, channel_id, message_id, public_results
                     FROM questionnaires
                     WHERE guild_id = ? AND creator_id = ? AND status = 'open'
@@ -316,8 +377,6 @@ class Questionnaire(commands.Cog):
                     LIMIT 1
                 ''', (interaction.guild_id, interaction.user.id))
                 
-                row = await cursor.fetchone()
-                
                 if not row:
                     await interaction.response.send_message(
                         "❌ 終了可能なアンケートが見つかりません。",
@@ -328,14 +387,12 @@ class Questionnaire(commands.Cog):
                 questionnaire_id, channel_id, message_id, public_results = row
             else:
                 # 指定されたIDのアンケートを取得
-                cursor = await self.db.connection.execute('''
+                row = await self.db.fetchone('''
                     SELECT channel_id, message_id, status, public_results
                     FROM questionnaires
                     WHERE questionnaire_id = ? AND guild_id = ?
                 ''', (questionnaire_id, interaction.guild_id))
                 
-                row = await cursor.fetchone()
-                
                 if not row:
                     await interaction.response.send_message(
                         f"❌ ID `{questionnaire_id}` のアンケートが見つかりません。",
@@ -370,16 +427,12 @@ class Questionnaire(commands.Cog):
                 )
                 return
             
-            # リアクション数を集計
-            results = {}
-            total_votes = 0
+            # 票数はリアクションイベントで集計済みのものを使う
+            results = await self.tally.counts(questionnaire_id)
+            total_votes = sum(results.values())
             
-            for reaction in message.reactions:
-                # Botのリアクションを除外
-                count = reaction.count - 1
-                if count > 0:
-                    results[str(reaction.emoji)] = count
-                    total_votes += count
+            # 公開結果の場合は全選択肢の参加者を1回で取得
+            participants_by_emoji = await self.tally.participants(questionnaire_id) if public_results else {}
             
             # 結果のEmbedを作成
             result_embed = discord.Embed(
@@ -400,17 +453,11 @@ class Questionnaire(commands.Cog):
                         
                         # 参加者リストを取得
                         if public_results:
-                            cursor = await self.db.connection.execute('''
-                                SELECT user_id FROM questionnaire_participants
-                                WHERE questionnaire_id = ? AND emoji = ?
-                                ORDER BY added_at
-                            ''', (questionnaire_id, emoji))
-                            
-                            participants = await cursor.fetchall()
+                            participants = participants_by_emoji.get(emoji, [])
                             
                             # 参加者名を取得
                             participant_names = []
-                            for (user_id,) in participants:
+                            for user_id in participants:
                                 member = interaction.guild.get_member(user_id)
                                 if member:
                                     participant_names.append(member.display_name)
@@ -489,17 +536,11 @@ class Questionnaire(commands.Cog):
                         if "選択肢" in field.name:
                             emoji = field.name.split()[0] if field.name else "❓"
                             
-                            cursor = await self.db.connection.execute('''
-                                SELECT user_id FROM questionnaire_participants
-                                WHERE questionnaire_id = ? AND emoji = ?
-                                ORDER BY added_at
-                            ''', (questionnaire_id, emoji))
-                            
-                            participants = await cursor.fetchall()
+                            participants = participants_by_emoji.get(emoji, [])
                             
                             if participants:
                                 participant_names = []
-                                for (user_id,) in participants:
+                                for user_id in participants:
                                     member = interaction.guild.get_member(user_id)
                                     if member:
                                         participant_names.append(member.display_name)
@@ -565,13 +606,19 @@ class Questionnaire(commands.Cog):
                     await message.channel.send(embed=detail_embed)
             
             # データベースを更新
-            await self.db.connection.execute('''
+            await self.db.execute('''
                 UPDATE questionnaires
                 SET status = 'closed'
                 WHERE questionnaire_id = ?
             ''', (questionnaire_id,))
             
-            await self.db.connection.commit()
+            # 集計とリアルタイム表示を終了
+            self.tally.mark_closed(message_id, questionnaire_id)
+            live_task = self._live_tasks.pop(questionnaire_id, None)
+            if live_task:
+                live_task.cancel()
+            self._live_last_edit.pop(questionnaire_id, None)
+            self._live_embeds.pop(questionnaire_id, None)
             
             # 成功メッセージ
             await interaction.response.send_message(
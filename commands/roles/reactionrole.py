@@ -8,7 +8,9 @@ from discord import app_commands
 from discord.ext import commands
 from datetime import datetime
 from utils.logger import get_logger
-from utils.database import Database
+from utils.role_coalescer import RoleCoalescer
+from utils.rest_scheduler import PRIORITY_INTERACTIVE
+from utils.panel_registry import PANEL_REACTION_ROLE
 
 logger = get_logger()
 
@@ -26,35 +28,47 @@ class ReactionRole(commands.Cog):
             bot: Botインスタンス
         """
         self.bot = bot
-        self.db = Database()
+        self.db = bot.db
+        self.role_coalescer = RoleCoalescer(bot.rest_scheduler)
     
     async def cog_load(self):
         """
-        Cog読み込み時の処理
+        Cog読み込み時にリアクションの振り分け先として登録
         """
-        await self.db.initialize()
-        # リアクションロール用のテーブルを作成
-        await self._create_reaction_role_table()
+        self.bot.reaction_router.register('reaction_role', self.handle_reaction_add, self.handle_reaction_remove)
     
-    async def _create_reaction_role_table(self):
+    async def cog_unload(self):
         """
-        リアクションロール用のテーブルを作成
+        Cog解除時に振り分け先の登録を解除
         """
-        await self.db.connection.execute('''
-            CREATE TABLE IF NOT EXISTS reaction_roles (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                guild_id INTEGER,
-                channel_id INTEGER,
-                message_id INTEGER,
-                emoji TEXT,
-                role_id INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(message_id, emoji)
-            )
-        ''')
-        await self.db.connection.commit()
+        self.bot.reaction_router.unregister('reaction_role')
+        
+        # 待機中のロール変更を反映
+        await self.role_coalescer.flush()
+    
+    async def _fetch_panel_message(self, guild: discord.Guild, message_id: int):
+        """
+        パネルのメッセージを取得する内部関数
+        登録済みのパネルはそのチャンネルから直接取得し、未登録の場合のみ全チャンネルを検索します
+        
+        Args:
+            guild: サーバー
+            message_id: メッセージID
+        
+        Returns:
+            discord.Message: メッセージ(見つからない場合None)
+        """
+        channel = guild.get_channel(self.bot.panel_registry.channel_id(message_id) or 0)
+        channels = [channel] if channel is not None else guild.text_channels
+        
+        for channel in channels:
+            try:
+                return await channel.fetch_message(message_id)
+            except (discord.NotFound, discord.Forbidden):
+                continue
+        return None
     
-    @app_commands.command(name="reactionrole", description="リアクションロールパネルを作成します")
+    @app_commands.command(name="reactionrole", description="リアクションロールパネルを作成します", extras={"defer_ephemeral": True})
     @app_commands.describe(
         title="パネルのタイトル",
         description="パネルの説明",
@@ -91,6 +105,9 @@ class ReactionRole(commands.Cog):
             # メッセージを送信
             message = await channel.send(embed=embed)
             
+            # パネルのメッセージIDを登録(ロール追加時にチャンネルを検索しない)
+            await self.bot.panel_registry.register(interaction.guild_id, channel.id, message.id, PANEL_REACTION_ROLE)
+            
             # 成功メッセージ
             success_embed = discord.Embed(
                 title="✅ リアクションロールパネルを作成しました",
@@ -129,7 +146,7 @@ class ReactionRole(commands.Cog):
             )
             logger.error(f'リアクションロールパネル作成エラー: {e}')
     
-    @app_commands.command(name="reactionrole_add", description="リアクションロールを追加します")
+    @app_commands.command(name="reactionrole_add", description="リアクションロールを追加します", extras={"defer_ephemeral": True})
     @app_commands.describe(
         message_id="メッセージID",
         emoji="リアクション絵文字",
@@ -153,20 +170,15 @@ class ReactionRole(commands.Cog):
             role: ロール
         """
         try:
+            if not message_id.isdigit():
+                await interaction.response.send_message(
+                    "❌ メッセージIDは数字で指定してください。",
+                    ephemeral=True
+                )
+                return
+            
             # メッセージを取得
-            message = None
-            for channel in interaction.guild.text_channels:
-                try:
-                    message = await channel.fetch_message(int(message_id))
-                    break
-                except (discord.NotFound, discord.Forbidden):
-                    continue
-                except ValueError:
-                    await interaction.response.send_message(
-                        "❌ メッセージIDは数字で指定してください。",
-                        ephemeral=True
-                    )
-                    return
+            message = await self._fetch_panel_message(interaction.guild, int(message_id))
             
             if not message:
                 await interaction.response.send_message(
@@ -185,16 +197,14 @@ class ReactionRole(commands.Cog):
                 return
             
             # 既に登録されているかチェック
-            cursor = await self.db.connection.execute('''
+            existing = await self.db.fetchone('''
                 SELECT id FROM reaction_roles
                 WHERE message_id = ? AND emoji = ?
             ''', (message.id, emoji))
             
-            existing = await cursor.fetchone()
-            
             if existing:
                 # 既存の設定を更新
-                await self.db.connection.execute('''
+                await self.db.execute('''
                     UPDATE reaction_roles
                     SET role_id = ?
                     WHERE message_id = ? AND emoji = ?
@@ -202,7 +212,7 @@ class ReactionRole(commands.Cog):
                 action = "更新"
             else:
                 # 新規登録
-                await self.db.connection.execute('''
+                await self.db.execute('''
                     INSERT INTO reaction_roles
                     (guild_id, channel_id, message_id, emoji, role_id)
                     VALUES (?, ?, ?, ?, ?)
@@ -214,14 +224,19 @@ class ReactionRole(commands.Cog):
                     role.id
                 ))
                 action = "追加"
-            
-            await self.db.connection.commit()
+                
+                # リアクションの振り分け対象に追加
+                self.bot.reaction_router.track(message.id, 'reaction_role')
+                
+                # 登録機能の追加前に作成されたパネルも登録しておく
+                if self.bot.panel_registry.channel_id(message.id) is None:
+                    await self.bot.panel_registry.register(
+                        interaction.guild_id, message.channel.id, message.id, PANEL_REACTION_ROLE
+                    )
             
             # メッセージにリアクションを追加
-            try:
-                await message.add_reaction(emoji)
-            except discord.HTTPException as e:
-                logger.warning(f'リアクション追加失敗: {e}')
+            for _, error in await self.bot.rest_scheduler.add_reactions(message, [emoji], PRIORITY_INTERACTIVE):
+                logger.warning(f'リアクション追加失敗: {error}')
             
             # Embedを更新(ロール一覧を追加)
             if message.embeds:
@@ -238,14 +253,12 @@ class ReactionRole(commands.Cog):
                     embed.add_field(name=field.name, value=field.value, inline=field.inline)
                 
                 # 現在のリアクションロール一覧を取得
-                cursor = await self.db.connection.execute('''
+                roles_list = await self.db.fetchall('''
                     SELECT emoji, role_id FROM reaction_roles
                     WHERE message_id = ?
                     ORDER BY created_at
                 ''', (message.id,))
                 
-                roles_list = await cursor.fetchall()
-                
                 if roles_list:
                     roles_text = ""
                     for emoji_db, role_id in roles_list:
@@ -279,7 +292,7 @@ class ReactionRole(commands.Cog):
             )
             logger.error(f'リアクションロール追加エラー: {e}')
     
-    @app_commands.command(name="reactionrole_remove", description="リアクションロールを削除します")
+    @app_commands.command(name="reactionrole_remove", description="リアクションロールを削除します", extras={"defer_ephemeral": True})
     @app_commands.describe(
         message_id="メッセージID",
         emoji="削除するリアクション絵文字"
@@ -301,14 +314,24 @@ class ReactionRole(commands.Cog):
         """
         try:
             # データベースから削除
-            cursor = await self.db.connection.execute('''
-                DELETE FROM reaction_roles
-                WHERE message_id = ? AND emoji = ?
-                RETURNING role_id
-            ''', (int(message_id), emoji))
+            async with self.db.transaction() as connection:
+                cursor = await connection.execute('''
+                    DELETE FROM reaction_roles
+                    WHERE message_id = ? AND emoji = ?
+                    RETURNING role_id
+                ''', (int(message_id), emoji))
+                deleted = await cursor.fetchone()
+                
+                # パネルのリアクションロールが無くなった場合は振り分け対象から外す
+                cursor = await connection.execute('''
+                    SELECT 1 FROM reaction_roles
+                    WHERE message_id = ?
+                    LIMIT 1
+                ''', (int(message_id),))
+                remaining = await cursor.fetchone()
             
-            deleted = await cursor.fetchone()
-            await self.db.connection.commit()
+            if deleted and not remaining:
+                self.bot.reaction_router.untrack(int(message_id))
             
             if not deleted:
                 await interaction.response.send_message(
@@ -318,13 +341,7 @@ class ReactionRole(commands.Cog):
                 return
             
             # メッセージからリアクションを削除
-            message = None
-            for channel in interaction.guild.text_channels:
-                try:
-                    message = await channel.fetch_message(int(message_id))
-                    break
-                except (discord.NotFound, discord.Forbidden):
-                    continue
+            message = await self._fetch_panel_message(interaction.guild, int(message_id))
             
             if message:
                 try:
@@ -346,26 +363,20 @@ class ReactionRole(commands.Cog):
             )
             logger.error(f'リアクションロール削除エラー: {e}')
     
-    @commands.Cog.listener()
-    async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
+    async def handle_reaction_add(self, payload: discord.RawReactionActionEvent):
         """
-        リアクションが追加された時のイベント
+        リアクションパネルへのリアクションが追加された時の処理
+        (ReactionRouterから呼ばれます)
         
         Args:
             payload: リアクションイベント
         """
-        # Botのリアクションは無視
-        if payload.user_id == self.bot.user.id:
-            return
-        
         # リアクションロールをチェック
-        cursor = await self.db.connection.execute('''
+        row = await self.db.fetchone('''
             SELECT role_id FROM reaction_roles
             WHERE message_id = ? AND emoji = ?
         ''', (payload.message_id, str(payload.emoji)))
         
-        row = await cursor.fetchone()
-        
         if row:
             role_id = row[0]
             guild = self.bot.get_guild(payload.guild_id)
@@ -375,34 +386,23 @@ class ReactionRole(commands.Cog):
                 member = guild.get_member(payload.user_id)
                 
                 if role and member:
-                    try:
-                        await member.add_roles(role, reason="リアクションロール")
-                        logger.info(f'{member.name}にロール{role.name}を付与しました')
-                    except discord.Forbidden:
-                        logger.error(f'ロール付与権限がありません: {role.name}')
-                    except Exception as e:
-                        logger.error(f'ロール付与エラー: {e}')
+                    # 短時間の連続操作はまとめて1回で反映する
+                    self.role_coalescer.add(member, role)
     
-    @commands.Cog.listener()
-    async def on_raw_reaction_remove(self, payload: discord.RawReactionActionEvent):
+    async def handle_reaction_remove(self, payload: discord.RawReactionActionEvent):
         """
-        リアクションが削除された時のイベント
+        リアクションパネルへのリアクションが削除された時の処理
+        (ReactionRouterから呼ばれます)
         
         Args:
             payload: リアクションイベント
         """
-        # Botのリアクションは無視
-        if payload.user_id == self.bot.user.id:
-            return
-        
         # リアクションロールをチェック
-        cursor = await self.db.connection.execute('''
+        row = await self.db.fetchone('''
             SELECT role_id FROM reaction_roles
             WHERE message_id = ? AND emoji = ?
         ''', (payload.message_id, str(payload.emoji)))
         
-        row = await cursor.fetchone()
-        
         if row:
             role_id = row[0]
             guild = self.bot.get_guild(payload.guild_id)
@@ -412,13 +412,8 @@ class ReactionRole(commands.Cog):
                 member = guild.get_member(payload.user_id)
                 
                 if role and member:
-                    try:
-                        await member.remove_roles(role, reason="リアクションロール解除")
-                        logger.info(f'{member.name}からロール{role.name}を削除しました')
-                    except discord.Forbidden:
-                        logger.error(f'ロール削除権限がありません: {role.name}')
-                    except Exception as e:
-                        logger.error(f'ロール削除エラー: {e}')
+                    # 短時間の連続操作はまとめて1回で反映する
+                    self.role_coalescer.remove(member, role)
 
 
 async def setup(bot):
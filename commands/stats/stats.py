@@ -8,7 +8,6 @@ from discord import app_commands
 from discord.ext import commands
 from datetime import datetime, timedelta
 from utils.logger import get_logger
-from utils.database import Database
 
 logger = get_logger()
 
@@ -26,13 +25,7 @@ class Stats(commands.Cog):
             bot: Botインスタンス
         """
         self.bot = bot
-        self.db = Database()
-    
-    async def cog_load(self):
-        """
-        Cog読み込み時の処理
-        """
-        await self.db.initialize()
+        self.db = bot.db
     
     @app_commands.command(name="stats", description="サーバーの統計を表示します")
     @app_commands.describe(period="期間を選択してください")
@@ -65,51 +58,17 @@ class Stats(commands.Cog):
         try:
             guild = interaction.guild
             
-            # 総メッセージ数を取得
-            cursor = await self.db.connection.execute('''
-                SELECT SUM(message_count) FROM user_stats
-                WHERE guild_id = ? AND last_updated >= ?
-            ''', (guild.id, start_date))
-            
-            row = await cursor.fetchone()
-            total_messages = row[0] if row[0] else 0
-            
-            # アクティブユーザー数(メッセージを送信したユーザー)
-            cursor = await self.db.connection.execute('''
-                SELECT COUNT(DISTINCT user_id) FROM user_stats
-                WHERE guild_id = ? AND last_updated >= ? AND message_count > 0
-            ''', (guild.id, start_date))
-            
-            row = await cursor.fetchone()
-            active_users = row[0] if row[0] else 0
-            
-            # トップ5アクティブユーザー
-            cursor = await self.db.connection.execute('''
-                SELECT user_id, message_count FROM user_stats
-                WHERE guild_id = ? AND last_updated >= ?
-                ORDER BY message_count DESC
-                LIMIT 5
-            ''', (guild.id, start_date))
-            
-            top_users = await cursor.fetchall()
-            
-            # モデレーションアクション数
-            cursor = await self.db.connection.execute('''
-                SELECT action_type, COUNT(*) FROM moderation_logs
-                WHERE guild_id = ? AND created_at >= ?
-                GROUP BY action_type
-            ''', (guild.id, start_date))
-            
-            moderation_actions = await cursor.fetchall()
+            # 未書き込みのメッセージ数を反映してから集計する
+            await self.bot.message_counter.flush()
             
-            # チケット数
-            cursor = await self.db.connection.execute('''
-                SELECT COUNT(*) FROM tickets
-                WHERE guild_id = ? AND created_at >= ?
-            ''', (guild.id, start_date))
+            # 期間内のアクティビティを集計済みバケットから取得
+            summary = await self.db.get_activity_summary(guild.id, start_date)
             
-            row = await cursor.fetchone()
-            ticket_count = row[0] if row[0] else 0
+            total_messages = summary['messages']
+            active_users = summary['active_users']
+            top_users = summary['top_users']
+            moderation_actions = list(summary['moderation'].items())
+            ticket_count = summary['tickets']
             
             # Embedの作成
             embed = discord.Embed(
@@ -3,12 +3,13 @@
 統計の定期送信設定を行います
 """
 
+import asyncio
 import discord
 from discord import app_commands
 from discord.ext import commands, tasks
 from datetime import datetime, timedelta
 from utils.logger import get_logger
-from utils.database import Database
+from utils.rest_scheduler import PRIORITY_BACKGROUND
 
 logger = get_logger()
 
@@ -26,16 +27,10 @@ class StatsSend(commands.Cog):
             bot: Botインスタンス
         """
         self.bot = bot
-        self.db = Database()
+        self.db = bot.db
         # 定期送信タスクを開始
         self.send_scheduled_stats.start()
     
-    async def cog_load(self):
-        """
-        Cog読み込み時の処理
-        """
-        await self.db.initialize()
-    
     def cog_unload(self):
         """
         Cogアンロード時の処理
@@ -51,16 +46,13 @@ class StatsSend(commands.Cog):
         now = datetime.now()
         
         try:
-            await self.db.initialize()
-            
             # 送信すべき統計設定を取得
-            cursor = await self.db.connection.execute('''
+            schedules = await self.db.fetchall('''
                 SELECT guild_id, channel_id, period, last_sent
                 FROM stats_schedule
             ''')
             
-            schedules = await cursor.fetchall()
-            
+            due = []
             for guild_id, channel_id, period, last_sent in schedules:
                 should_send = False
                 
@@ -80,21 +72,27 @@ class StatsSend(commands.Cog):
                             should_send = True
                 
                 if should_send:
-                    # 統計を送信
                     guild = self.bot.get_guild(guild_id)
                     if guild:
                         channel = guild.get_channel(channel_id)
                         if channel:
-                            await self._send_stats(guild, channel, period)
-                            
-                            # 最終送信日時を更新
-                            await self.db.connection.execute('''
-                                UPDATE stats_schedule
-                                SET last_sent = ?
-                                WHERE guild_id = ?
-                            ''', (now, guild_id))
-                            
-                            await self.db.connection.commit()
+                            due.append((guild, channel, period))
+            
+            if not due:
+                return
+            
+            # 未書き込みのメッセージ数を反映してから集計する
+            await self.bot.message_counter.flush()
+            
+            # 統計を送信(送信キューがサーバーごとの送信をまとめて処理する)
+            await asyncio.gather(*(self._send_stats(guild, channel, period) for guild, channel, period in due))
+            
+            # 最終送信日時を更新
+            await self.db.executemany('''
+                UPDATE stats_schedule
+                SET last_sent = ?
+                WHERE guild_id = ?
+            ''', [(now, guild.id) for guild, _, _ in due])
         
         except Exception as e:
             logger.error(f'定期統計送信エラー: {e}')
@@ -125,23 +123,11 @@ class StatsSend(commands.Cog):
             period_text = "月次"
         
         try:
-            # 総メッセージ数を取得
-            cursor = await self.db.connection.execute('''
-                SELECT SUM(message_count) FROM user_stats
-                WHERE guild_id = ? AND last_updated >= ?
-            ''', (guild.id, start_date))
+            # 期間内のアクティビティを集計済みバケットから取得
+            summary = await self.db.get_activity_summary(guild.id, start_date)
             
-            row = await cursor.fetchone()
-            total_messages = row[0] if row[0] else 0
-            
-            # アクティブユーザー数
-            cursor = await self.db.connection.execute('''
-                SELECT COUNT(DISTINCT user_id) FROM user_stats
-                WHERE guild_id = ? AND last_updated >= ? AND message_count > 0
-            ''', (guild.id, start_date))
-            
-            row = await cursor.fetchone()
-            active_users = row[0] if row[0] else 0
+            total_messages = summary['messages']
+            active_users = summary['active_users']
             
             # Embedの作成
             embed = discord.Embed(
@@ -174,7 +160,7 @@ class StatsSend(commands.Cog):
             
             embed.set_footer(text="自動送信")
             
-            await channel.send(embed=embed)
+            await self.bot.rest_scheduler.send(channel, PRIORITY_BACKGROUND, embed=embed)
             logger.info(f'{guild.name}に{period_text}統計を自動送信しました')
         
         except Exception as e:
@@ -206,7 +192,7 @@ class StatsSend(commands.Cog):
         """
         try:
             # データベースに設定を保存
-            await self.db.connection.execute('''
+            await self.db.execute('''
                 INSERT INTO stats_schedule (guild_id, channel_id, period)
                 VALUES (?, ?, ?)
                 ON CONFLICT(guild_id) DO UPDATE SET
@@ -220,8 +206,6 @@ class StatsSend(commands.Cog):
                 period.value
             ))
             
-            await self.db.connection.commit()
-            
             # 成功メッセージ
             period_text = "週次(毎週月曜日0:00)" if period.value == "week" else "月次(毎月1日0:00)"
             
@@ -6,58 +6,163 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
+from discord.ui import Button, View
 from datetime import datetime
 from utils.logger import get_logger
-from utils.database import Database
+from utils.ticket_cleanup import schedule_ticket_deletion, cancel_ticket_deletion
 
 logger = get_logger()
 
+# 検索結果の1ページあたりの件数
+SEARCH_PAGE_SIZE = 5
 
-class Ticket(commands.Cog):
+
+class TicketSearchView(View):
     """
-    チケット管理コマンドのCog
+    チケット検索結果のページ切り替えボタンのView
     """
     
-    def __init__(self, bot):
+    def __init__(self, bot, user_id: int, guild_id: int, query: str):
         """
         初期化
         
         Args:
             bot: Botインスタンス
+            user_id: 検索したユーザーのID(このユーザーのみ操作可能)
+            guild_id: サーバーID
+            query: 検索文字列
         """
+        super().__init__(timeout=300)
         self.bot = bot
-        self.db = Database()
+        self.user_id = user_id
+        self.guild_id = guild_id
+        self.query = query
+        self.page = 0
+    
+    async def build_page(self) -> discord.Embed:
+        """
+        現在のページの検索結果を取得し、Embedを作成する
+        
+        Returns:
+            discord.Embed: 検索結果のEmbed
+        """
+        results, has_next = await self.bot.search_index.search(
+            self.guild_id,
+            self.query,
+            offset=self.page * SEARCH_PAGE_SIZE,
+            limit=SEARCH_PAGE_SIZE
+        )
+        self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = not has_next
+        
+        embed = discord.Embed(
+            title=f"🔍 検索結果: {self.query}",
+            color=discord.Color.blue(),
+            timestamp=datetime.now()
+        )
+        if not results:
+            embed.description = "一致するチケット・通報はありませんでした。"
+        
+        for result in results:
+            icon = "🎫" if result['source'] == 'ticket' else "🚨"
+            timestamp = result['timestamp'].strftime('%Y-%m-%d %H:%M') if result['timestamp'] else "不明"
+            embed.add_field(
+                name=f"{icon} {result['title']}",
+                value=f"<@{result['user_id']}> ・ {timestamp}\n{result['snippet'][:900]}",
+                inline=False
+            )
+        
+        embed.set_footer(text=f"ページ {self.page + 1}")
+        return embed
+    
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        """
+        検索したユーザーのみボタンを操作できるようにする
+        
+        Args:
+            interaction: インタラクション
+        
+        Returns:
+            bool: 操作を許可する場合True
+        """
+        if interaction.user.id != self.user_id:
+            await interaction.response.send_message(
+                "❌ この検索結果を操作できるのは検索したユーザーのみです。",
+                ephemeral=True
+            )
+            return False
+        return True
+    
+    @discord.ui.button(label="◀ 前へ", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: Button):
+        """
+        前のページボタンが押された時の処理
+        
+        Args:
+            interaction: インタラクション
+            button: ボタン
+        """
+        self.page = max(self.page - 1, 0)
+        embed = await self.build_page()
+        await interaction.response.edit_message(embed=embed, view=self)
+    
+    @discord.ui.button(label="次へ ▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: Button):
+        """
+        次のページボタンが押された時の処理
+        
+        Args:
+            interaction: インタラクション
+            button: ボタン
+        """
+        self.page += 1
+        embed = await self.build_page()
+        await interaction.response.edit_message(embed=embed, view=self)
+
+
+class Ticket(commands.Cog):
+    """
+    チケット管理コマンドのCog
+    """
     
-    async def cog_load(self):
+    def __init__(self, bot):
         """
-        Cog読み込み時の処理
+        初期化
+        
+        Args:
+            bot: Botインスタンス
         """
-        await self.db.initialize()
+        self.bot = bot
+        self.db = bot.db
     
-    @app_commands.command(name="ticket", description="チケット管理(デバッグ用)")
+    @app_commands.command(name="ticket", description="チケット管理(デバッグ用)", extras={"defer_ephemeral": True})
     @app_commands.describe(
         operation="操作を選択してください",
-        creator="チケット作成者(作成時のみ)"
+        creator="チケット作成者(作成時のみ)",
+        query="検索する文字列(検索時のみ、空白区切りですべてを含むものを検索)"
     )
     @app_commands.choices(operation=[
         app_commands.Choice(name="作成", value="add"),
         app_commands.Choice(name="クローズ", value="close"),
-        app_commands.Choice(name="削除", value="del")
+        app_commands.Choice(name="削除", value="del"),
+        app_commands.Choice(name="検索", value="search")
     ])
     @app_commands.checks.has_permissions(administrator=True)
     async def ticket(
         self,
         interaction: discord.Interaction,
         operation: app_commands.Choice[str],
-        creator: discord.Member = None
+        creator: discord.Member = None,
+        query: str = None
     ):
         """
         チケット管理コマンドのメイン処理
         
         Args:
             interaction: インタラクション
-            operation: 操作(add/close/del)
+            operation: 操作(add/close/del/search)
             creator: チケット作成者
+            query: 検索文字列
         """
         if operation.value == "add":
             # チケット作成
@@ -68,52 +173,26 @@ class Ticket(commands.Cog):
                 )
                 return
             
-            # 既にチケットを持っているかチェック
-            existing_tickets = []
-            for channel in interaction.guild.text_channels:
-                if channel.name.startswith(f"ticket-{creator.name.lower()}"):
-                    existing_tickets.append(channel)
+            ticket_cache = self.bot.ticket_cache
             
-            if existing_tickets:
+            # 既にオープンなチケットを持っているかチェック
+            existing_ticket = await ticket_cache.find_open_ticket(interaction.guild, creator.id)
+            if existing_ticket:
                 await interaction.response.send_message(
-                    f"❌ {creator.mention}は既にチケットを持っています: {existing_tickets[0].mention}",
+                    f"❌ {creator.mention}は既にチケットを持っています: {existing_ticket.mention}",
                     ephemeral=True
                 )
                 return
             
             try:
-                # チケットカテゴリを取得または作成
-                category = discord.utils.get(interaction.guild.categories, name="Tickets")
-                if not category:
-                    category = await interaction.guild.create_category("Tickets")
+                # チケットカテゴリを取得(キャッシュが無い場合は作成)
+                category = await ticket_cache.get_category(interaction.guild)
                 
                 # チケットチャンネルの作成
                 channel_name = f"ticket-{creator.name.lower()}-{creator.discriminator}"
                 
                 # 権限設定
-                overwrites = {
-                    interaction.guild.default_role: discord.PermissionOverwrite(read_messages=False),
-                    creator: discord.PermissionOverwrite(
-                        read_messages=True,
-                        send_messages=True,
-                        attach_files=True,
-                        embed_links=True
-                    ),
-                    interaction.guild.me: discord.PermissionOverwrite(
-                        read_messages=True,
-                        send_messages=True,
-                        manage_channels=True
-                    )
-                }
-                
-                # 管理者ロールに権限を追加
-                for role in interaction.guild.roles:
-                    if role.permissions.administrator:
-                        overwrites[role] = discord.PermissionOverwrite(
-                            read_messages=True,
-                            send_messages=True,
-                            manage_channels=True
-                        )
+                overwrites = ticket_cache.build_overwrites(interaction.guild, creator)
                 
                 # チャンネルを作成
                 ticket_channel = await interaction.guild.create_text_channel(
@@ -124,13 +203,17 @@ class Ticket(commands.Cog):
                 )
                 
                 # データベースに記録
-                cursor = await self.db.connection.execute('''
-                    INSERT INTO tickets (guild_id, channel_id, creator_id, status)
-                    VALUES (?, ?, ?, ?)
-                ''', (interaction.guild_id, ticket_channel.id, creator.id, 'open'))
+                async with self.db.transaction() as connection:
+                    cursor = await connection.execute('''
+                        INSERT INTO tickets (guild_id, channel_id, creator_id, status, transcript_captured)
+                        VALUES (?, ?, ?, ?, TRUE)
+                    ''', (interaction.guild_id, ticket_channel.id, creator.id, 'open'))
+                    
+                    ticket_id = cursor.lastrowid
+                    await self.db.record_activity(interaction.guild_id, 'tickets', connection=connection)
                 
-                ticket_id = cursor.lastrowid
-                await self.db.connection.commit()
+                # メッセージの記録を開始(ウェルカムメッセージより先に登録しておく)
+                self.bot.ticket_transcripts.track(ticket_channel.id, ticket_id)
                 
                 # チケットチャンネルにウェルカムメッセージを送信
                 welcome_embed = discord.Embed(
@@ -169,13 +252,11 @@ class Ticket(commands.Cog):
             
             try:
                 # データベースからチケット情報を取得
-                cursor = await self.db.connection.execute('''
+                row = await self.db.fetchone('''
                     SELECT ticket_id, creator_id, status FROM tickets
                     WHERE channel_id = ? AND guild_id = ?
                 ''', (interaction.channel.id, interaction.guild_id))
                 
-                row = await cursor.fetchone()
-                
                 if not row:
                     await interaction.response.send_message(
                         "❌ このチケットの情報が見つかりません。",
@@ -193,13 +274,15 @@ class Ticket(commands.Cog):
                     return
                 
                 # チケットをクローズ
-                await self.db.connection.execute('''
+                closed_at = datetime.now()
+                await self.db.execute('''
                     UPDATE tickets
                     SET status = 'closed', closed_at = ?
                     WHERE ticket_id = ?
-                ''', (datetime.now(), ticket_id))
+                ''', (closed_at, ticket_id))
                 
-                await self.db.connection.commit()
+                # 1週間後の自動削除を登録
+                await schedule_ticket_deletion(self.bot, interaction.guild_id, interaction.channel.id, closed_at)
                 
                 # クローズメッセージ
                 close_embed = discord.Embed(
@@ -213,6 +296,9 @@ class Ticket(commands.Cog):
                 await interaction.channel.send(embed=close_embed)
                 await interaction.response.send_message("✅ チケットをクローズしました。", ephemeral=True)
                 
+                # 検索インデックスに登録(応答を待たせないよう応答後に行う)
+                await self.bot.search_index.index_ticket(ticket_id, interaction.channel.name)
+                
                 logger.info(f'{interaction.user.name}がチケット#{ticket_id}をクローズしました')
             
             except Exception as e:
@@ -222,6 +308,27 @@ class Ticket(commands.Cog):
                 )
                 logger.error(f'チケットクローズエラー: {e}')
         
+        elif operation.value == "search":
+            # クローズ・削除済みのチケットと通報の全文検索
+            if not query or not query.split():
+                await interaction.response.send_message(
+                    "❌ 検索語を指定してください。",
+                    ephemeral=True
+                )
+                return
+            
+            try:
+                view = TicketSearchView(self.bot, interaction.user.id, interaction.guild_id, query)
+                embed = await view.build_page()
+                await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
+            
+            except Exception as e:
+                await interaction.response.send_message(
+                    f"❌ 検索中にエラーが発生しました: {str(e)}",
+                    ephemeral=True
+                )
+                logger.error(f'チケット検索エラー: {e}')
+        
         else:  # delete
             # チケット削除
             if not interaction.channel.name.startswith("ticket-"):
@@ -232,13 +339,18 @@ class Ticket(commands.Cog):
                 return
             
             try:
+                # 削除後も検索できるよう、最終的な内容で検索インデックスに登録
+                ticket_id = self.bot.ticket_transcripts.ticket_id(interaction.channel.id)
+                if ticket_id is not None:
+                    await self.bot.search_index.index_ticket(ticket_id, interaction.channel.name)
+                
                 # データベースから削除
-                await self.db.connection.execute('''
+                await self.db.execute('''
                     DELETE FROM tickets
                     WHERE channel_id = ? AND guild_id = ?
                 ''', (interaction.channel.id, interaction.guild_id))
-                
-                await self.db.connection.commit()
+                self.bot.ticket_transcripts.untrack(interaction.channel.id)
+                await cancel_ticket_deletion(self.bot, interaction.channel.id)
                 
                 # チャンネルを削除
                 await interaction.response.send_message("✅ このチケットを削除します...", ephemeral=True)
@@ -8,10 +8,12 @@ from discord import app_commands
 from discord.ext import commands
 from discord.ui import Button, View
 from datetime import datetime
-import io
 import asyncio
 from utils.logger import get_logger
-from utils.database import Database
+from utils.transcript import TranscriptWriter
+from utils.rest_scheduler import PRIORITY_INTERACTIVE
+from utils.panel_registry import PANEL_TICKET
+from utils.ticket_cleanup import schedule_ticket_deletion, cancel_ticket_deletion
 
 logger = get_logger()
 
@@ -30,7 +32,7 @@ class TicketCloseButton(View):
         """
         super().__init__(timeout=None)
         self.bot = bot
-        self.db = Database()
+        self.db = bot.db
     
     @discord.ui.button(
         label="🔒 チケットをクローズ",
@@ -45,16 +47,12 @@ class TicketCloseButton(View):
             interaction: インタラクション
             button: ボタン
         """
-        await self.db.initialize()
-        
         # 管理者かチケット作成者のみクローズ可能
-        cursor = await self.db.connection.execute('''
-            SELECT creator_id, status FROM tickets
+        row = await self.db.fetchone('''
+            SELECT ticket_id, creator_id, status FROM tickets
             WHERE channel_id = ? AND guild_id = ?
         ''', (interaction.channel.id, interaction.guild_id))
         
-        row = await cursor.fetchone()
-        
         if not row:
             await interaction.response.send_message(
                 "❌ このチケットの情報が見つかりません。",
@@ -62,7 +60,7 @@ class TicketCloseButton(View):
             )
             return
         
-        creator_id, status = row
+        ticket_id, creator_id, status = row
         
         # 権限チェック
         is_admin = interaction.user.guild_permissions.administrator
@@ -84,13 +82,15 @@ class TicketCloseButton(View):
         
         try:
             # チケットをクローズ
-            await self.db.connection.execute('''
+            closed_at = datetime.now()
+            await self.db.execute('''
                 UPDATE tickets
                 SET status = 'closed', closed_at = ?
                 WHERE channel_id = ?
-            ''', (datetime.now(), interaction.channel.id))
+            ''', (closed_at, interaction.channel.id))
             
-            await self.db.connection.commit()
+            # 1週間後の自動削除を登録
+            await schedule_ticket_deletion(self.bot, interaction.guild_id, interaction.channel.id, closed_at)
             
             # クローズメッセージとログ生成ボタンを送信
             close_embed = discord.Embed(
@@ -107,6 +107,9 @@ class TicketCloseButton(View):
             
             await interaction.response.send_message(embed=close_embed, view=log_view)
             
+            # 検索インデックスに登録(応答を待たせないよう応答後に行う)
+            await self.bot.search_index.index_ticket(ticket_id, interaction.channel.name)
+            
             logger.info(f'{interaction.user.name}がチケット(チャンネル: {interaction.channel.name})をクローズしました')
         
         except Exception as e:
@@ -153,50 +156,77 @@ class TicketLogButton(View):
             )
             return
         
+        await self._send_transcript(interaction, html_format=False)
+    
+    @discord.ui.button(
+        label="🌐 HTMLログを生成",
+        style=discord.ButtonStyle.secondary,
+        custom_id="generate_html_log_button"
+    )
+    async def generate_html_log(self, interaction: discord.Interaction, button: Button):
+        """
+        HTMLログ生成ボタンが押された時の処理
+        
+        Args:
+            interaction: インタラクション
+            button: ボタン
+        """
+        # 管理者のみログ生成可能
+        if not interaction.user.guild_permissions.administrator:
+            await interaction.response.send_message(
+                "❌ ログを生成できるのは管理者のみです。",
+                ephemeral=True
+            )
+            return
+        
+        await self._send_transcript(interaction, html_format=True)
+    
+    async def _send_transcript(self, interaction: discord.Interaction, html_format: bool):
+        """
+        チケットログを生成して送信する内部関数
+        メッセージを1件ずつ圧縮しながら一時ファイルに書き込むため、履歴の長さに関係なくメモリ使用量は一定です
+        
+        Args:
+            interaction: インタラクション
+            html_format: HTML形式で生成する場合True
+        """
         await interaction.response.defer(ephemeral=True)
         
         try:
-            # チャンネルのメッセージ履歴を取得
-            messages = []
-            async for message in interaction.channel.history(limit=None, oldest_first=True):
-                timestamp = message.created_at.strftime('%Y-%m-%d %H:%M:%S')
-                author = f"{message.author.name}#{message.author.discriminator}"
-                content = message.content if message.content else "[添付ファイルまたはEmbed]"
-                
-                messages.append(f"[{timestamp}] {author}: {content}")
-            
-            # ログファイルを作成
-            log_content = "\n".join(messages)
-            log_file = io.BytesIO(log_content.encode('utf-8'))
-            log_file.seek(0)
+            store = self.bot.ticket_transcripts
+            ticket_id = store.ticket_id(interaction.channel.id)
             
-            # ファイル名を生成
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"ticket_log_{interaction.channel.name}_{timestamp}.txt"
-            
-            # ログをDMで送信
-            try:
-                await interaction.user.send(
-                    content=f"📄 チケットログ: {interaction.channel.name}",
-                    file=discord.File(log_file, filename=filename)
-                )
-                
-                await interaction.followup.send(
-                    "✅ ログをDMに送信しました!",
-                    ephemeral=True
-                )
-            except discord.Forbidden:
-                # DMが送信できない場合はチャンネルに送信
-                log_file.seek(0)
-                await interaction.channel.send(
-                    content=f"📄 {interaction.user.mention} チケットログを生成しました:",
-                    file=discord.File(log_file, filename=filename)
-                )
+            with TranscriptWriter(interaction.channel.name, html_format=html_format) as transcript:
+                if ticket_id is not None and store.is_complete(ticket_id):
+                    # 記録済みのメッセージから生成する(履歴の取得なし)
+                    await store.write_transcript(ticket_id, transcript)
+                else:
+                    # 記録開始前に作成されたチケットはチャンネルの履歴を1件ずつ書き込む
+                    async for message in interaction.channel.history(limit=None, oldest_first=True):
+                        transcript.add_message(message)
                 
-                await interaction.followup.send(
-                    "✅ ログをこのチャンネルに送信しました!(DMが無効のため)",
-                    ephemeral=True
-                )
+                # ログをDMで送信
+                try:
+                    await interaction.user.send(
+                        content=f"📄 チケットログ: {interaction.channel.name}",
+                        file=transcript.to_file()
+                    )
+                    
+                    await interaction.followup.send(
+                        "✅ ログをDMに送信しました!",
+                        ephemeral=True
+                    )
+                except discord.Forbidden:
+                    # DMが送信できない場合はチャンネルに送信
+                    await interaction.channel.send(
+                        content=f"📄 {interaction.user.mention} チケットログを生成しました:",
+                        file=transcript.to_file()
+                    )
+                    
+                    await interaction.followup.send(
+                        "✅ ログをこのチャンネルに送信しました!(DMが無効のため)",
+                        ephemeral=True
+                    )
             
             logger.info(f'{interaction.user.name}がチケットログを生成しました: {interaction.channel.name}')
         
@@ -229,16 +259,18 @@ class TicketLogButton(View):
             return
         
         try:
-            # データベースから削除
-            db = Database()
-            await db.initialize()
+            # 削除後も検索できるよう、最終的な内容で検索インデックスに登録
+            ticket_id = self.bot.ticket_transcripts.ticket_id(interaction.channel.id)
+            if ticket_id is not None:
+                await self.bot.search_index.index_ticket(ticket_id, interaction.channel.name)
             
-            await db.connection.execute('''
+            # データベースから削除
+            await self.bot.db.execute('''
                 DELETE FROM tickets
                 WHERE channel_id = ? AND guild_id = ?
             ''', (interaction.channel.id, interaction.guild_id))
-            
-            await db.connection.commit()
+            self.bot.ticket_transcripts.untrack(interaction.channel.id)
+            await cancel_ticket_deletion(self.bot, interaction.channel.id)
             
             # 削除通知を送信
             await interaction.response.send_message(
@@ -279,7 +311,7 @@ class TicketButton(View):
         """
         super().__init__(timeout=None)
         self.bot = bot
-        self.db = Database()
+        self.db = bot.db
     
     @discord.ui.button(
         label="🎫 チケットを作成",
@@ -294,51 +326,32 @@ class TicketButton(View):
             interaction: インタラクション
             button: ボタン
         """
-        await self.db.initialize()
+        ticket_cache = self.bot.ticket_cache
         
-        # 既にチケットを持っているかチェック
-        existing_tickets = []
-        for channel in interaction.guild.text_channels:
-            if channel.name.startswith(f"ticket-{interaction.user.name.lower()}"):
-                existing_tickets.append(channel)
-        
-        if existing_tickets:
+        # 作成処理中のボタン連打による二重作成を防ぐ
+        if not ticket_cache.begin_creation(interaction.guild_id, interaction.user.id):
             await interaction.response.send_message(
-                f"❌ 既にチケットが存在します: {existing_tickets[0].mention}",
+                "⏳ チケットを作成中です。しばらくお待ちください。",
                 ephemeral=True
             )
             return
         
         try:
-            # チケットカテゴリを取得または作成
-            category = discord.utils.get(interaction.guild.categories, name="Tickets")
-            if not category:
-                category = await interaction.guild.create_category("Tickets")
-            
-            # 権限設定
-            overwrites = {
-                interaction.guild.default_role: discord.PermissionOverwrite(read_messages=False),
-                interaction.user: discord.PermissionOverwrite(
-                    read_messages=True,
-                    send_messages=True,
-                    attach_files=True,
-                    embed_links=True
-                ),
-                interaction.guild.me: discord.PermissionOverwrite(
-                    read_messages=True,
-                    send_messages=True,
-                    manage_channels=True
+            # 既にオープンなチケットを持っているかチェック
+            existing_ticket = await ticket_cache.find_open_ticket(interaction.guild, interaction.user.id)
+            if existing_ticket:
+                await interaction.response.send_message(
+                    f"❌ 既にチケットが存在します: {existing_ticket.mention}",
+                    ephemeral=True
                 )
-            }
+                return
             
-            # 管理者ロールに権限を追加
-            for role in interaction.guild.roles:
-                if role.permissions.administrator:
-                    overwrites[role] = discord.PermissionOverwrite(
-                        read_messages=True,
-                        send_messages=True,
-                        manage_channels=True
-                    )
+            # チケットカテゴリを取得(キャッシュが無い場合は作成)
+            category = await ticket_cache.get_category(interaction.guild)
+            
+            # チケットチャンネルの名前と権限設定
+            channel_name = f"ticket-{interaction.user.name.lower()}-{interaction.user.discriminator}"
+            overwrites = ticket_cache.build_overwrites(interaction.guild, interaction.user)
             
             # チャンネルを作成
             ticket_channel = await interaction.guild.create_text_channel(
@@ -349,23 +362,26 @@ class TicketButton(View):
             )
             
             # データベースに記録
-            cursor = await self.db.connection.execute('''
-                INSERT INTO tickets (guild_id, channel_id, creator_id, status)
-                VALUES (?, ?, ?, ?)
-            ''', (interaction.guild_id, ticket_channel.id, interaction.user.id, 'open'))
-            
-            ticket_id = cursor.lastrowid
-            
-            # ユーザー統計を更新
-            await self.db.connection.execute('''
-                INSERT INTO user_stats (guild_id, user_id, ticket_count, last_updated)
-                VALUES (?, ?, 1, ?)
-                ON CONFLICT(guild_id, user_id) DO UPDATE SET
-                    ticket_count = ticket_count + 1,
-                    last_updated = ?
-            ''', (interaction.guild_id, interaction.user.id, datetime.now(), datetime.now()))
-            
-            await self.db.connection.commit()
+            async with self.db.transaction() as connection:
+                cursor = await connection.execute('''
+                    INSERT INTO tickets (guild_id, channel_id, creator_id, status, transcript_captured)
+                    VALUES (?, ?, ?, ?, TRUE)
+                ''', (interaction.guild_id, ticket_channel.id, interaction.user.id, 'open'))
+                
+                ticket_id = cursor.lastrowid
+                
+                # ユーザー統計を更新
+                await connection.execute('''
+                    INSERT INTO user_stats (guild_id, user_id, ticket_count, last_updated)
+                    VALUES (?, ?, 1, ?)
+                    ON CONFLICT(guild_id, user_id) DO UPDATE SET
+                        ticket_count = ticket_count + 1,
+                        last_updated = ?
+                ''', (interaction.guild_id, interaction.user.id, datetime.now(), datetime.now()))
+                await self.db.record_activity(interaction.guild_id, 'tickets', connection=connection)
+            
+            # メッセージの記録を開始(ウェルカムメッセージより先に登録しておく)
+            self.bot.ticket_transcripts.track(ticket_channel.id, ticket_id)
             
             # チケットチャンネルにウェルカムメッセージを送信
             welcome_embed = discord.Embed(
@@ -404,6 +420,8 @@ class TicketButton(View):
                 ephemeral=True
             )
             logger.error(f'チケット作成エラー: {e}')
+        finally:
+            ticket_cache.end_creation(interaction.guild_id, interaction.user.id)
 
 
 class TicketPanel(commands.Cog):
@@ -420,7 +438,7 @@ class TicketPanel(commands.Cog):
         """
         self.bot = bot
     
-    @app_commands.command(name="ticket_panel", description="チケットパネルの管理")
+    @app_commands.command(name="ticket_panel", description="チケットパネルの管理", extras={"defer_ephemeral": True})
     @app_commands.describe(
         operation="操作を選択してください",
         channel="パネルを設置するチャンネル"
@@ -480,6 +498,9 @@ class TicketPanel(commands.Cog):
             try:
                 message = await channel.send(embed=panel_embed, view=view)
                 
+                # 削除時に履歴を検索しないよう、パネルのメッセージIDを登録
+                await self.bot.panel_registry.register(interaction.guild_id, channel.id, message.id, PANEL_TICKET)
+                
                 # 成功メッセージ
                 await interaction.response.send_message(
                     f"✅ {channel.mention}にチケットパネルを作成しました。",
@@ -495,15 +516,22 @@ class TicketPanel(commands.Cog):
                 )
         
         else:  # delete
-            # チャンネル内のBotのメッセージを検索してパネルを削除
+            # 登録済みのパネルのメッセージIDで削除する
             try:
-                deleted_count = 0
-                async for message in channel.history(limit=100):
-                    if message.author == self.bot.user and len(message.embeds) > 0:
-                        embed = message.embeds[0]
-                        if embed.title == "🎫 サポートチケット":
-                            await message.delete()
-                            deleted_count += 1
+                panel_ids = self.bot.panel_registry.find(channel.id, PANEL_TICKET)
+                
+                # 登録されていない場合は、登録機能の追加前に作成されたパネルを直近の履歴から検索する
+                if not panel_ids:
+                    async for message in channel.history(limit=100):
+                        if message.author == self.bot.user and len(message.embeds) > 0:
+                            embed = message.embeds[0]
+                            if embed.title == "🎫 サポートチケット":
+                                panel_ids.append(message.id)
+                
+                # 送信キュー経由で削除する(14日以内のパネルはまとめて一括削除)
+                deleted_ids = await self.bot.rest_scheduler.delete_message_ids(channel, panel_ids, PRIORITY_INTERACTIVE)
+                await self.bot.panel_registry.remove(deleted_ids)
+                deleted_count = len(deleted_ids)
                 
                 if deleted_count > 0:
                     await interaction.response.send_message(
@@ -7,12 +7,30 @@ import discord
 from discord.ext import commands
 import os
 import asyncio
+import math
 import signal
 import sys
+import time
+from datetime import datetime, timezone
 from dotenv import load_dotenv
-from utils.logger import setup_logger
-from utils.database import Database
-from utils.keep_alive import keep_alive
+from utils.logger import setup_logger, shutdown_logger, get_logging_stats
+from utils.database import Database, set_database
+from utils.message_counter import MessageCounter
+from utils.reaction_router import ReactionRouter
+from utils.ticket_transcripts import TicketTranscriptStore
+from utils.ticket_cache import TicketCache
+from utils.search_index import SearchIndex
+from utils.panel_registry import PanelRegistry
+from utils.log_sink import LogChannelSink
+from utils.rest_scheduler import RestScheduler
+from utils.dm_notifier import DmNotifier
+from utils.job_scheduler import JobScheduler
+from utils.ticket_cleanup import register_ticket_cleanup
+from utils.keep_alive import KeepAliveServer
+from utils import metrics
+from utils.command_tree import BotCommandTree
+from utils.tracing import install_http_tracing
+from utils.extension_loader import load_extensions_concurrently, format_timing_report
 
 # 環境変数の読み込み
 load_dotenv()
@@ -27,14 +45,105 @@ intents.members = True  # メンバー情報の取得
 intents.guilds = True  # サーバー情報の取得
 
 # Botクラスの初期化
-bot = commands.Bot(command_prefix="!", intents=intents)
+# enable_debug_events: Gatewayイベント種別ごとの受信数(on_socket_event_type)の記録に必要
+bot = commands.Bot(command_prefix="!", intents=intents, tree_cls=BotCommandTree, enable_debug_events=True)
 
-# データベースの初期化
+# Discord RESTの呼び出しをコマンドのトレースに記録する
+install_http_tracing(bot.http)
+
+# データベースの初期化(Bot全体で1つの接続プールを共有)
 db = Database()
+bot.db = db
+set_database(db)
+
+# メッセージ数の書き込みバッファ(一定間隔でまとめてDBに書き込む)
+message_counter = MessageCounter(db)
+bot.message_counter = message_counter
+
+# リアクションイベントの振り分け(対象メッセージ以外はDBアクセスなしで破棄)
+reaction_router = ReactionRouter(bot, db)
+bot.reaction_router = reaction_router
+bot.add_listener(reaction_router.on_raw_reaction_add)
+bot.add_listener(reaction_router.on_raw_reaction_remove)
+
+# チケットチャンネルのメッセージ記録(ログ生成時に履歴を取得しない)
+ticket_transcripts = TicketTranscriptStore(db)
+bot.ticket_transcripts = ticket_transcripts
+bot.add_listener(ticket_transcripts.on_raw_message_edit)
+bot.add_listener(ticket_transcripts.on_raw_message_delete)
+bot.add_listener(ticket_transcripts.on_raw_bulk_message_delete)
+
+# チケット・通報の全文検索インデックス
+search_index = SearchIndex(db, ticket_transcripts)
+bot.search_index = search_index
+
+# チケット作成用のキャッシュ(カテゴリと権限設定のテンプレート)
+ticket_cache = TicketCache(bot, db)
+bot.ticket_cache = ticket_cache
+bot.add_listener(ticket_cache.on_guild_role_create)
+bot.add_listener(ticket_cache.on_guild_role_update)
+bot.add_listener(ticket_cache.on_guild_role_delete)
+bot.add_listener(ticket_cache.on_guild_channel_delete)
+bot.add_listener(ticket_cache.on_guild_remove)
+
+# チケット・リアクションロールパネルのメッセージ登録(チャンネル履歴を検索せずにパネルを特定する)
+panel_registry = PanelRegistry(db)
+bot.panel_registry = panel_registry
+bot.add_listener(panel_registry.on_raw_message_delete)
+bot.add_listener(panel_registry.on_raw_bulk_message_delete)
+bot.add_listener(panel_registry.on_guild_channel_delete)
+
+# Discord RESTの送信キュー(ユーザー操作への応答をバックグラウンドの一斉送信より優先する)
+rest_scheduler = RestScheduler()
+bot.rest_scheduler = rest_scheduler
+
+# DM通知の送信キュー(コマンドの応答を待たせずにバックグラウンドで送信する)
+dm_notifier = DmNotifier(bot, db)
+bot.dm_notifier = dm_notifier
+
+# 遅延ジョブのスケジューラー(クローズしたチケットの自動削除など、再起動後も期限に実行する)
+job_scheduler = JobScheduler(bot, db)
+bot.job_scheduler = job_scheduler
+register_ticket_cleanup(bot)
+
+# ログチャンネルへの送信バッファ(Embedを最大10件ずつまとめて送信する)
+log_sink = LogChannelSink(bot)
+bot.log_sink = log_sink
+
+# Koyeb用のキープアライブサーバー(Botと同じイベントループ上で動作)
+keep_alive_server = KeepAliveServer(bot, db)
+
+# メトリクスの登録(値は /metrics の出力時に取得する)
+metrics.gateway_latency.set_function(lambda: bot.latency if math.isfinite(bot.latency) else None)
+metrics.db_pool_in_use.set_function(lambda: db.stats['in_use'])
+metrics.db_pool_waits.set_function(lambda: db.stats['waits'])
+metrics.write_queue_depth.set_function(lambda: message_counter.pending, 'message_counter')
+metrics.write_queue_depth.set_function(lambda: log_sink.backlog, 'log_sink')
+metrics.write_queue_depth.set_function(lambda: rest_scheduler.pending, 'rest_scheduler')
+metrics.write_queue_depth.set_function(lambda: dm_notifier.pending, 'dm_notifier')
+metrics.write_queue_depth.set_function(lambda: ticket_transcripts.pending, 'ticket_transcripts')
+metrics.write_queue_depth.set_function(lambda: job_scheduler.pending, 'job_scheduler')
+metrics.cache_size.set_function(lambda: db.guild_settings.cache_stats()['size'], 'guild_settings')
+metrics.cache_size.set_function(lambda: len(reaction_router), 'reaction_router')
+metrics.cache_size.set_function(lambda: len(ticket_transcripts), 'ticket_transcripts')
+metrics.cache_size.set_function(lambda: len(ticket_cache), 'ticket_cache')
+metrics.cache_size.set_function(lambda: len(panel_registry), 'panel_registry')
+metrics.install_rate_limit_counter()
+metrics.log_queue.set_function(lambda: get_logging_stats()['depth'], 'depth')
+metrics.log_queue.set_function(lambda: get_logging_stats()['enqueued'], 'enqueued')
+metrics.log_queue.set_function(lambda: get_logging_stats()['dropped'], 'dropped')
 
 # シャットダウンフラグ
 shutdown_flag = False
 
+# on_readyは再接続のたびに発生するため、一度だけ行う処理のフラグ
+startup_completed = False
+
+# 起動段階ごとの所要時間(ミリ秒)と拡張機能ごとの読み込み時間
+startup_started = time.perf_counter()
+startup_phases = {}
+extension_timings = []
+
 
 def signal_handler(sig, frame):
     """
@@ -60,18 +169,25 @@ async def on_ready():
     """
     Botが起動した際に実行されるイベント
     """
+    global startup_completed
     logger.info(f'Botが起動しました: {bot.user.name} (ID: {bot.user.id})')
     
-    # データベースの初期化
-    await db.initialize()
-    logger.info('データベースの初期化が完了しました')
-    
-    # スラッシュコマンドの同期
-    try:
-        synced = await bot.tree.sync()
-        logger.info(f'{len(synced)}個のコマンドを同期しました')
-    except Exception as e:
-        logger.error(f'コマンドの同期に失敗しました: {e}')
+    # スラッシュコマンドの同期(初回のみ・定義が変わった場合のみ)
+    if not startup_completed:
+        startup_completed = True
+        try:
+            force = os.getenv('FORCE_COMMAND_SYNC', '').lower() in ('1', 'true', 'yes')
+            await bot.tree.sync_if_changed(db, force=force)
+        except Exception as e:
+            # 次回の接続時に再試行する
+            startup_completed = False
+            logger.error(f'コマンドの同期に失敗しました: {e}')
+        
+        # 起動時間レポートの出力
+        startup_phases['起動からready(同期含む)まで'] = (time.perf_counter() - startup_started) * 1000
+        logger.info(format_timing_report(extension_timings, startup_phases))
+    else:
+        logger.info('Gatewayに再接続しました(初期化処理はスキップします)')
     
     # Botのステータス設定
     await bot.change_presence(
@@ -98,27 +214,48 @@ async def on_message(message):
     メッセージが送信された際に実行されるイベント
     統計情報の記録を行います
     """
+    started = time.perf_counter()
+    
+    # チケットチャンネルのメッセージを記録(Botのメッセージも含める)
+    ticket_transcripts.capture(message)
+    
     # Bot自身のメッセージは無視
     if message.author.bot:
         return
     
-    # 統計情報の記録
+    # 統計情報の記録(メモリ上で集計し、バックグラウンドで書き込む)
     if message.guild:
-        try:
-            await db.increment_user_message_count(
-                guild_id=message.guild.id,
-                user_id=message.author.id
-            )
-        except Exception as e:
-            logger.error(f'メッセージカウント更新エラー: {e}')
+        message_counter.increment(message.guild.id, message.author.id)
     
     # コマンド処理
     await bot.process_commands(message)
+    
+    metrics.on_message_duration.observe(time.perf_counter() - started)
+
+
+@bot.event
+async def on_socket_event_type(event_type):
+    """
+    Gatewayイベントを受信した際に実行されるイベント
+    イベント種別ごとの受信数を記録します
+    """
+    metrics.gateway_events.inc(event_type)
+
+
+@bot.event
+async def on_app_command_completion(interaction, command):
+    """
+    スラッシュコマンドが完了した際に実行されるイベント
+    インタラクション作成から完了までの時間を記録します
+    """
+    elapsed = (datetime.now(timezone.utc) - interaction.created_at).total_seconds()
+    metrics.app_command_duration.observe(elapsed, command.qualified_name)
 
 
 async def load_extensions():
     """
     コマンドのCogを読み込む関数
+    依存関係のないCogは並行して読み込みます
     """
     extensions = [
         # 基礎機能系コマンド
@@ -128,6 +265,7 @@ async def load_extensions():
         
         # 管理者系コマンド
         'commands.admin.role',
+        'commands.admin.debug',
         
         # 管理系コマンド
         'commands.moderation.timeout',
@@ -154,37 +292,90 @@ async def load_extensions():
         'commands.roles.reactionrole',
     ]
     
-    for extension in extensions:
-        try:
-            await bot.load_extension(extension)
-            logger.info(f'{extension} を読み込みました')
-        except Exception as e:
-            logger.error(f'{extension} の読み込みに失敗しました: {e}')
+    # 先に読み込む必要がある拡張機能 {拡張機能: (依存先, ...)}
+    # (共有のDB・リアクションルーターはBot本体が持つため、現在Cog間の依存はありません)
+    dependencies = {}
+    
+    timings = await load_extensions_concurrently(bot, extensions, dependencies)
+    extension_timings.extend(timings)
     
     logger.info('すべてのコマンドの読み込みが完了しました')
 
 
+async def stop_rest_services():
+    """
+    DiscordのAPIを使うバックグラウンド処理を停止する関数
+    BotのHTTPセッションを閉じる前(bot.close()より前)に呼び出す必要があります
+    """
+    # 遅延ジョブの実行を停止する(残りのジョブは次回の起動時に実行)
+    try:
+        await job_scheduler.stop()
+    except Exception as e:
+        logger.error(f'ジョブスケジューラー停止エラー: {e}')
+    
+    # DM通知の送信を停止する(未送信の通知は次回の起動時に送信)
+    try:
+        await dm_notifier.stop()
+    except Exception as e:
+        logger.error(f'DM通知キュー停止エラー: {e}')
+    
+    # 未送信のログをBotの接続を閉じる前に送信する
+    try:
+        await log_sink.stop()
+    except Exception as e:
+        logger.error(f'ログチャンネル送信エラー: {e}')
+    
+    # キューに残っているREST呼び出しを実行する
+    try:
+        await rest_scheduler.stop()
+    except Exception as e:
+        logger.error(f'REST送信キュー停止エラー: {e}')
+
+
 async def main():
     """
     メイン関数
     """
     try:
         async with bot:
-            # Cogの読み込み
-            await load_extensions()
-            
-            # Koyeb用のキープアライブサーバー起動
-            keep_alive()
-            
-            # Botの起動
-            token = os.getenv('DISCORD_TOKEN')
-            if not token:
-                logger.error('DISCORD_TOKENが設定されていません')
-                logger.error('.envファイルを確認してください')
-                return
-            
-            logger.info('Botを起動しています...')
-            await bot.start(token)
+            try:
+                # データベースの初期化(Cogより先に接続プールを用意する)
+                phase_started = time.perf_counter()
+                await db.initialize()
+                message_counter.start()
+                rest_scheduler.start()
+                log_sink.start()
+                dm_notifier.start()
+                job_scheduler.start()
+                await reaction_router.load()
+                await panel_registry.load()
+                await ticket_transcripts.load()
+                ticket_transcripts.start()
+                startup_phases['データベース初期化'] = (time.perf_counter() - phase_started) * 1000
+                
+                # Cogの読み込み
+                phase_started = time.perf_counter()
+                await load_extensions()
+                startup_phases['Cogの読み込み'] = (time.perf_counter() - phase_started) * 1000
+                
+                # Koyeb用のキープアライブサーバー起動(起動に失敗してもBotは動かす)
+                try:
+                    await keep_alive_server.start()
+                except OSError as e:
+                    logger.error(f'キープアライブサーバーの起動に失敗しました: {e}')
+                
+                # Botの起動
+                token = os.getenv('DISCORD_TOKEN')
+                if not token:
+                    logger.error('DISCORD_TOKENが設定されていません')
+                    logger.error('.envファイルを確認してください')
+                    return
+                
+                logger.info('Botを起動しています...')
+                await bot.start(token)
+            finally:
+                # ログ・通知・キューに残ったREST呼び出しをBotの接続を閉じる前に送信する
+                await stop_rest_services()
     
     except KeyboardInterrupt:
         logger.info('キーボード割り込みを検出しました')
@@ -197,6 +388,25 @@ async def main():
         if not bot.is_closed():
             await bot.close()
         
+        # キープアライブサーバーを停止
+        try:
+            await keep_alive_server.stop()
+        except Exception as e:
+            logger.error(f'キープアライブサーバー停止エラー: {e}')
+        
+        # 未書き込みのチケットメッセージを書き込む
+        try:
+            await ticket_transcripts.stop()
+        except Exception as e:
+            logger.error(f'チケットメッセージ書き込みエラー: {e}')
+        
+        # 未書き込みのメッセージ数を書き込む
+        try:
+            await message_counter.stop()
+            logger.info('メッセージカウントを書き込みました')
+        except Exception as e:
+            logger.error(f'メッセージカウント書き込みエラー: {e}')
+        
         # データベース接続を閉じる
         try:
             await db.close()
@@ -220,3 +430,6 @@ if __name__ == '__main__':
     except Exception as e:
         logger.error(f'予期しないエラーが発生しました: {e}')
         sys.exit(1)
+    finally:
+        # キューに残っているログを書き出してから終了する
+        shutdown_logger()
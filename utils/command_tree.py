@@ -0,0 +1,254 @@
+"""
+コマンドツリーユーティリティ
+すべてのスラッシュコマンド実行を共通処理(トレース・自動defer)で包むCommandTreeです
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+import discord
+from discord import app_commands
+from utils.logger import get_logger
+from utils.metrics import app_command_auto_deferred
+from utils.tracing import tracer
+
+logger = get_logger()
+
+
+class AutoDeferResponse:
+    """
+    interaction.responseの代わりに使うラッパー
+    自動でdeferした後のsend_messageをfollowup.sendに振り替えます
+    自動deferは既定で公開し、本人のみに応答するコマンドは extras={"defer_ephemeral": True} で非公開にします
+    """
+    
+    def __init__(self, interaction: discord.Interaction, response: discord.InteractionResponse):
+        """
+        初期化
+        
+        Args:
+            interaction: インタラクション
+            response: 元のInteractionResponse
+        """
+        self._interaction = interaction
+        self._response = response
+        self._lock = asyncio.Lock()
+        self.auto_deferred = False
+        self.deferred_ephemeral = False
+        # 自動defer後にsend_messageで応答したか
+        self.replied = False
+    
+    def __getattr__(self, name):
+        """
+        振り替え対象以外の属性は元のInteractionResponseに任せる
+        
+        Args:
+            name: 属性名
+        """
+        return getattr(self._response, name)
+    
+    async def auto_defer(self, ephemeral: bool = False) -> bool:
+        """
+        まだ応答していない場合にdeferする
+        
+        Args:
+            ephemeral: 後続の応答を本人のみに表示するか
+        
+        Returns:
+            bool: deferした場合True
+        """
+        async with self._lock:
+            if self._response.is_done():
+                return False
+            
+            await self._response.defer(ephemeral=ephemeral, thinking=True)
+            self.auto_deferred = True
+            self.deferred_ephemeral = ephemeral
+            return True
+    
+    async def defer(self, **kwargs):
+        """
+        defer(自動でdefer済みの場合は何もしない)
+        """
+        async with self._lock:
+            if self.auto_deferred:
+                return
+            await self._response.defer(**kwargs)
+    
+    async def send_message(self, content=None, **kwargs):
+        """
+        応答メッセージを送信する(自動でdefer済みの場合はfollowupで送信)
+        
+        Args:
+            content: メッセージ内容
+            **kwargs: InteractionResponse.send_messageの引数
+        """
+        async with self._lock:
+            if not self.auto_deferred:
+                return await self._response.send_message(content, **kwargs)
+        
+        # 最初のfollowupは「考え中」のメッセージを置き換えるため、表示範囲はdefer時のものになる
+        # 表示範囲が異なる場合は「考え中」のメッセージを削除し、新しいメッセージとして送信する
+        if not self.replied and kwargs.get('ephemeral', False) != self.deferred_ephemeral:
+            try:
+                await self._interaction.delete_original_response()
+            except discord.HTTPException as e:
+                logger.warning(f'自動deferの応答の削除に失敗しました: {e}')
+        self.replied = True
+        
+        # followup.sendはdelete_afterに対応していないため送信後に削除する
+        delete_after = kwargs.pop('delete_after', None)
+        message = await self._interaction.followup.send(content, wait=True, **kwargs)
+        if delete_after is not None:
+            await message.delete(delay=delete_after)
+    
+    async def finish(self):
+        """
+        コマンド終了時の後始末
+        自動deferした後に応答せず終了した場合、「考え中」のまま残ったメッセージを削除します
+        """
+        if not self.auto_deferred or self.replied:
+            return
+        
+        try:
+            # followupを直接使って応答したコマンドもあるため、メッセージの状態で判定する
+            original = await self._interaction.original_response()
+            if original.flags.loading:
+                await self._interaction.delete_original_response()
+        except discord.HTTPException as e:
+            logger.warning(f'自動deferの応答の削除に失敗しました: {e}')
+
+
+class BotCommandTree(app_commands.CommandTree):
+    """
+    Bot用のCommandTree
+    インタラクションごとにルートスパンを開始し、コマンド内のDB・REST呼び出しを子スパンとして記録します
+    応答予算(INTERACTION_DEFER_BUDGET、既定値2秒)を超えたコマンドは自動でdeferします
+    """
+    
+    def __init__(self, *args, **kwargs):
+        """
+        初期化
+        """
+        super().__init__(*args, **kwargs)
+        self.defer_budget = float(os.getenv('INTERACTION_DEFER_BUDGET', '2.0'))
+    
+    def fingerprint(self) -> str:
+        """
+        登録されているコマンド定義のハッシュを計算する
+        
+        Returns:
+            str: SHA-256のハッシュ値
+        """
+        payload = sorted(
+            (command.to_dict() for command in self.get_commands()),
+            key=lambda command: (command.get('type', 1), command['name'])
+        )
+        encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+    
+    async def sync_if_changed(self, db, force: bool = False) -> bool:
+        """
+        コマンド定義が前回の同期から変わっている場合のみグローバル同期する
+        
+        Args:
+            db: 共有Databaseインスタンス(前回のハッシュの保存先)
+            force: ハッシュに関係なく同期する場合True
+        
+        Returns:
+            bool: 同期した場合True
+        """
+        state_key = f'command_tree_hash:{self.client.application_id}'
+        fingerprint = self.fingerprint()
+        
+        if not force and await db.get_state(state_key) == fingerprint:
+            logger.info('コマンド定義に変更がないため同期をスキップしました')
+            return False
+        
+        synced = await self.sync()
+        await db.set_state(state_key, fingerprint)
+        logger.info(f'{len(synced)}個のコマンドを同期しました')
+        return True
+    
+    async def _call(self, interaction: discord.Interaction):
+        """
+        インタラクションを処理する(discord.pyから呼ばれます)
+        
+        Args:
+            interaction: インタラクション
+        """
+        if interaction.type is not discord.InteractionType.application_command:
+            return await super()._call(interaction)
+        
+        name = _command_name(interaction.data or {})
+        with tracer.trace(f'/{name}', guild=interaction.guild_id, user=interaction.user.id):
+            # 応答が遅いコマンドを監視し、期限内に応答がなければdeferする
+            response = AutoDeferResponse(interaction, interaction.response)
+            interaction._cs_response = response
+            watcher = asyncio.create_task(self._defer_if_slow(interaction, response, name))
+            try:
+                await super()._call(interaction)
+            finally:
+                watcher.cancel()
+                await response.finish()
+    
+    async def _defer_if_slow(self, interaction: discord.Interaction, response: AutoDeferResponse, name: str):
+        """
+        応答期限までに応答がなければdeferする内部関数
+        
+        Args:
+            interaction: インタラクション
+            response: 応答のラッパー
+            name: コマンド名
+        """
+        # インタラクション作成から数えて予算を超えたらdeferする(Discordの期限は3秒)
+        elapsed = (datetime.now(timezone.utc) - interaction.created_at).total_seconds()
+        await asyncio.sleep(max(0.0, self.defer_budget - elapsed))
+        
+        # 既定では通常の応答と同じく公開でdeferし、本人のみに応答するコマンドは指定により非公開にする
+        command = interaction.command
+        ephemeral = bool(command.extras.get('defer_ephemeral', False)) if command else False
+        
+        try:
+            if await response.auto_defer(ephemeral=ephemeral):
+                app_command_auto_deferred.inc(name)
+                logger.info(f'/{name} の応答が{self.defer_budget}秒以内に無かったため自動でdeferしました')
+        except discord.HTTPException as e:
+            logger.warning(f'/{name} の自動deferに失敗しました: {e}')
+    
+    async def on_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        """
+        コマンドでエラーが発生した際の処理
+        トレースにエラーを記録してから既定の処理を行います
+        
+        Args:
+            interaction: インタラクション
+            error: 発生したエラー
+        """
+        span = tracer.current()
+        if span is not None:
+            original = getattr(error, 'original', error)
+            span.root.error = type(original).__name__
+        
+        await super().on_error(interaction, error)
+
+
+def _command_name(data: dict) -> str:
+    """
+    インタラクションのデータからサブコマンドを含むコマンド名を作る内部関数
+    
+    Args:
+        data: interaction.data
+    
+    Returns:
+        str: "debug trace" のようなコマンド名
+    """
+    parts = [data.get('name', '?')]
+    options = data.get('options') or []
+    # サブコマンド(type 1)・サブコマンドグループ(type 2)をたどる
+    while options and options[0].get('type') in (1, 2):
+        parts.append(options[0].get('name', '?'))
+        options = options[0].get('options') or []
+    return ' '.join(parts)
@@ -4,138 +4,291 @@ SQLiteデータベースを使用してBot情報を管理します
 """
 
 import aiosqlite
+import asyncio
 import os
+import time
+from contextlib import asynccontextmanager, contextmanager
 from datetime import datetime
 from utils.logger import get_logger
+from utils.migrations import run_migrations
+from utils.guild_settings import GuildSettingsCache
+from utils.metrics import db_query_duration
+from utils.tracing import tracer
 
 logger = get_logger()
 
+# Botが保持する共有データベースインスタンス
+_shared_database = None
+
+
+def set_database(db):
+    """
+    共有データベースインスタンスを登録する関数
+    
+    Args:
+        db: Botが保持するDatabaseインスタンス
+    """
+    global _shared_database
+    _shared_database = db
+
+
+def get_database():
+    """
+    共有データベースインスタンスを取得する関数
+    
+    Returns:
+        Database: 登録済みのDatabaseインスタンス
+    """
+    return _shared_database
+
 
 class Database:
     """
     データベース管理クラス
+    接続プールを持ち、Bot全体で1つのインスタンスを共有します
     """
     
-    def __init__(self):
+    def __init__(self, db_path: str = 'data/bot_database.db', pool_size: int = None):
         """
         データベースの初期化
+        
+        Args:
+            db_path: データベースファイルのパス
+            pool_size: 接続プールのサイズ(省略時は環境変数DB_POOL_SIZE、既定値4)
         """
-        self.db_path = 'data/bot_database.db'
-        self.connection = None
+        self.db_path = db_path
+        self.pool_size = pool_size or int(os.getenv('DB_POOL_SIZE', '4'))
+        self._connections = []
+        self._pool = None
+        self._init_lock = asyncio.Lock()
+        
+        # サーバー設定のキャッシュ
+        self.guild_settings = GuildSettingsCache(self)
+        
+        # プール使用状況のカウンター
+        self.stats = {
+            'acquired': 0,
+            'in_use': 0,
+            'peak_in_use': 0,
+            'waits': 0,
+            'total_wait_ms': 0.0,
+            'max_wait_ms': 0.0
+        }
     
     async def initialize(self):
         """
-        データベースの初期化とテーブル作成
-        """
-        # データディレクトリの作成
-        os.makedirs('data', exist_ok=True)
-        
-        # データベース接続
-        self.connection = await aiosqlite.connect(self.db_path)
-        
-        # テーブルの作成
-        await self._create_tables()
-        
-        logger.info('データベースの初期化が完了しました')
-    
-    async def _create_tables(self):
-        """
-        必要なテーブルを作成する内部関数
-        """
-        # サーバー設定テーブル
-        await self.connection.execute('''
-            CREATE TABLE IF NOT EXISTS guild_settings (
-                guild_id INTEGER PRIMARY KEY,
-                admin_role_ids TEXT,
-                bot_role_ids TEXT,
-                public_log_channel_id INTEGER,
-                private_log_channel_id INTEGER,
-                report_log_channel_id INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # ユーザー統計テーブル
-        await self.connection.execute('''
-            CREATE TABLE IF NOT EXISTS user_stats (
-                guild_id INTEGER,
-                user_id INTEGER,
-                message_count INTEGER DEFAULT 0,
-                timeout_count INTEGER DEFAULT 0,
-                kick_count INTEGER DEFAULT 0,
-                ban_count INTEGER DEFAULT 0,
-                ticket_count INTEGER DEFAULT 0,
-                last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                PRIMARY KEY (guild_id, user_id)
-            )
-        ''')
-        
-        # チケットテーブル
-        await self.connection.execute('''
-            CREATE TABLE IF NOT EXISTS tickets (
-                ticket_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                guild_id INTEGER,
-                channel_id INTEGER,
-                creator_id INTEGER,
-                status TEXT DEFAULT 'open',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                closed_at TIMESTAMP
-            )
-        ''')
-        
-        # アンケートテーブル
-        await self.connection.execute('''
-            CREATE TABLE IF NOT EXISTS questionnaires (
-                questionnaire_id TEXT PRIMARY KEY,
-                guild_id INTEGER,
-                channel_id INTEGER,
-                message_id INTEGER,
-                creator_id INTEGER,
-                content TEXT,
-                status TEXT DEFAULT 'open',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # レポートテーブル
-        await self.connection.execute('''
-            CREATE TABLE IF NOT EXISTS reports (
-                report_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                guild_id INTEGER,
-                reporter_id INTEGER,
-                target_type TEXT,
-                target_id INTEGER,
-                content TEXT,
-                ticket_created BOOLEAN DEFAULT FALSE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # 統計送信設定テーブル
-        await self.connection.execute('''
-            CREATE TABLE IF NOT EXISTS stats_schedule (
-                guild_id INTEGER PRIMARY KEY,
-                channel_id INTEGER,
-                period TEXT,
-                last_sent TIMESTAMP
-            )
-        ''')
-        
-        # モデレーションログテーブル
-        await self.connection.execute('''
-            CREATE TABLE IF NOT EXISTS moderation_logs (
-                log_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                guild_id INTEGER,
-                moderator_id INTEGER,
-                target_id INTEGER,
-                action_type TEXT,
-                reason TEXT,
-                duration INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        await self.connection.commit()
+        接続プールの作成とテーブル作成
+        2回目以降の呼び出しでは何もしません
+        """
+        async with self._init_lock:
+            if self._pool is not None:
+                return
+            
+            # データディレクトリの作成
+            os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        
+            # 接続プールの作成
+            pool = asyncio.Queue(maxsize=self.pool_size)
+            for _ in range(self.pool_size):
+                connection = await aiosqlite.connect(self.db_path)
+                # 複数接続での読み書きを両立させる設定
+                await connection.execute('PRAGMA journal_mode=WAL')
+                await connection.execute('PRAGMA busy_timeout=5000')
+                self._connections.append(connection)
+                pool.put_nowait(connection)
+            
+            # スキーマのマイグレーション
+            # (完了するまでプールを公開せず、acquire()の呼び出し元は初期化のロックで待たせる)
+            connection = pool.get_nowait()
+            try:
+                await run_migrations(connection)
+            except Exception:
+                for opened in self._connections:
+                    await opened.close()
+                self._connections.clear()
+                raise
+            pool.put_nowait(connection)
+            
+            self._pool = pool
+        
+            logger.info(f'データベースの初期化が完了しました(接続プール: {self.pool_size})')
+    
+    @asynccontextmanager
+    async def acquire(self):
+        """
+        接続プールから接続を1つ借りる
+        
+        Yields:
+            aiosqlite.Connection: データベース接続
+        """
+        if self._pool is None:
+            await self.initialize()
+        
+        if self._pool.empty():
+            self.stats['waits'] += 1
+        
+        started = time.perf_counter()
+        connection = await self._pool.get()
+        wait_ms = (time.perf_counter() - started) * 1000
+        
+        self.stats['acquired'] += 1
+        self.stats['total_wait_ms'] += wait_ms
+        self.stats['max_wait_ms'] = max(self.stats['max_wait_ms'], wait_ms)
+        self.stats['in_use'] += 1
+        self.stats['peak_in_use'] = max(self.stats['peak_in_use'], self.stats['in_use'])
+        
+        try:
+            yield connection
+        finally:
+            self.stats['in_use'] -= 1
+            self._pool.put_nowait(connection)
+    
+    @contextmanager
+    def _observe(self, operation: str, query: str = None):
+        """
+        クエリの所要時間をメトリクスとトレースに記録する内部関数
+        
+        Args:
+            operation: 操作名
+            query: SQL文(トレースには先頭部分のみ記録)
+        """
+        attributes = {}
+        if query:
+            sql = ' '.join(query.split())
+            attributes['sql'] = sql[:60] + ('…' if len(sql) > 60 else '')
+        
+        started = time.perf_counter()
+        try:
+            with tracer.span(f'db.{operation}', **attributes):
+                yield
+        finally:
+            db_query_duration.observe(time.perf_counter() - started, operation)
+    
+    @asynccontextmanager
+    async def transaction(self, operation: str = 'transaction', query: str = None):
+        """
+        接続を借りてトランザクションを実行する
+        正常終了時はコミット、例外時はロールバックします
+        
+        Args:
+            operation: メトリクス・トレースに記録する操作名
+            query: トレースに記録するSQL文
+        
+        Yields:
+            aiosqlite.Connection: データベース接続
+        """
+        with self._observe(operation, query):
+            async with self.acquire() as connection:
+                try:
+                    yield connection
+                    await connection.commit()
+                except BaseException:
+                    await connection.rollback()
+                    raise
+    
+    async def execute(self, query: str, params: tuple = ()):
+        """
+        更新系のSQLを実行してコミットする
+        
+        Args:
+            query: SQL文
+            params: パラメータ
+        
+        Returns:
+            aiosqlite.Cursor: 実行後のカーソル(lastrowid/rowcountの参照用)
+        """
+        async with self.transaction('execute', query) as connection:
+            return await connection.execute(query, params)
+    
+    async def executemany(self, query: str, params_list: list):
+        """
+        同じSQLを複数のパラメータで実行してコミットする
+        
+        Args:
+            query: SQL文
+            params_list: パラメータのリスト
+        """
+        async with self.transaction('executemany', query) as connection:
+            await connection.executemany(query, params_list)
+    
+    async def fetchone(self, query: str, params: tuple = ()):
+        """
+        SQLを実行して1行を取得する
+        
+        Args:
+            query: SQL文
+            params: パラメータ
+        
+        Returns:
+            tuple: 取得した行(存在しない場合None)
+        """
+        with self._observe('fetchone', query):
+            async with self.acquire() as connection:
+                cursor = await connection.execute(query, params)
+                return await cursor.fetchone()
+    
+    async def fetchall(self, query: str, params: tuple = ()):
+        """
+        SQLを実行して全行を取得する
+        
+        Args:
+            query: SQL文
+            params: パラメータ
+        
+        Returns:
+            list: 取得した行のリスト
+        """
+        with self._observe('fetchall', query):
+            async with self.acquire() as connection:
+                cursor = await connection.execute(query, params)
+                return await cursor.fetchall()
+    
+    def pool_stats(self) -> dict:
+        """
+        接続プールの使用状況を取得
+        
+        Returns:
+            dict: プールサイズ、使用中の接続数、待ち回数などの統計
+        """
+        stats = dict(self.stats)
+        stats['size'] = self.pool_size
+        stats['available'] = self._pool.qsize() if self._pool else 0
+        stats['avg_wait_ms'] = (
+            stats['total_wait_ms'] / stats['acquired'] if stats['acquired'] else 0.0
+        )
+        return stats
+    
+    async def get_state(self, key: str):
+        """
+        Bot全体の状態を取得
+        
+        Args:
+            key: キー
+        
+        Returns:
+            str: 保存されている値(存在しない場合None)
+        """
+        row = await self.fetchone('''
+            SELECT value FROM bot_state
+            WHERE key = ?
+        ''', (key,))
+        return row[0] if row else None
+    
+    async def set_state(self, key: str, value: str):
+        """
+        Bot全体の状態を保存
+        
+        Args:
+            key: キー
+            value: 値
+        """
+        await self.execute('''
+            INSERT INTO bot_state (key, value, updated_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(key) DO UPDATE SET
+                value = excluded.value,
+                updated_at = excluded.updated_at
+        ''', (key, value))
     
     async def initialize_guild(self, guild_id: int):
         """
@@ -144,11 +297,10 @@ class Database:
         Args:
             guild_id: サーバーID
         """
-        await self.connection.execute('''
+        await self.execute('''
             INSERT OR IGNORE INTO guild_settings (guild_id)
             VALUES (?)
         ''', (guild_id,))
-        await self.connection.commit()
     
     async def increment_user_message_count(self, guild_id: int, user_id: int):
         """
@@ -158,14 +310,158 @@ class Database:
             guild_id: サーバーID
             user_id: ユーザーID
         """
-        await self.connection.execute('''
-            INSERT INTO user_stats (guild_id, user_id, message_count, last_updated)
-            VALUES (?, ?, 1, ?)
-            ON CONFLICT(guild_id, user_id) DO UPDATE SET
-                message_count = message_count + 1,
-                last_updated = ?
-        ''', (guild_id, user_id, datetime.now(), datetime.now()))
-        await self.connection.commit()
+        await self.add_user_message_counts([(guild_id, user_id, 1, datetime.now())])
+    
+    async def add_user_message_counts(self, rows: list):
+        """
+        複数ユーザーのメッセージカウントをまとめて加算する
+        期間集計用のアクティビティバケットも同じトランザクションで更新します
+        
+        Args:
+            rows: (サーバーID, ユーザーID, 加算数, 更新日時)のリスト
+        """
+        guild_totals = {}
+        user_days = []
+        for guild_id, user_id, count, updated_at in rows:
+            key = (guild_id, updated_at.strftime('%Y-%m-%d %H:00:00'), updated_at.strftime('%Y-%m-%d'))
+            guild_totals[key] = guild_totals.get(key, 0) + count
+            user_days.append((guild_id, updated_at.strftime('%Y-%m-%d'), user_id, count))
+        
+        bucket_rows = []
+        for (guild_id, hour, day), count in guild_totals.items():
+            bucket_rows.append((guild_id, 'hour', hour, 'messages', count))
+            bucket_rows.append((guild_id, 'day', day, 'messages', count))
+        
+        async with self.transaction() as connection:
+            await connection.executemany('''
+                INSERT INTO user_stats (guild_id, user_id, message_count, last_updated)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(guild_id, user_id) DO UPDATE SET
+                    message_count = message_count + excluded.message_count,
+                    last_updated = excluded.last_updated
+            ''', rows)
+            
+            await connection.executemany('''
+                INSERT INTO activity_user_days (guild_id, day, user_id, message_count)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(guild_id, day, user_id) DO UPDATE SET
+                    message_count = message_count + excluded.message_count
+            ''', user_days)
+            
+            await self._upsert_activity_buckets(connection, bucket_rows)
+    
+    async def record_activity(self, guild_id: int, metric: str, amount: int = 1, connection=None):
+        """
+        アクティビティバケットに件数を加算する
+        
+        Args:
+            guild_id: サーバーID
+            metric: 集計項目('tickets', 'moderation:<action_type>' など)
+            amount: 加算数
+            connection: 使用中のトランザクションの接続(省略時は新しいトランザクション)
+        """
+        now = datetime.now()
+        bucket_rows = [
+            (guild_id, 'hour', now.strftime('%Y-%m-%d %H:00:00'), metric, amount),
+            (guild_id, 'day', now.strftime('%Y-%m-%d'), metric, amount)
+        ]
+        
+        if connection is not None:
+            await self._upsert_activity_buckets(connection, bucket_rows)
+        else:
+            async with self.transaction() as connection:
+                await self._upsert_activity_buckets(connection, bucket_rows)
+    
+    async def _upsert_activity_buckets(self, connection, bucket_rows: list):
+        """
+        アクティビティバケットを加算する内部関数
+        
+        Args:
+            connection: データベース接続
+            bucket_rows: (サーバーID, 粒度, バケット開始, 集計項目, 加算数)のリスト
+        """
+        await connection.executemany('''
+            INSERT INTO activity_buckets (guild_id, granularity, bucket_start, metric, count)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(guild_id, granularity, bucket_start, metric) DO UPDATE SET
+                count = count + excluded.count
+        ''', bucket_rows)
+    
+    async def get_activity_summary(self, guild_id: int, start_date: datetime):
+        """
+        指定日以降のアクティビティを集計する
+        アクティブユーザーが日単位でしか記録されないため、すべての項目を開始日の0時からの日単位で集計します
+        
+        Args:
+            guild_id: サーバーID
+            start_date: 集計開始日時(その日の0時から集計)
+            
+        Returns:
+            dict: メッセージ数、チケット数、モデレーション件数、アクティブユーザー数、上位ユーザー
+        """
+        start_day = start_date.strftime('%Y-%m-%d')
+        
+        async with self.acquire() as connection:
+            cursor = await connection.execute('''
+                SELECT metric, SUM(count) FROM activity_buckets
+                WHERE guild_id = ? AND granularity = 'day' AND bucket_start >= ?
+                GROUP BY metric
+            ''', (guild_id, start_day))
+            
+            metrics = await cursor.fetchall()
+            
+            cursor = await connection.execute('''
+                SELECT COUNT(DISTINCT user_id) FROM activity_user_days
+                WHERE guild_id = ? AND day >= ?
+            ''', (guild_id, start_day))
+            
+            row = await cursor.fetchone()
+            active_users = row[0] if row[0] else 0
+            
+            cursor = await connection.execute('''
+                SELECT user_id, SUM(message_count) AS total FROM activity_user_days
+                WHERE guild_id = ? AND day >= ?
+                GROUP BY user_id
+                ORDER BY total DESC
+                LIMIT 5
+            ''', (guild_id, start_day))
+            
+            top_users = await cursor.fetchall()
+        
+        summary = {
+            'messages': 0,
+            'tickets': 0,
+            'moderation': {},
+            'active_users': active_users,
+            'top_users': top_users
+        }
+        
+        for metric, count in metrics:
+            if metric.startswith('moderation:'):
+                summary['moderation'][metric.split(':', 1)[1]] = count
+            elif metric in summary:
+                summary[metric] = count
+        
+        return summary
+    
+    async def prune_activity(self, before: datetime):
+        """
+        古いアクティビティ集計を削除する
+        日単位のバケットは長期の集計用に残します
+        
+        Args:
+            before: この日時より前の時間単位バケットとユーザー別集計を削除
+        """
+        async with self.transaction() as connection:
+            await connection.execute('''
+                DELETE FROM activity_buckets
+                WHERE granularity = 'hour' AND bucket_start < ?
+            ''', (before.strftime('%Y-%m-%d %H:00:00'),))
+            
+            await connection.execute('''
+                DELETE FROM activity_user_days
+                WHERE day < ?
+            ''', (before.strftime('%Y-%m-%d'),))
     
     async def get_user_stats(self, guild_id: int, user_id: int):
         """
@@ -178,14 +474,12 @@ class Database:
         Returns:
             dict: ユーザーの統計情報
         """
-        cursor = await self.connection.execute('''
+        row = await self.fetchone('''
             SELECT message_count, timeout_count, kick_count, ban_count, ticket_count
             FROM user_stats
             WHERE guild_id = ? AND user_id = ?
         ''', (guild_id, user_id))
         
-        row = await cursor.fetchone()
-        
         if row:
             return {
                 'message_count': row[0],
@@ -205,7 +499,23 @@ class Database:
     
     async def close(self):
         """
-        データベース接続を閉じる
+        接続プールのすべての接続を閉じる
         """
-        if self.connection:
-            await self.connection.close()
\ No newline at end of file
+        if self._pool is None:
+            return
+        
+        stats = self.pool_stats()
+        logger.info(
+            f"接続プール統計: 取得{stats['acquired']}回, 待機{stats['waits']}回, "
+            f"最大同時使用{stats['peak_in_use']}/{stats['size']}, "
+            f"最大待機{stats['max_wait_ms']:.1f}ms"
+        )
+        
+        for connection in self._connections:
+            try:
+                await connection.close()
+            except Exception as e:
+                logger.error(f'データベース接続クローズエラー: {e}')
+        
+        self._connections = []
+        self._pool = None
@@ -0,0 +1,319 @@
+"""
+DM通知キューユーティリティ
+モデレーション通知などのDMをデータベースのキューに保存し、バックグラウンドで送信します
+"""
+
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta
+import discord
+from utils.logger import get_logger
+from utils.metrics import dm_notifications, dm_delivery_delay
+from utils.rest_scheduler import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
+
+logger = get_logger()
+
+
+class DmNotifier:
+    """
+    DM通知の送信キュー
+    通知はデータベースに保存されるため、Botが再起動しても未送信の通知は失われません
+    一時的なエラーは間隔を空けて再試行し、DMを受け付けないユーザーへの通知は再試行しません
+    """
+    
+    def __init__(self, bot, db, max_per_guild: int = None, max_attempts: int = None, backoff: float = None,
+                 poll_interval: float = None, immediate_timeout: float = None):
+        """
+        初期化
+        
+        Args:
+            bot: Botインスタンス
+            db: 共有Databaseインスタンス
+            max_per_guild: サーバーごとの同時送信数(省略時は環境変数DM_MAX_PER_GUILD、既定値2)
+            max_attempts: 送信を試みる最大回数(省略時は環境変数DM_MAX_ATTEMPTS、既定値5)
+            backoff: 再試行までの基本待ち時間(省略時は環境変数DM_RETRY_BACKOFF、既定値30秒)
+            poll_interval: 再試行待ちの通知を確認する間隔(省略時は環境変数DM_POLL_INTERVAL、既定値10秒)
+            immediate_timeout: 即時送信を待つ最大秒数(省略時は環境変数DM_IMMEDIATE_TIMEOUT、既定値1.5秒)
+        """
+        self.bot = bot
+        self.db = db
+        self.max_per_guild = max_per_guild or int(os.getenv('DM_MAX_PER_GUILD', '2'))
+        self.max_attempts = max_attempts or int(os.getenv('DM_MAX_ATTEMPTS', '5'))
+        self.backoff = backoff or float(os.getenv('DM_RETRY_BACKOFF', '30'))
+        self.poll_interval = poll_interval or float(os.getenv('DM_POLL_INTERVAL', '10'))
+        self.immediate_timeout = immediate_timeout or float(os.getenv('DM_IMMEDIATE_TIMEOUT', '1.5'))
+        self.retention_days = int(os.getenv('DM_RETENTION_DAYS', '7'))
+        # 送信中の通知ID
+        self._in_flight = set()
+        # guild_id -> 送信中の件数
+        self._active_per_guild = {}
+        self._deliveries = set()
+        self._pending = 0
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._stopping = False
+    
+    @property
+    def pending(self) -> int:
+        """
+        未送信の通知数(最後に確認した時点の値)
+        
+        Returns:
+            int: 未送信の通知数
+        """
+        return self._pending
+    
+    async def enqueue(self, guild_id: int, user_id: int, embed: discord.Embed, dedup_key: str = None) -> bool:
+        """
+        DM通知をキューに追加する
+        通知は失敗してもモデレーション操作に影響しないよう、エラーは記録のみ行います
+        
+        Args:
+            guild_id: サーバーID
+            user_id: 送信先のユーザーID
+            embed: 送信するEmbed
+            dedup_key: 重複防止キー(同じキーの通知が送信待ちの場合は追加しない)
+        
+        Returns:
+            bool: 追加した場合True
+        """
+        if await self._insert(guild_id, user_id, embed, dedup_key) is None:
+            return False
+        
+        self._wakeup.set()
+        return True
+    
+    async def send_now(self, guild_id: int, user_id: int, embed: discord.Embed, dedup_key: str = None) -> bool:
+        """
+        DM通知をキューに追加し、最初の送信をその場で優先的に行う
+        キック・BANのように、操作の後ではDMを受け取れなくなる通知を操作の前に送るために使います
+        送信が期限内に終わらない・失敗した場合は、通常の通知と同様にキューから送信(再試行)されます
+        
+        Args:
+            guild_id: サーバーID
+            user_id: 送信先のユーザーID
+            embed: 送信するEmbed
+            dedup_key: 重複防止キー(同じキーの通知が送信待ちの場合は追加しない)
+        
+        Returns:
+            bool: 期限内に送信できた場合True
+        """
+        notification_id = await self._insert(guild_id, user_id, embed, dedup_key)
+        if notification_id is None or notification_id in self._in_flight:
+            return False
+        
+        self._in_flight.add(notification_id)
+        self._active_per_guild[guild_id] = self._active_per_guild.get(guild_id, 0) + 1
+        task = asyncio.create_task(
+            self._deliver(notification_id, guild_id, user_id, json.dumps(embed.to_dict(), ensure_ascii=False),
+                          0, datetime.now(), PRIORITY_INTERACTIVE)
+        )
+        self._deliveries.add(task)
+        task.add_done_callback(self._deliveries.discard)
+        
+        # 期限を過ぎても送信は中断せず、バックグラウンドで続ける
+        done, _ = await asyncio.wait({task}, timeout=self.immediate_timeout)
+        return bool(done) and task.result()
+    
+    async def _insert(self, guild_id: int, user_id: int, embed: discord.Embed, dedup_key: str = None):
+        """
+        DM通知をデータベースのキューに保存する内部関数
+        
+        Args:
+            guild_id: サーバーID
+            user_id: 送信先のユーザーID
+            embed: 送信するEmbed
+            dedup_key: 重複防止キー
+        
+        Returns:
+            int: 通知ID(追加しなかった場合None)
+        """
+        now = datetime.now()
+        try:
+            cursor = await self.db.execute('''
+                INSERT OR IGNORE INTO dm_notifications
+                (guild_id, user_id, dedup_key, embed, created_at, next_attempt_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (guild_id, user_id, dedup_key, json.dumps(embed.to_dict(), ensure_ascii=False), now, now))
+        except Exception as e:
+            logger.error(f'DM通知の追加に失敗しました (ユーザーID: {user_id}): {e}')
+            return None
+        
+        if cursor.rowcount == 0:
+            dm_notifications.inc('deduplicated')
+            return None
+        
+        self._pending += 1
+        return cursor.lastrowid
+    
+    async def _dispatch(self):
+        """
+        送信時刻になった通知を取り出し、サーバーごとの上限まで送信を開始する内部関数
+        """
+        now = datetime.now()
+        rows = await self.db.fetchall('''
+            SELECT id, guild_id, user_id, embed, attempts, created_at
+            FROM dm_notifications
+            WHERE status = 'pending' AND next_attempt_at <= ?
+            ORDER BY id
+            LIMIT 100
+        ''', (now,))
+        row = await self.db.fetchone('''
+            SELECT COUNT(*) FROM dm_notifications
+            WHERE status = 'pending'
+        ''')
+        self._pending = row[0] if row else 0
+        
+        for notification_id, guild_id, user_id, embed, attempts, created_at in rows:
+            if notification_id in self._in_flight:
+                continue
+            if self._active_per_guild.get(guild_id, 0) >= self.max_per_guild:
+                continue
+            
+            self._in_flight.add(notification_id)
+            self._active_per_guild[guild_id] = self._active_per_guild.get(guild_id, 0) + 1
+            task = asyncio.create_task(
+                self._deliver(notification_id, guild_id, user_id, embed, attempts, created_at)
+            )
+            self._deliveries.add(task)
+            task.add_done_callback(self._deliveries.discard)
+    
+    async def _deliver(self, notification_id: int, guild_id: int, user_id: int, embed: str, attempts: int,
+                       created_at, priority: int = PRIORITY_BACKGROUND) -> bool:
+        """
+        通知を1件送信し、結果をデータベースに記録する内部関数
+        
+        Args:
+            notification_id: 通知ID
+            guild_id: サーバーID
+            user_id: 送信先のユーザーID
+            embed: EmbedのJSON
+            attempts: これまでの試行回数
+            created_at: キューに追加した日時
+            priority: REST呼び出しの優先度
+        
+        Returns:
+            bool: 送信できた場合True
+        """
+        sent = False
+        try:
+            try:
+                user = self.bot.get_user(user_id) or await self.bot.fetch_user(user_id)
+                await self.bot.rest_scheduler.send(
+                    user,
+                    priority,
+                    embed=discord.Embed.from_dict(json.loads(embed))
+                )
+            except (discord.Forbidden, discord.NotFound) as e:
+                # DMを受け付けていない・共通のサーバーが無い・ユーザーが存在しない
+                await self._complete(notification_id, 'undeliverable', str(e))
+                dm_notifications.inc('undeliverable')
+                logger.warning(f'ユーザーID {user_id} へのDM送信に失敗しました: {e}')
+            except Exception as e:
+                attempts += 1
+                # 429以外の4xxは再試行しても成功しない
+                permanent = isinstance(e, discord.HTTPException) and 400 <= e.status < 500 and e.status != 429
+                if permanent or attempts >= self.max_attempts:
+                    await self._complete(notification_id, 'failed', str(e), attempts)
+                    dm_notifications.inc('failed')
+                    logger.error(f'ユーザーID {user_id} へのDM送信を{attempts}回失敗したため中止しました: {e}')
+                else:
+                    next_attempt_at = datetime.now() + timedelta(seconds=self.backoff * (2 ** (attempts - 1)))
+                    await self.db.execute('''
+                        UPDATE dm_notifications
+                        SET attempts = ?, last_error = ?, next_attempt_at = ?
+                        WHERE id = ?
+                    ''', (attempts, str(e), next_attempt_at, notification_id))
+                    dm_notifications.inc('retried')
+                    logger.warning(f'ユーザーID {user_id} へのDM送信に失敗したため再試行します: {e}')
+            else:
+                sent = True
+                await self._complete(notification_id, 'sent', None, attempts + 1)
+                dm_notifications.inc('sent')
+                if isinstance(created_at, str):
+                    created_at = datetime.fromisoformat(created_at)
+                dm_delivery_delay.observe((datetime.now() - created_at).total_seconds())
+        except Exception as e:
+            # 結果の記録に失敗した場合は送信待ちのまま残し、次の確認で再送する
+            logger.error(f'DM通知の送信結果の記録に失敗しました (通知ID: {notification_id}): {e}')
+        finally:
+            self._in_flight.discard(notification_id)
+            self._active_per_guild[guild_id] -= 1
+            if self._active_per_guild[guild_id] <= 0:
+                del self._active_per_guild[guild_id]
+            self._wakeup.set()
+        return sent
+    
+    async def _complete(self, notification_id: int, status: str, error: str = None, attempts: int = None):
+        """
+        通知を完了状態にする内部関数
+        
+        Args:
+            notification_id: 通知ID
+            status: 'sent' / 'undeliverable' / 'failed'
+            error: エラー内容
+            attempts: 試行回数(省略時は変更しない)
+        """
+        await self.db.execute('''
+            UPDATE dm_notifications
+            SET status = ?, last_error = ?, attempts = COALESCE(?, attempts), completed_at = ?
+            WHERE id = ?
+        ''', (status, error, attempts, datetime.now(), notification_id))
+    
+    async def _prune(self):
+        """
+        保存期間を過ぎた完了済みの通知を削除する内部関数
+        """
+        await self.db.execute('''
+            DELETE FROM dm_notifications
+            WHERE status != 'pending' AND completed_at < ?
+        ''', (datetime.now() - timedelta(days=self.retention_days),))
+    
+    async def _run(self):
+        """
+        通知を送信するバックグラウンドタスク
+        """
+        try:
+            await self._prune()
+        except Exception as e:
+            logger.error(f'DM通知の削除に失敗しました: {e}')
+        
+        while not self._stopping:
+            try:
+                await self._dispatch()
+            except Exception as e:
+                logger.error(f'DM通知の取得に失敗しました: {e}')
+            
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+    
+    def start(self):
+        """
+        バックグラウンドの送信タスクを開始する
+        (前回の起動時に送信できなかった通知も送信されます)
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self, timeout: float = 5.0):
+        """
+        送信タスクを停止する
+        送信中の通知は完了を待ち、未送信の通知は次回の起動時に送信します
+        
+        Args:
+            timeout: 送信中の通知を待つ最大秒数
+        """
+        if self._task is None:
+            return
+        
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+        
+        if self._deliveries:
+            await asyncio.wait(set(self._deliveries), timeout=timeout)
@@ -0,0 +1,155 @@
+"""
+拡張機能ローダーユーティリティ
+依存関係のないCogを並行して読み込み、読み込みの各段階にかかった時間を記録します
+"""
+
+import asyncio
+import contextvars
+import time
+from utils.logger import get_logger
+
+logger = get_logger()
+
+# 読み込み中の拡張機能のタイミング記録(add_cog/cog_loadの計測先の特定に使う)
+_current_timing = contextvars.ContextVar('current_extension_timing', default=None)
+
+
+def resolve_load_order(extensions: list, dependencies: dict) -> list:
+    """
+    依存関係から並行して読み込める拡張機能のグループ(段)を作る関数
+    
+    Args:
+        extensions: 拡張機能名のリスト
+        dependencies: {拡張機能名: (先に読み込む拡張機能名, ...)}
+    
+    Returns:
+        list: 段ごとの拡張機能名のリスト(前の段から順に読み込む)
+    """
+    remaining = list(extensions)
+    loaded = set()
+    waves = []
+    
+    while remaining:
+        wave = [
+            extension for extension in remaining
+            if all(dependency in loaded or dependency not in remaining
+                   for dependency in dependencies.get(extension, ()))
+        ]
+        if not wave:
+            # 循環依存の場合は残りを順番に読み込む
+            logger.warning(f'拡張機能の依存関係が循環しています: {", ".join(remaining)}')
+            waves.extend([extension] for extension in remaining)
+            break
+        
+        waves.append(wave)
+        loaded.update(wave)
+        remaining = [extension for extension in remaining if extension not in loaded]
+    
+    return waves
+
+
+async def load_extensions_concurrently(bot, extensions: list, dependencies: dict = None) -> list:
+    """
+    拡張機能を依存関係の段ごとに並行して読み込む関数
+    
+    Args:
+        bot: Botインスタンス
+        extensions: 拡張機能名のリスト
+        dependencies: {拡張機能名: (先に読み込む拡張機能名, ...)}
+    
+    Returns:
+        list: 拡張機能ごとのタイミング記録
+    """
+    timings = []
+    original_add_cog = bot.add_cog
+    
+    async def timed_add_cog(cog, **kwargs):
+        timing = _current_timing.get()
+        if timing is None:
+            return await original_add_cog(cog, **kwargs)
+        
+        started = time.perf_counter()
+        # setup()の呼び出しまでをimportの時間とみなす
+        if timing['import_ms'] is None:
+            timing['import_ms'] = (started - timing['started']) * 1000
+        
+        # cog_loadの時間を別に計測する
+        original_cog_load = cog.cog_load
+        
+        async def timed_cog_load():
+            cog_load_started = time.perf_counter()
+            try:
+                await original_cog_load()
+            finally:
+                timing['cog_load_ms'] += (time.perf_counter() - cog_load_started) * 1000
+        
+        cog.cog_load = timed_cog_load
+        try:
+            await original_add_cog(cog, **kwargs)
+        finally:
+            del cog.cog_load
+            timing['add_cog_ms'] += (time.perf_counter() - started) * 1000
+    
+    async def load_one(extension: str):
+        timing = {
+            'extension': extension,
+            'started': time.perf_counter(),
+            'import_ms': None,
+            'add_cog_ms': 0.0,
+            'cog_load_ms': 0.0,
+            'total_ms': 0.0,
+            'error': None
+        }
+        timings.append(timing)
+        _current_timing.set(timing)
+        
+        try:
+            await bot.load_extension(extension)
+            logger.info(f'{extension} を読み込みました')
+        except Exception as e:
+            timing['error'] = str(e)
+            logger.error(f'{extension} の読み込みに失敗しました: {e}')
+        finally:
+            timing['total_ms'] = (time.perf_counter() - timing['started']) * 1000
+            if timing['import_ms'] is None:
+                timing['import_ms'] = timing['total_ms']
+    
+    bot.add_cog = timed_add_cog
+    try:
+        for wave in resolve_load_order(extensions, dependencies or {}):
+            # 各タスクは自身のコンテキストで_current_timingを設定する
+            await asyncio.gather(*(load_one(extension) for extension in wave))
+    finally:
+        del bot.add_cog
+    
+    return timings
+
+
+def format_timing_report(timings: list, phases: dict = None) -> str:
+    """
+    起動時間のレポートを作る関数
+    
+    Args:
+        timings: load_extensions_concurrentlyが返したタイミング記録
+        phases: {段階名: ミリ秒} の起動段階ごとの時間
+    
+    Returns:
+        str: レポート(複数行)
+    """
+    lines = ['起動時間レポート']
+    
+    for name, elapsed_ms in (phases or {}).items():
+        lines.append(f'  {name}: {elapsed_ms:.1f}ms')
+    
+    lines.append('  拡張機能 (合計 / import / setup / cog_load):')
+    for timing in sorted(timings, key=lambda timing: timing['total_ms'], reverse=True):
+        setup_ms = max(0.0, timing['add_cog_ms'] - timing['cog_load_ms'])
+        line = (
+            f"    {timing['extension']}: {timing['total_ms']:.1f}ms / "
+            f"{timing['import_ms']:.1f}ms / {setup_ms:.1f}ms / {timing['cog_load_ms']:.1f}ms"
+        )
+        if timing['error']:
+            line += ' (失敗)'
+        lines.append(line)
+    
+    return '\n'.join(lines)
@@ -0,0 +1,184 @@
+"""
+サーバー設定キャッシュユーティリティ
+guild_settingsテーブルをメモリ上に保持し、権限チェックやログチャンネル取得をI/Oなしで行います
+"""
+
+import json
+from utils.logger import get_logger
+
+logger = get_logger()
+
+# ロールタイプとカラム名の対応
+ROLE_COLUMNS = {
+    'administrator': 'admin_role_ids',
+    'bot': 'bot_role_ids'
+}
+
+# ログタイプとカラム名の対応
+LOG_CHANNEL_COLUMNS = {
+    'public': 'public_log_channel_id',
+    'private': 'private_log_channel_id',
+    'report': 'report_log_channel_id'
+}
+
+
+class GuildSettingsCache:
+    """
+    サーバー設定のキャッシュ
+    サーバーごとに初回アクセス時に読み込み、/role と /logs の書き込み時に更新します
+    """
+    
+    def __init__(self, db):
+        """
+        初期化
+        
+        Args:
+            db: 共有Databaseインスタンス
+        """
+        self.db = db
+        self._settings = {}
+        # 書き込み・破棄の回数(読み込み中に書き込まれた古い設定をキャッシュしないために使う)
+        self._version = 0
+        self.hits = 0
+        self.misses = 0
+    
+    async def get(self, guild_id: int) -> dict:
+        """
+        サーバー設定を取得する
+        
+        Args:
+            guild_id: サーバーID
+        
+        Returns:
+            dict: ロールIDはfrozenset、ログチャンネルIDはint(未設定はNone)
+        """
+        settings = self._settings.get(guild_id)
+        if settings is not None:
+            self.hits += 1
+            return settings
+        
+        self.misses += 1
+        while True:
+            version = self._version
+            row = await self.db.fetchone('''
+                SELECT admin_role_ids, bot_role_ids,
+                       public_log_channel_id, private_log_channel_id, report_log_channel_id
+                FROM guild_settings
+                WHERE guild_id = ?
+            ''', (guild_id,))
+            # 読み込み中に書き込まれた場合は、書き込み前の内容の可能性があるため読み直す
+            if self._version == version:
+                break
+        
+        cached = self._settings.get(guild_id)
+        if cached is not None:
+            # 読み込み中に他の呼び出しが読み込んだ場合はそちらを使う(以降の書き込みが反映されている)
+            return cached
+        
+        if row:
+            settings = {
+                'admin_role_ids': frozenset(json.loads(row[0])) if row[0] else frozenset(),
+                'bot_role_ids': frozenset(json.loads(row[1])) if row[1] else frozenset(),
+                'public_log_channel_id': row[2],
+                'private_log_channel_id': row[3],
+                'report_log_channel_id': row[4]
+            }
+        else:
+            settings = {
+                'admin_role_ids': frozenset(),
+                'bot_role_ids': frozenset(),
+                'public_log_channel_id': None,
+                'private_log_channel_id': None,
+                'report_log_channel_id': None
+            }
+        
+        self._settings[guild_id] = settings
+        return settings
+    
+    async def set_role_ids(self, guild_id: int, role_type: str, role_ids):
+        """
+        管理者ロール/Botロールを保存してキャッシュを更新する
+        
+        Args:
+            guild_id: サーバーID
+            role_type: ロールタイプ('administrator', 'bot')
+            role_ids: ロールIDのコレクション
+        """
+        column = ROLE_COLUMNS[role_type]
+        role_ids = sorted(role_ids)
+        
+        await self.db.execute(f'''
+            INSERT INTO guild_settings (guild_id, {column})
+            VALUES (?, ?)
+            ON CONFLICT(guild_id) DO UPDATE SET
+                {column} = excluded.{column}
+        ''', (guild_id, json.dumps(role_ids)))
+        
+        self._update(guild_id, column, frozenset(role_ids))
+    
+    async def set_log_channel(self, guild_id: int, log_type: str, channel_id: int):
+        """
+        ログチャンネルを保存してキャッシュを更新する
+        
+        Args:
+            guild_id: サーバーID
+            log_type: ログタイプ('public', 'private', 'report')
+            channel_id: チャンネルID
+        """
+        column = LOG_CHANNEL_COLUMNS[log_type]
+        
+        await self.db.execute(f'''
+            INSERT INTO guild_settings (guild_id, {column})
+            VALUES (?, ?)
+            ON CONFLICT(guild_id) DO UPDATE SET
+                {column} = excluded.{column}
+        ''', (guild_id, channel_id))
+        
+        self._update(guild_id, column, channel_id)
+    
+    def _update(self, guild_id: int, column: str, value):
+        """
+        キャッシュ済みの設定を書き換える内部関数
+        
+        Args:
+            guild_id: サーバーID
+            column: カラム名
+            value: 新しい値
+        """
+        self._version += 1
+        
+        settings = self._settings.get(guild_id)
+        if settings is None:
+            # 未読み込みの場合は次回アクセス時にDBから読み込む
+            return
+        
+        # 読み取り側が保持している辞書を変更しないようコピーして差し替える
+        settings = dict(settings)
+        settings[column] = value
+        self._settings[guild_id] = settings
+    
+    def invalidate(self, guild_id: int = None):
+        """
+        キャッシュを破棄する
+        
+        Args:
+            guild_id: サーバーID(省略時はすべて)
+        """
+        self._version += 1
+        if guild_id is None:
+            self._settings.clear()
+        else:
+            self._settings.pop(guild_id, None)
+    
+    def cache_stats(self) -> dict:
+        """
+        キャッシュの使用状況を取得
+        
+        Returns:
+            dict: ヒット数、ミス数、キャッシュ済みサーバー数
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._settings)
+        }
@@ -0,0 +1,356 @@
+"""
+遅延ジョブスケジューラーユーティリティ
+指定した日時に実行する処理(クローズしたチケットの自動削除など)をデータベースに保存し、期限が来たら実行します
+"""
+
+import asyncio
+import heapq
+import json
+import os
+from datetime import datetime, timedelta
+from utils.logger import get_logger
+from utils.metrics import scheduled_jobs
+
+logger = get_logger()
+
+
+def _parse_datetime(value) -> datetime:
+    """
+    データベースから読み込んだ日時をdatetimeにする内部関数
+    
+    Args:
+        value: 日時(文字列またはdatetime)
+    
+    Returns:
+        datetime: 日時
+    """
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+
+class JobScheduler:
+    """
+    遅延ジョブのスケジューラー
+    ジョブはデータベースに保存されるため、Botが再起動しても失われません
+    期限が近いジョブだけをメモリ上のヒープに読み込み、最も早い期限まで待機します
+    """
+    
+    def __init__(self, bot, db, max_concurrency: int = None, max_attempts: int = None, backoff: float = None,
+                 horizon: float = None, batch_size: int = None):
+        """
+        初期化
+        
+        Args:
+            bot: Botインスタンス
+            db: 共有Databaseインスタンス
+            max_concurrency: 同時に実行するジョブ数(省略時は環境変数JOB_MAX_CONCURRENCY、既定値4)
+            max_attempts: 実行を試みる最大回数(省略時は環境変数JOB_MAX_ATTEMPTS、既定値5)
+            backoff: 再試行までの基本待ち時間(省略時は環境変数JOB_RETRY_BACKOFF、既定値60秒)
+            horizon: メモリに読み込む期限の範囲(省略時は環境変数JOB_LOAD_HORIZON、既定値3600秒)
+            batch_size: 1回に読み込むジョブ数(省略時は環境変数JOB_LOAD_BATCH、既定値500)
+        """
+        self.bot = bot
+        self.db = db
+        self.max_concurrency = max_concurrency or int(os.getenv('JOB_MAX_CONCURRENCY', '4'))
+        self.max_attempts = max_attempts or int(os.getenv('JOB_MAX_ATTEMPTS', '5'))
+        self.backoff = backoff or float(os.getenv('JOB_RETRY_BACKOFF', '60'))
+        self.horizon = timedelta(seconds=horizon or float(os.getenv('JOB_LOAD_HORIZON', '3600')))
+        self.batch_size = batch_size or int(os.getenv('JOB_LOAD_BATCH', '500'))
+        self.retention_days = int(os.getenv('JOB_RETENTION_DAYS', '7'))
+        # kind -> 処理関数
+        self._handlers = {}
+        # 起動時(復旧後・最初の読み込み前)に実行するコルーチン関数
+        self._startup_hooks = []
+        # (期限, ジョブID) のヒープ
+        self._heap = []
+        self._queued = set()
+        # この日時までに期限が来るジョブはすべてヒープに読み込み済み
+        self._loaded_until = None
+        self._running = set()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._stopping = False
+    
+    @property
+    def pending(self) -> int:
+        """
+        メモリに読み込んでいる未実行のジョブ数
+        
+        Returns:
+            int: ジョブ数
+        """
+        return len(self._heap)
+    
+    def register(self, kind: str, handler):
+        """
+        ジョブの処理関数を登録する
+        
+        Args:
+            kind: ジョブの種類
+            handler: ジョブの引数(dict)を受け取るコルーチン関数
+        """
+        self._handlers[kind] = handler
+    
+    def on_startup(self, hook):
+        """
+        起動時に実行する処理を登録する
+        前回の起動時に登録されなかったジョブの補完などに使います(Botの接続後、ジョブの読み込み前に実行)
+        
+        Args:
+            hook: 引数なしのコルーチン関数
+        """
+        self._startup_hooks.append(hook)
+    
+    async def schedule(self, kind: str, due_at: datetime, payload: dict = None, key: str = None) -> bool:
+        """
+        ジョブを登録する
+        
+        Args:
+            kind: ジョブの種類
+            due_at: 実行する日時
+            payload: 処理関数に渡す引数(JSONにできる値)
+            key: 重複防止キー(同じ種類・キーのジョブが実行待ちの場合は登録しない)
+        
+        Returns:
+            bool: 登録した場合True
+        """
+        cursor = await self.db.execute('''
+            INSERT OR IGNORE INTO scheduled_jobs (kind, job_key, payload, due_at, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (kind, key, json.dumps(payload or {}, ensure_ascii=False), due_at, datetime.now()))
+        
+        if cursor.rowcount == 0:
+            return False
+        
+        # 読み込み済みの範囲内であればヒープにも追加する(範囲外は次回の読み込みで取得)
+        if self._loaded_until is not None and due_at <= self._loaded_until:
+            self._push(due_at, cursor.lastrowid)
+            self._wakeup.set()
+        return True
+    
+    async def cancel(self, kind: str, key: str) -> bool:
+        """
+        実行待ちのジョブを取り消す
+        
+        Args:
+            kind: ジョブの種類
+            key: 登録時の重複防止キー
+        
+        Returns:
+            bool: 取り消した場合True
+        """
+        cursor = await self.db.execute('''
+            UPDATE scheduled_jobs
+            SET status = 'cancelled', completed_at = ?
+            WHERE kind = ? AND job_key = ? AND status = 'pending'
+        ''', (datetime.now(), kind, key))
+        # ヒープに残ったジョブは実行時の状態確認で読み飛ばす
+        return cursor.rowcount > 0
+    
+    def _push(self, due_at: datetime, job_id: int):
+        """
+        ジョブをヒープに追加する内部関数
+        
+        Args:
+            due_at: 実行する日時
+            job_id: ジョブID
+        """
+        if job_id not in self._queued:
+            self._queued.add(job_id)
+            heapq.heappush(self._heap, (due_at, job_id))
+    
+    async def _load(self, now: datetime):
+        """
+        期限が近いジョブをデータベースからヒープに読み込む内部関数
+        
+        Args:
+            now: 現在日時
+        """
+        until = now + self.horizon
+        rows = await self.db.fetchall('''
+            SELECT id, due_at FROM scheduled_jobs
+            WHERE status = 'pending' AND due_at <= ?
+            ORDER BY due_at
+            LIMIT ?
+        ''', (until, self.batch_size))
+        
+        for job_id, due_at in rows:
+            self._push(_parse_datetime(due_at), job_id)
+        
+        # 件数が上限に達した場合は、読み込んだ最後のジョブの期限までを読み込み済みとする
+        if len(rows) >= self.batch_size:
+            until = _parse_datetime(rows[-1][1])
+        self._loaded_until = until
+    
+    async def _execute(self, job_id: int):
+        """
+        ジョブを1件実行し、結果をデータベースに記録する内部関数
+        
+        Args:
+            job_id: ジョブID
+        """
+        kind = None
+        try:
+            # 取り消し・実行済みのジョブは実行しない
+            cursor = await self.db.execute('''
+                UPDATE scheduled_jobs
+                SET status = 'running', attempts = attempts + 1
+                WHERE id = ? AND status = 'pending'
+            ''', (job_id,))
+            if cursor.rowcount == 0:
+                return
+            
+            kind, payload, attempts = await self.db.fetchone('''
+                SELECT kind, payload, attempts FROM scheduled_jobs
+                WHERE id = ?
+            ''', (job_id,))
+            
+            handler = self._handlers.get(kind)
+            if handler is None:
+                await self._complete(job_id, 'failed', f'処理関数が登録されていません: {kind}')
+                scheduled_jobs.inc(kind, 'failed')
+                logger.error(f'ジョブ{job_id}の処理関数が登録されていません: {kind}')
+                return
+            
+            try:
+                await handler(json.loads(payload))
+            except Exception as e:
+                if attempts >= self.max_attempts:
+                    await self._complete(job_id, 'failed', str(e))
+                    scheduled_jobs.inc(kind, 'failed')
+                    logger.error(f'ジョブ{job_id}({kind})を{attempts}回失敗したため中止しました: {e}')
+                else:
+                    due_at = datetime.now() + timedelta(seconds=self.backoff * (2 ** (attempts - 1)))
+                    await self.db.execute('''
+                        UPDATE scheduled_jobs
+                        SET status = 'pending', last_error = ?, due_at = ?
+                        WHERE id = ?
+                    ''', (str(e), due_at, job_id))
+                    if self._loaded_until is not None and due_at <= self._loaded_until:
+                        self._push(due_at, job_id)
+                    scheduled_jobs.inc(kind, 'retried')
+                    logger.warning(f'ジョブ{job_id}({kind})の実行に失敗したため再試行します: {e}')
+            else:
+                await self._complete(job_id, 'done')
+                scheduled_jobs.inc(kind, 'done')
+        except Exception as e:
+            # 結果の記録に失敗した場合は次回の起動時に再実行する
+            logger.error(f'ジョブ{job_id}({kind})の結果の記録に失敗しました: {e}')
+        finally:
+            self._wakeup.set()
+    
+    async def _complete(self, job_id: int, status: str, error: str = None):
+        """
+        ジョブを完了状態にする内部関数
+        
+        Args:
+            job_id: ジョブID
+            status: 'done' / 'failed'
+            error: エラー内容
+        """
+        await self.db.execute('''
+            UPDATE scheduled_jobs
+            SET status = ?, last_error = ?, completed_at = ?
+            WHERE id = ?
+        ''', (status, error, datetime.now(), job_id))
+    
+    async def _recover(self):
+        """
+        前回の起動時に実行中のまま終了したジョブを実行待ちに戻し、古い完了済みのジョブを削除する内部関数
+        """
+        cursor = await self.db.execute('''
+            UPDATE scheduled_jobs
+            SET status = 'pending'
+            WHERE status = 'running'
+        ''')
+        if cursor.rowcount:
+            logger.warning(f'実行中のまま終了した{cursor.rowcount}件のジョブを再実行します')
+        
+        await self.db.execute('''
+            DELETE FROM scheduled_jobs
+            WHERE status IN ('done', 'failed', 'cancelled') AND completed_at < ?
+        ''', (datetime.now() - timedelta(days=self.retention_days),))
+    
+    async def _run(self):
+        """
+        期限が来たジョブを実行するバックグラウンドタスク
+        """
+        # ジョブの処理にはサーバー・チャンネルのキャッシュが必要なため、接続を待つ
+        await self.bot.wait_until_ready()
+        
+        try:
+            await self._recover()
+        except Exception as e:
+            logger.error(f'ジョブの復旧に失敗しました: {e}')
+        
+        for hook in self._startup_hooks:
+            try:
+                await hook()
+            except Exception as e:
+                logger.error(f'ジョブスケジューラーの起動時処理に失敗しました: {e}')
+        
+        while not self._stopping:
+            now = datetime.now()
+            # 読み込み済みの範囲を過ぎ、ヒープのジョブが少なくなったら次の範囲を読み込む
+            if self._loaded_until is None or (now >= self._loaded_until and len(self._heap) < self.batch_size // 2):
+                try:
+                    await self._load(now)
+                except Exception as e:
+                    logger.error(f'ジョブの読み込みに失敗しました: {e}')
+            
+            # 期限を過ぎたジョブを同時実行数の上限まで実行する(停止中の遅れ分もここで順に消化する)
+            while self._heap and self._heap[0][0] <= now and len(self._running) < self.max_concurrency:
+                _, job_id = heapq.heappop(self._heap)
+                self._queued.discard(job_id)
+                task = asyncio.create_task(self._execute(job_id))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+            
+            # 次のジョブの期限か次の読み込みまで待機する(上限まで実行中の場合はジョブの完了を待つ)
+            timeout = None
+            if len(self._running) < self.max_concurrency:
+                wake_at = self._loaded_until or now + timedelta(seconds=self.backoff)
+                if self._heap:
+                    wake_at = min(wake_at, self._heap[0][0])
+                timeout = max((wake_at - now).total_seconds(), 0.1)
+            
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+    
+    def start(self):
+        """
+        バックグラウンドの実行タスクを開始する
+        (前回の起動時に期限を過ぎたジョブもBotの接続後に実行されます)
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self, timeout: float = 5.0):
+        """
+        実行タスクを停止する
+        実行中のジョブは完了を待ち、残りのジョブは次回の起動時に実行します
+        
+        Args:
+            timeout: 実行中のジョブを待つ最大秒数
+        """
+        if self._task is None:
+            return
+        
+        self._stopping = True
+        self._wakeup.set()
+        await asyncio.wait({self._task}, timeout=timeout)
+        if not self._task.done():
+            # 接続を待っている間などに停止した場合
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        
+        if self._running:
+            await asyncio.wait(set(self._running), timeout=timeout)
@@ -1,54 +1,151 @@
 """
 キープアライブユーティリティ
 Koyeb無料版のスリープ対策用Webサーバー
+Botと同じイベントループ上でaiohttpのサーバーを動かし、/health で稼働状況を返します
 """
 
-from flask import Flask
-from threading import Thread
+import asyncio
+import math
+import os
+import time
+from aiohttp import web
 from utils.logger import get_logger
+from utils.metrics import registry
 
 logger = get_logger()
 
-# Flaskアプリケーションの作成
-app = Flask(__name__)
 
-
-@app.route('/')
-def home():
-    """
-    ヘルスチェック用エンドポイント
-    
-    Returns:
-        str: ステータスメッセージ
+class KeepAliveServer:
     """
-    return "Bot is alive!"
-
-
-@app.route('/health')
-def health():
+    キープアライブ/ヘルスチェック用のWebサーバー
     """
-    ヘルスチェック用エンドポイント
     
-    Returns:
-        dict: ステータス情報
-    """
-    return {"status": "healthy", "message": "Bot is running"}
-
-
-def run():
-    """
-    Flaskサーバーを起動する関数
-    """
-    # ポート8080で起動(Koyebのデフォルトポート)
-    app.run(host='0.0.0.0', port=8080)
-
-
-def keep_alive():
-    """
-    バックグラウンドでFlaskサーバーを起動する関数
-    """
-    # 別スレッドでサーバーを起動
-    t = Thread(target=run)
-    t.daemon = True  # デーモンスレッドとして起動
-    t.start()
-    logger.info('キープアライブサーバーを起動しました(ポート: 8080)')
+    def __init__(self, bot, db, host: str = '0.0.0.0', port: int = None):
+        """
+        初期化
+        
+        Args:
+            bot: Botインスタンス
+            db: 共有Databaseインスタンス
+            host: 待ち受けアドレス
+            port: 待ち受けポート(省略時は環境変数PORT、既定値8080)
+        """
+        self.bot = bot
+        self.db = db
+        self.host = host
+        self.port = port or int(os.getenv('PORT', '8080'))
+        # この秒数を超えるイベントループの遅延はunhealthyとみなす
+        self.max_loop_lag = float(os.getenv('HEALTH_MAX_LOOP_LAG', '1.0'))
+        
+        self.app = web.Application()
+        self.app.router.add_get('/', self.home)
+        self.app.router.add_get('/health', self.health)
+        self.app.router.add_get('/metrics', self.metrics)
+        
+        self._runner = None
+        self._lag_task = None
+        self.loop_lag = 0.0
+        self.max_observed_loop_lag = 0.0
+    
+    async def home(self, request):
+        """
+        生存確認用エンドポイント
+        
+        Returns:
+            web.Response: ステータスメッセージ
+        """
+        return web.Response(text="Bot is alive!")
+    
+    async def health(self, request):
+        """
+        ヘルスチェック用エンドポイント
+        Gateway接続・DB接続・イベントループの遅延を確認し、異常があれば503を返します
+        
+        Returns:
+            web.Response: ステータス情報(JSON)
+        """
+        # Gatewayの接続状態
+        gateway_ready = self.bot.is_ready() and not self.bot.is_closed()
+        latency = self.bot.latency
+        
+        # DBの疎通確認
+        db_ok = True
+        db_latency_ms = None
+        try:
+            started = time.perf_counter()
+            await asyncio.wait_for(self.db.fetchone('SELECT 1'), timeout=2)
+            db_latency_ms = round((time.perf_counter() - started) * 1000, 2)
+        except Exception as e:
+            db_ok = False
+            logger.warning(f'ヘルスチェックでDBに接続できませんでした: {e}')
+        
+        loop_ok = self.loop_lag <= self.max_loop_lag
+        healthy = gateway_ready and db_ok and loop_ok
+        
+        body = {
+            "status": "healthy" if healthy else "unhealthy",
+            "gateway": {
+                "ready": gateway_ready,
+                "latency_ms": round(latency * 1000, 2) if math.isfinite(latency) else None
+            },
+            "database": {
+                "ok": db_ok,
+                "latency_ms": db_latency_ms
+            },
+            "event_loop": {
+                "ok": loop_ok,
+                "lag_ms": round(self.loop_lag * 1000, 2),
+                "max_lag_ms": round(self.max_observed_loop_lag * 1000, 2)
+            }
+        }
+        
+        return web.json_response(body, status=200 if healthy else 503)
+    
+    async def metrics(self, request):
+        """
+        Prometheus形式のメトリクス出力用エンドポイント
+        
+        Returns:
+            web.Response: メトリクス(テキスト形式)
+        """
+        return web.Response(
+            text=registry.render(),
+            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+        )
+    
+    async def _monitor_loop_lag(self, interval: float = 1.0):
+        """
+        イベントループの遅延を計測するバックグラウンドタスク
+        
+        Args:
+            interval: 計測間隔(秒)
+        """
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            self.loop_lag = max(0.0, time.perf_counter() - started - interval)
+            self.max_observed_loop_lag = max(self.max_observed_loop_lag, self.loop_lag)
+    
+    async def start(self):
+        """
+        サーバーを起動する
+        """
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        
+        self._lag_task = asyncio.create_task(self._monitor_loop_lag())
+        logger.info(f'キープアライブサーバーを起動しました(ポート: {self.port})')
+    
+    async def stop(self):
+        """
+        サーバーを停止する
+        """
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            self._lag_task = None
+        
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
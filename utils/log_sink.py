@@ -0,0 +1,212 @@
+"""
+ログチャンネル送信ユーティリティ
+サーバー・ログタイプごとにEmbedを貯め、1メッセージ最大10件にまとめて送信します
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+import discord
+from utils.logger import get_logger
+from utils.permissions import get_log_channel
+from utils.rest_scheduler import PRIORITY_BACKGROUND
+
+logger = get_logger()
+
+# 1メッセージに含められるEmbedの上限(Discordの制限)
+MAX_EMBEDS_PER_MESSAGE = 10
+# 1メッセージに含められるEmbedの合計文字数の上限(Discordの制限)
+MAX_EMBED_CHARS_PER_MESSAGE = 6000
+
+
+class LogChannelSink:
+    """
+    ログチャンネルへの送信バッファ
+    短い間隔でまとめて送信し、チャンネルごとに送信間隔を空けてレート制限を避けます
+    """
+    
+    def __init__(self, bot, flush_interval: float = None, channel_interval: float = None, max_backlog: int = None):
+        """
+        初期化
+        
+        Args:
+            bot: Botインスタンス
+            flush_interval: 送信間隔(省略時は環境変数LOG_SINK_FLUSH_INTERVAL、既定値2秒)
+            channel_interval: 同じチャンネルへの送信間隔(省略時は環境変数LOG_SINK_CHANNEL_INTERVAL、既定値1.2秒)
+            max_backlog: ログタイプごとの未送信Embedの上限(省略時は環境変数LOG_SINK_MAX_BACKLOG、既定値500)
+        """
+        self.bot = bot
+        self.flush_interval = flush_interval or float(os.getenv('LOG_SINK_FLUSH_INTERVAL', '2'))
+        self.channel_interval = channel_interval or float(os.getenv('LOG_SINK_CHANNEL_INTERVAL', '1.2'))
+        self.max_backlog = max_backlog or int(os.getenv('LOG_SINK_MAX_BACKLOG', '500'))
+        # (guild_id, log_type) -> 未送信のEmbed
+        self._pending = {}
+        # channel_id -> 次に送信できる時刻
+        self._next_send = {}
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._stopping = False
+        
+        # 送信状況のカウンター
+        self.stats = {
+            'queued': 0,
+            'sent_embeds': 0,
+            'sent_messages': 0,
+            'dropped': 0,
+            'errors': 0
+        }
+    
+    def log(self, guild: discord.Guild, log_type: str, embed: discord.Embed):
+        """
+        ログチャンネルに送るEmbedを追加する(送信は後でまとめて行う)
+        
+        Args:
+            guild: サーバー
+            log_type: ログタイプ('public', 'private', 'report')
+            embed: 送信するEmbed
+        """
+        key = (guild.id, log_type)
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = deque()
+            self._pending[key] = pending
+        
+        # 上限を超えた場合は古いものから破棄する
+        if len(pending) >= self.max_backlog:
+            pending.popleft()
+            self.stats['dropped'] += 1
+        
+        pending.append(embed)
+        self.stats['queued'] += 1
+        self._wakeup.set()
+    
+    @property
+    def backlog(self) -> int:
+        """
+        未送信のEmbed数
+        
+        Returns:
+            int: 未送信のEmbed数
+        """
+        return sum(len(pending) for pending in self._pending.values())
+    
+    def _take_batch(self, pending: deque) -> list:
+        """
+        1メッセージ分のEmbedを取り出す内部関数
+        
+        Args:
+            pending: 未送信のEmbed
+        
+        Returns:
+            list: 送信するEmbed(最大10件・合計6000文字まで)
+        """
+        batch = []
+        total_chars = 0
+        while pending and len(batch) < MAX_EMBEDS_PER_MESSAGE:
+            size = len(pending[0])
+            if batch and total_chars + size > MAX_EMBED_CHARS_PER_MESSAGE:
+                break
+            batch.append(pending.popleft())
+            total_chars += size
+        return batch
+    
+    async def _send_one(self, key: tuple) -> bool:
+        """
+        サーバー・ログタイプ1つ分のEmbedを1メッセージで送信する内部関数
+        
+        Args:
+            key: (guild_id, log_type)
+        
+        Returns:
+            bool: 未送信のEmbedが残っている場合True
+        """
+        pending = self._pending.get(key)
+        if not pending:
+            self._pending.pop(key, None)
+            return False
+        
+        guild_id, log_type = key
+        guild = self.bot.get_guild(guild_id)
+        channel = await get_log_channel(guild, log_type) if guild else None
+        if channel is None:
+            # ログチャンネルが未設定の場合は破棄する
+            self.stats['dropped'] += len(pending)
+            self._pending.pop(key, None)
+            return False
+        
+        # 同じチャンネルへの送信間隔を空ける
+        if time.monotonic() < self._next_send.get(channel.id, 0):
+            return True
+        
+        batch = self._take_batch(pending)
+        self._next_send[channel.id] = time.monotonic() + self.channel_interval
+        try:
+            await self.bot.rest_scheduler.send(channel, PRIORITY_BACKGROUND, embeds=batch)
+            self.stats['sent_embeds'] += len(batch)
+            self.stats['sent_messages'] += 1
+        except discord.Forbidden:
+            self.stats['dropped'] += len(batch)
+            logger.error(f'ログチャンネルに送信する権限がありません: {channel.name}')
+        except Exception as e:
+            self.stats['errors'] += 1
+            self.stats['dropped'] += len(batch)
+            logger.error(f'ログチャンネル送信エラー: {e}')
+        
+        if not pending:
+            self._pending.pop(key, None)
+            return False
+        return True
+    
+    async def flush(self) -> bool:
+        """
+        各ログチャンネルに1メッセージずつ送信する
+        
+        Returns:
+            bool: 未送信のEmbedが残っている場合True
+        """
+        results = await asyncio.gather(*(self._send_one(key) for key in list(self._pending)))
+        return any(results)
+    
+    async def _run(self):
+        """
+        定期的に送信を行うバックグラウンドタスク
+        """
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+                woken = True
+            except asyncio.TimeoutError:
+                woken = False
+            self._wakeup.clear()
+            
+            # ログの追加で起きた場合は、送信の合間にログを貯めてまとめる
+            # (タイムアウトした場合は既に送信間隔分待っており、停止時は待たずにstop()で送信する)
+            if woken and not self._stopping:
+                await asyncio.sleep(self.flush_interval)
+            while await self.flush() and not self._stopping:
+                await asyncio.sleep(min(self.flush_interval, self.channel_interval))
+    
+    def start(self):
+        """
+        バックグラウンドの送信タスクを開始する
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """
+        送信タスクを停止し、残っているログを送信する
+        """
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        
+        # 終了時はチャンネルごとの送信間隔を待たずに送信する
+        self._next_send.clear()
+        while self._pending:
+            if not await self.flush():
+                break
+            self._next_send.clear()
@@ -1,11 +1,183 @@
 """
 ロギングユーティリティ
 Botの動作ログを管理します
+ログはキューを経由し、バックグラウンドスレッドで整形・書き込みを行います
 """
 
+import copy
+import glob
+import gzip
 import logging
+import logging.handlers
 import os
-from datetime import datetime
+import queue
+import shutil
+import time
+
+# バックグラウンドで書き込みを行うリスナー
+_queue_listener = None
+_queue_handler = None
+
+
+class CompressedTimedRotatingFileHandler(logging.handlers.TimedRotatingFileHandler):
+    """
+    毎日0時にログファイルを切り替え、古いファイルをgzip圧縮するハンドラー
+    切り替え時に保存期間と合計サイズの上限を超えたファイルを削除します
+    """
+    
+    def __init__(self, filename: str, retention_days: int, max_total_bytes: int):
+        """
+        初期化
+        
+        Args:
+            filename: 書き込み中のログファイルのパス(例: logs/bot.log)
+            retention_days: 古いログを保存する日数
+            max_total_bytes: 古いログの合計サイズの上限(バイト)
+        """
+        super().__init__(filename, when='midnight', backupCount=0, encoding='utf-8')
+        self.retention_days = retention_days
+        self.max_total_bytes = max_total_bytes
+        self.log_dir = os.path.dirname(filename) or '.'
+        self.prefix = os.path.splitext(os.path.basename(filename))[0]
+        self.namer = self._name_rotated_file
+        self.rotator = self._compress
+        
+        # 起動時にも古いログを整理する
+        self.apply_retention()
+    
+    def _name_rotated_file(self, default_name: str) -> str:
+        """
+        切り替え後のファイル名を決める(logs/bot.log.2024-01-01 -> logs/bot_2024-01-01.log.gz)
+        
+        Args:
+            default_name: 既定のファイル名
+        
+        Returns:
+            str: 切り替え後のファイル名
+        """
+        date = default_name.rsplit('.', 1)[-1]
+        return os.path.join(self.log_dir, f'{self.prefix}_{date}.log.gz')
+    
+    def _compress(self, source: str, dest: str):
+        """
+        切り替えたログファイルをgzip圧縮する
+        
+        Args:
+            source: 書き込みが終わったログファイル
+            dest: 圧縮後のファイル
+        """
+        with open(source, 'rb') as source_file, gzip.open(dest, 'wb') as dest_file:
+            shutil.copyfileobj(source_file, dest_file)
+        os.remove(source)
+    
+    def doRollover(self):
+        """
+        ログファイルを切り替え、古いログを整理する
+        """
+        super().doRollover()
+        self.apply_retention()
+    
+    def apply_retention(self):
+        """
+        保存期間を過ぎたログと、合計サイズの上限を超えた古いログを削除する
+        """
+        # 圧縮済みのログと、以前の形式(日付ごとの非圧縮ファイル)の両方が対象
+        files = glob.glob(os.path.join(self.log_dir, f'{self.prefix}_*.log.gz'))
+        files += glob.glob(os.path.join(self.log_dir, f'{self.prefix}_*.log'))
+        
+        entries = []
+        for path in files:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        
+        # 古い順に並べる
+        entries.sort()
+        cutoff = time.time() - self.retention_days * 86400
+        total_bytes = sum(size for _, size, _ in entries)
+        
+        for mtime, size, path in entries:
+            if mtime >= cutoff and total_bytes <= self.max_total_bytes:
+                break
+            try:
+                os.remove(path)
+                total_bytes -= size
+            except OSError:
+                pass
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """
+    上限付きキューにログを積むハンドラー
+    キューが満杯の場合は設定に応じて新しいログ/古いログを破棄するか、一定時間待ちます
+    """
+    
+    def __init__(self, log_queue: queue.Queue, overflow: str = 'drop_new', block_timeout: float = 0.1):
+        """
+        初期化
+        
+        Args:
+            log_queue: 上限付きキュー
+            overflow: 満杯時の動作('drop_new', 'drop_old', 'block')
+            block_timeout: 'block'の場合に待つ最大秒数
+        """
+        super().__init__(log_queue)
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        
+        # キューの状況のカウンター
+        self.stats = {
+            'enqueued': 0,
+            'dropped': 0
+        }
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        キューに積む前の処理
+        メッセージの埋め込みのみ行い、整形はバックグラウンドのハンドラーに任せます
+        
+        Args:
+            record: ログレコード
+        
+        Returns:
+            logging.LogRecord: キューに積むレコード
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+    
+    def enqueue(self, record: logging.LogRecord):
+        """
+        レコードをキューに積む
+        
+        Args:
+            record: ログレコード
+        """
+        try:
+            if self.overflow == 'block':
+                self.queue.put(record, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(record)
+            self.stats['enqueued'] += 1
+            return
+        except queue.Full:
+            pass
+        
+        if self.overflow == 'drop_old':
+            # 最も古いレコードを捨てて新しいレコードを積む
+            try:
+                self.queue.get_nowait()
+                self.stats['dropped'] += 1
+                self.queue.put_nowait(record)
+                self.stats['enqueued'] += 1
+                return
+            except (queue.Empty, queue.Full):
+                pass
+        
+        self.stats['dropped'] += 1
 
 
 def setup_logger():
@@ -28,11 +200,11 @@ def setup_logger():
     if logger.handlers:
         return logger
     
-    # ファイルハンドラーの設定(日付ごとにログファイルを作成)
-    today = datetime.now().strftime('%Y-%m-%d')
-    file_handler = logging.FileHandler(
-        f'{log_dir}/bot_{today}.log',
-        encoding='utf-8'
+    # ファイルハンドラーの設定(毎日0時に切り替えて古いログは圧縮)
+    file_handler = CompressedTimedRotatingFileHandler(
+        f'{log_dir}/bot.log',
+        retention_days=int(os.getenv('LOG_RETENTION_DAYS', '14')),
+        max_total_bytes=int(float(os.getenv('LOG_MAX_TOTAL_MB', '200')) * 1024 * 1024)
     )
     file_handler.setLevel(logging.INFO)
     
@@ -49,13 +221,54 @@ def setup_logger():
     file_handler.setFormatter(formatter)
     console_handler.setFormatter(formatter)
     
+    # キューを経由してバックグラウンドスレッドで書き込む
+    global _queue_listener, _queue_handler
+    queue_size = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+    overflow = os.getenv('LOG_QUEUE_OVERFLOW', 'drop_new')
+    if overflow not in ('drop_new', 'drop_old', 'block'):
+        overflow = 'drop_new'
+    
+    log_queue = queue.Queue(maxsize=queue_size)
+    _queue_handler = BoundedQueueHandler(log_queue, overflow=overflow)
+    _queue_listener = logging.handlers.QueueListener(
+        log_queue,
+        file_handler,
+        console_handler,
+        respect_handler_level=True
+    )
+    _queue_listener.start()
+    
     # ハンドラーをロガーに追加
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    logger.addHandler(_queue_handler)
     
     return logger
 
 
+def shutdown_logger():
+    """
+    キューに残っているログをすべて書き込んでからバックグラウンドスレッドを停止する関数
+    """
+    global _queue_listener
+    if _queue_listener is not None:
+        _queue_listener.stop()
+        _queue_listener = None
+
+
+def get_logging_stats() -> dict:
+    """
+    ログキューの状況を取得する関数
+    
+    Returns:
+        dict: キューに積んだ件数、破棄した件数、現在のキューの長さ
+    """
+    if _queue_handler is None:
+        return {'enqueued': 0, 'dropped': 0, 'depth': 0}
+    
+    stats = dict(_queue_handler.stats)
+    stats['depth'] = _queue_handler.queue.qsize()
+    return stats
+
+
 def get_logger():
     """
     既存のロガーインスタンスを取得する関数
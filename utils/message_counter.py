@@ -0,0 +1,166 @@
+"""
+メッセージカウンターユーティリティ
+on_messageごとのDB書き込みを避け、メモリ上で集計してまとめて書き込みます
+"""
+
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+from utils.logger import get_logger
+
+logger = get_logger()
+
+# 古いアクティビティ集計を削除する間隔(秒)
+PRUNE_INTERVAL = 3600
+
+
+class MessageCounter:
+    """
+    メッセージ数の書き込みバッファ
+    (guild_id, user_id, 時間)ごとに件数を貯め、一定時間または一定件数で一括書き込みします
+    環境変数ACTIVITY_RETENTION_DAYS(既定値35日)より古い時間単位・ユーザー別のアクティビティ集計も1時間ごとに削除します
+    """
+    
+    def __init__(self, db, max_staleness: float = None, max_pending: int = None):
+        """
+        初期化
+        
+        Args:
+            db: 共有Databaseインスタンス
+            max_staleness: 書き込みまでの最大遅延秒数(省略時は環境変数MESSAGE_COUNT_MAX_STALENESS、既定値5秒)
+            max_pending: 即時書き込みを行う未書き込みメッセージ数(省略時は環境変数MESSAGE_COUNT_MAX_PENDING、既定値500)
+        """
+        self.db = db
+        self.max_staleness = max_staleness or float(os.getenv('MESSAGE_COUNT_MAX_STALENESS', '5'))
+        self.max_pending = max_pending or int(os.getenv('MESSAGE_COUNT_MAX_PENDING', '500'))
+        self.retention = timedelta(days=float(os.getenv('ACTIVITY_RETENTION_DAYS', '35')))
+        self._next_prune = 0.0
+        # (guild_id, user_id, 受信した時間の開始時刻) -> [件数, 最後に受信した日時]
+        self._pending = {}
+        self._pending_messages = 0
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._stopping = False
+        
+        # 書き込み状況のカウンター
+        self.stats = {
+            'flushes': 0,
+            'flushed_messages': 0,
+            'flushed_rows': 0,
+            'errors': 0
+        }
+    
+    def increment(self, guild_id: int, user_id: int):
+        """
+        メッセージ数を1件加算する(DBアクセスなし)
+        
+        Args:
+            guild_id: サーバーID
+            user_id: ユーザーID
+        """
+        # 書き込み時ではなく受信時の時間のバケットに数える
+        now = datetime.now()
+        key = (guild_id, user_id, now.replace(minute=0, second=0, microsecond=0))
+        entry = self._pending.get(key)
+        if entry is None:
+            self._pending[key] = [1, now]
+        else:
+            entry[0] += 1
+            entry[1] = now
+        self._pending_messages += 1
+        
+        # 件数が上限に達したら書き込みタスクを起こす
+        if self._pending_messages >= self.max_pending:
+            self._wakeup.set()
+    
+    @property
+    def pending(self) -> int:
+        """
+        未書き込みのメッセージ数
+        
+        Returns:
+            int: 未書き込みのメッセージ数
+        """
+        return self._pending_messages
+    
+    async def flush(self):
+        """
+        貯まっているメッセージ数を1つのトランザクションで書き込む
+        """
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            
+            pending, self._pending = self._pending, {}
+            pending_messages, self._pending_messages = self._pending_messages, 0
+            
+            rows = [
+                (guild_id, user_id, count, received_at)
+                for (guild_id, user_id, _), (count, received_at) in pending.items()
+            ]
+            
+            try:
+                await self.db.add_user_message_counts(rows)
+            except Exception as e:
+                # 失敗した分は次回の書き込みに戻す
+                for key, (count, received_at) in pending.items():
+                    entry = self._pending.get(key)
+                    if entry is None:
+                        self._pending[key] = [count, received_at]
+                    else:
+                        entry[0] += count
+                self._pending_messages += pending_messages
+                self.stats['errors'] += 1
+                logger.error(f'メッセージカウント書き込みエラー: {e}')
+                return
+            
+            self.stats['flushes'] += 1
+            self.stats['flushed_messages'] += pending_messages
+            self.stats['flushed_rows'] += len(rows)
+    
+    async def _run(self):
+        """
+        定期的に書き込みを行うバックグラウンドタスク
+        """
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.max_staleness)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+            
+            if time.monotonic() >= self._next_prune:
+                self._next_prune = time.monotonic() + PRUNE_INTERVAL
+                await self._prune()
+    
+    async def _prune(self):
+        """
+        古いアクティビティ集計を削除する内部関数
+        """
+        try:
+            await self.db.prune_activity(datetime.now() - self.retention)
+        except Exception as e:
+            logger.error(f'アクティビティ集計の削除に失敗しました: {e}')
+    
+    def start(self):
+        """
+        バックグラウンドの書き込みタスクを開始する
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """
+        書き込みタスクを停止し、残っている件数をすべて書き込む
+        """
+        if self._task is not None:
+            # 書き込み途中で中断しないよう、キャンセルではなく終了を通知する
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        
+        await self.flush()
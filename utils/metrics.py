@@ -0,0 +1,368 @@
+"""
+メトリクスユーティリティ
+Prometheus形式のカウンター・ゲージ・ヒストグラムを保持し、/metrics 用のテキストを生成します
+本番環境で常時有効にできるよう、記録処理は辞書の加算のみで行います
+"""
+
+import bisect
+import logging
+from utils.logger import get_logger
+
+logger = get_logger()
+
+# discord.httpがレート制限時に出力するログの先頭部分
+_RATE_LIMITED_LOG_PREFIX = 'We are being rate limited.'
+_GLOBAL_RATE_LIMIT_LOG_PREFIX = 'Global rate limit has been hit.'
+
+# レイテンシ用のヒストグラムの境界値(秒)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(label_names: tuple, label_values: tuple, extra: str = '') -> str:
+    """
+    ラベルをPrometheus形式の文字列にする内部関数
+    
+    Args:
+        label_names: ラベル名
+        label_values: ラベルの値
+        extra: 追加のラベル(le="..."など)
+    
+    Returns:
+        str: {name="value",...} 形式の文字列(ラベルが無い場合は空文字)
+    """
+    parts = []
+    for name, value in zip(label_names, label_values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{name}="{value}"')
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_value(value: float) -> str:
+    """
+    数値をPrometheus形式の文字列にする内部関数
+    
+    Args:
+        value: 数値
+    
+    Returns:
+        str: 文字列表現
+    """
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class Counter:
+    """
+    単調増加するカウンター
+    値を加算するか、累計値を返す関数を登録します
+    """
+    
+    def __init__(self, name: str, documentation: str, label_names: tuple = ()):
+        """
+        初期化
+        
+        Args:
+            name: メトリクス名
+            documentation: 説明
+            label_names: ラベル名
+        """
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._functions = {}
+    
+    def inc(self, *label_values, amount: float = 1):
+        """
+        カウンターを加算する
+        
+        Args:
+            *label_values: ラベルの値(label_namesの順)
+            amount: 加算する値
+        """
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+    
+    def set_function(self, function, *label_values):
+        """
+        出力時に累計値を取得する関数を登録する(既存の統計情報の累計値を出力する場合)
+        
+        Args:
+            function: 引数なしで単調増加する数値を返す関数
+            *label_values: ラベルの値(label_namesの順)
+        """
+        self._functions[label_values] = function
+    
+    def collect(self) -> list:
+        """
+        出力用の行を生成する
+        
+        Returns:
+            list: テキスト形式の行
+        """
+        values = dict(self._values)
+        for label_values, function in self._functions.items():
+            try:
+                values[label_values] = function()
+            except Exception as e:
+                logger.warning(f'メトリクス{self.name}の取得に失敗しました: {e}')
+        
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        for label_values, value in values.items():
+            lines.append(f'{self.name}{_format_labels(self.label_names, label_values)} {_format_value(value)}')
+        return lines
+
+
+class Gauge:
+    """
+    現在値を表すゲージ
+    値を直接設定するか、出力時に呼ばれる関数を登録します
+    """
+    
+    def __init__(self, name: str, documentation: str, label_names: tuple = ()):
+        """
+        初期化
+        
+        Args:
+            name: メトリクス名
+            documentation: 説明
+            label_names: ラベル名
+        """
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._functions = {}
+    
+    def set(self, value: float, *label_values):
+        """
+        値を設定する
+        
+        Args:
+            value: 値
+            *label_values: ラベルの値(label_namesの順)
+        """
+        self._values[label_values] = value
+    
+    def set_function(self, function, *label_values):
+        """
+        出力時に値を取得する関数を登録する
+        
+        Args:
+            function: 引数なしで数値を返す関数
+            *label_values: ラベルの値(label_namesの順)
+        """
+        self._functions[label_values] = function
+    
+    def collect(self) -> list:
+        """
+        出力用の行を生成する
+        
+        Returns:
+            list: テキスト形式の行
+        """
+        values = dict(self._values)
+        for label_values, function in self._functions.items():
+            try:
+                values[label_values] = function()
+            except Exception as e:
+                logger.warning(f'メトリクス{self.name}の取得に失敗しました: {e}')
+        
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} gauge']
+        for label_values, value in values.items():
+            if value is None:
+                continue
+            lines.append(f'{self.name}{_format_labels(self.label_names, label_values)} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    """
+    固定の境界値を持つヒストグラム
+    """
+    
+    def __init__(self, name: str, documentation: str, label_names: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        """
+        初期化
+        
+        Args:
+            name: メトリクス名
+            documentation: 説明
+            label_names: ラベル名
+            buckets: 境界値(昇順)
+        """
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        # label_values -> [境界ごとの件数..., 合計値, 件数]
+        self._values = {}
+    
+    def observe(self, value: float, *label_values):
+        """
+        値を記録する
+        
+        Args:
+            value: 記録する値(秒など)
+            *label_values: ラベルの値(label_namesの順)
+        """
+        state = self._values.get(label_values)
+        if state is None:
+            state = [0] * len(self.buckets) + [0.0, 0]
+            self._values[label_values] = state
+        
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            state[index] += 1
+        state[-2] += value
+        state[-1] += 1
+    
+    def collect(self) -> list:
+        """
+        出力用の行を生成する
+        
+        Returns:
+            list: テキスト形式の行
+        """
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for label_values, state in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                labels = _format_labels(self.label_names, label_values, f'le="{_format_value(float(bound))}"')
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.label_names, label_values, 'le="+Inf"')
+            lines.append(f'{self.name}_bucket{labels} {state[-1]}')
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f'{self.name}_sum{labels} {_format_value(state[-2])}')
+            lines.append(f'{self.name}_count{labels} {state[-1]}')
+        return lines
+
+
+class MetricsRegistry:
+    """
+    メトリクスの登録先
+    """
+    
+    def __init__(self):
+        """
+        初期化
+        """
+        self._metrics = []
+    
+    def register(self, metric):
+        """
+        メトリクスを登録する
+        
+        Args:
+            metric: Counter/Gauge/Histogram
+        
+        Returns:
+            登録したメトリクス
+        """
+        self._metrics.append(metric)
+        return metric
+    
+    def render(self) -> str:
+        """
+        Prometheusのテキスト形式で出力する
+        
+        Returns:
+            str: /metrics のレスポンス本文
+        """
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+
+class RateLimitLogHandler(logging.Handler):
+    """
+    discord.pyのHTTPクライアントが出力するレート制限のログを数えるハンドラー
+    discord.http のログのフォーマット文字列(record.msg)で判定します
+    """
+    
+    def emit(self, record: logging.LogRecord):
+        """
+        ログレコードを受け取る
+        
+        Args:
+            record: ログレコード
+        """
+        if record.levelno < logging.WARNING or not isinstance(record.msg, str):
+            return
+        
+        # 429の応答ごとに出力される(待ち時間が長すぎる場合は再試行せずRateLimitedを送出)
+        if record.msg.startswith(_RATE_LIMITED_LOG_PREFIX):
+            action = 'raised' if 'erroring instead' in record.msg else 'retried'
+            rest_rate_limits.inc(action)
+        # グローバルレート制限の場合は上記に続けて出力される
+        elif record.msg.startswith(_GLOBAL_RATE_LIMIT_LOG_PREFIX):
+            rest_global_rate_limits.inc()
+
+
+# Bot全体で共有するレジストリ
+registry = MetricsRegistry()
+
+gateway_latency = registry.register(Gauge(
+    'discord_gateway_latency_seconds', 'Gateway heartbeat latency (bot.latency)'
+))
+gateway_events = registry.register(Counter(
+    'discord_gateway_events_total', 'Gateway events received by type', ('event',)
+))
+on_message_duration = registry.register(Histogram(
+    'bot_on_message_duration_seconds', 'on_message processing time'
+))
+app_command_duration = registry.register(Histogram(
+    'bot_app_command_duration_seconds', 'Slash command latency from interaction creation to completion', ('command',)
+))
+db_query_duration = registry.register(Histogram(
+    'bot_db_query_duration_seconds', 'Database query latency by operation', ('operation',)
+))
+db_pool_in_use = registry.register(Gauge(
+    'bot_db_pool_connections_in_use', 'Database connections currently checked out'
+))
+db_pool_waits = registry.register(Counter(
+    'bot_db_pool_waits_total', 'Times a caller had to wait for a free database connection'
+))
+write_queue_depth = registry.register(Gauge(
+    'bot_write_queue_depth', 'Items waiting to be written', ('queue',)
+))
+cache_size = registry.register(Gauge(
+    'bot_cache_entries', 'Entries held in in-memory caches', ('cache',)
+))
+app_command_auto_deferred = registry.register(Counter(
+    'bot_app_command_auto_deferred_total', 'Slash commands deferred automatically after exceeding the response budget', ('command',)
+))
+log_queue = registry.register(Gauge(
+    'bot_log_queue', 'Logging queue state (depth, enqueued, dropped)', ('state',)
+))
+dm_notifications = registry.register(Counter(
+    'bot_dm_notifications_total', 'DM notification delivery attempts by result', ('result',)
+))
+dm_delivery_delay = registry.register(Histogram(
+    'bot_dm_delivery_delay_seconds', 'Time from queueing a DM notification to its delivery',
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 3600.0)
+))
+scheduled_jobs = registry.register(Counter(
+    'bot_scheduled_jobs_total', 'Scheduled job executions by kind and result', ('kind', 'result')
+))
+rest_rate_limits = registry.register(Counter(
+    'discord_rest_rate_limited_total', 'Discord REST responses with status 429 by how discord.py handled them', ('action',)
+))
+rest_global_rate_limits = registry.register(Counter(
+    'discord_rest_global_rate_limited_total', 'Discord REST 429 responses caused by the global rate limit'
+))
+
+
+def install_rate_limit_counter():
+    """
+    discord.httpのロガーに429を数えるハンドラーを登録する関数
+    """
+    http_logger = logging.getLogger('discord.http')
+    if not any(isinstance(handler, RateLimitLogHandler) for handler in http_logger.handlers):
+        http_logger.addHandler(RateLimitLogHandler(logging.WARNING))
@@ -0,0 +1,613 @@
+"""
+マイグレーションユーティリティ
+データベーススキーマをバージョン管理し、順番に適用します
+"""
+
+from utils.logger import get_logger
+
+logger = get_logger()
+
+
+async def _column_exists(connection, table: str, column: str) -> bool:
+    """
+    テーブルにカラムが存在するかチェック
+    
+    Args:
+        connection: データベース接続
+        table: テーブル名
+        column: カラム名
+    
+    Returns:
+        bool: 存在する場合True
+    """
+    cursor = await connection.execute(f'PRAGMA table_info({table})')
+    rows = await cursor.fetchall()
+    return any(row[1] == column for row in rows)
+
+
+async def _migration_1_initial_tables(connection):
+    """
+    基本テーブルの作成
+    """
+    # サーバー設定テーブル
+    await connection.execute('''
+        CREATE TABLE IF NOT EXISTS guild_settings (
+            guild_id INTEGER PRIMARY KEY,
+            admin_role_ids TEXT,
+            bot_role_ids TEXT,
+            public_log_channel_id INTEGER,
+            private_log_channel_id INTEGER,
+            report_log_channel_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # ユーザー統計テーブル
+    await connection.execute('''
+        CREATE TABLE IF NOT EXISTS user_stats (
+            guild_id INTEGER,
+            user_id INTEGER,
+            message_count INTEGER DEFAULT 0,
+            timeout_count INTEGER DEFAULT 0,
+            kick_count INTEGER DEFAULT 0,
+            ban_count INTEGER DEFAULT 0,
+            ticket_count INTEGER DEFAULT 0,
+            last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (guild_id, user_id)
+        )
+    ''')
+    
+    # チケットテーブル
+    await connection.execute('''
+        CREATE TABLE IF NOT EXISTS tickets (
+            ticket_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id INTEGER,
+            channel_id INTEGER,
+            creator_id INTEGER,
+            status TEXT DEFAULT 'open',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            closed_at TIMESTAMP
+        )
+    ''')
+    
+    # アンケートテーブル
+    await connection.execute('''
+        CREATE TABLE IF NOT EXISTS questionnaires (
+            questionnaire_id TEXT PRIMARY KEY,
+            guild_id INTEGER,
+            channel_id INTEGER,
+            message_id INTEGER,
+            creator_id INTEGER,
+            content TEXT,
+            status TEXT DEFAULT 'open',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # レポートテーブル
+    await connection.execute('''
+        CREATE TABLE IF NOT EXISTS reports (
+            report_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id INTEGER,
+            reporter_id INTEGER,
+            target_type TEXT,
+            target_id INTEGER,
+            content TEXT,
+            ticket_created BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # 統計送信設定テーブル
+    await connection.execute('''
+        CREATE TABLE IF NOT EXISTS stats_schedule (
+            guild_id INTEGER PRIMARY KEY,
+            channel_id INTEGER,
+            period TEXT,
+            last_sent TIMESTAMP
+        )
+    ''')
+    
+    # モデレーションログテーブル
+    await connection.execute('''
+        CREATE TABLE IF NOT EXISTS moderation_logs (
+            log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id INTEGER,
+            moderator_id INTEGER,
+            target_id INTEGER,
+            action_type TEXT,
+            reason TEXT,
+            duration INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+async def _migration_2_reaction_roles(connection):
+    """
+    リアクションロールテーブルの作成
+    """
+    await connection.execute('''
+        CREATE TABLE IF NOT EXISTS reaction_roles (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id INTEGER,
+            channel_id INTEGER,
+            message_id INTEGER,
+            emoji TEXT,
+            role_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(message_id, emoji)
+        )
+    ''')
+
+
+async def _migration_3_questionnaire_participants(connection):
+    """
+    アンケート参加者テーブルの作成と結果公開フラグの追加
+    """
+    await connection.execute('''
+        CREATE TABLE IF NOT EXISTS questionnaire_participants (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            questionnaire_id TEXT,
+            user_id INTEGER,
+            emoji TEXT,
+            added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(questionnaire_id, user_id, emoji)
+        )
+    ''')
+    
+    if not await _column_exists(connection, 'questionnaires', 'public_results'):
+        await connection.execute('''
+            ALTER TABLE questionnaires ADD COLUMN public_results BOOLEAN DEFAULT FALSE
+        ''')
+
+
+async def _migration_4_lookup_indexes(connection):
+    """
+    検索に使用するカラムのインデックス作成
+    """
+    # チケットチャンネルからのチケット検索
+    await connection.execute('''
+        CREATE INDEX IF NOT EXISTS idx_tickets_channel
+        ON tickets (channel_id, guild_id)
+    ''')
+    
+    # 期間内のチケット数集計
+    await connection.execute('''
+        CREATE INDEX IF NOT EXISTS idx_tickets_guild_created
+        ON tickets (guild_id, created_at)
+    ''')
+    
+    # リアクションからのアンケート検索
+    await connection.execute('''
+        CREATE INDEX IF NOT EXISTS idx_questionnaires_message
+        ON questionnaires (message_id, guild_id)
+    ''')
+    
+    # 作成者の最新のオープンなアンケート検索
+    await connection.execute('''
+        CREATE INDEX IF NOT EXISTS idx_questionnaires_creator
+        ON questionnaires (guild_id, creator_id, status, created_at)
+    ''')
+    
+    # 選択肢ごとの参加者検索
+    await connection.execute('''
+        CREATE INDEX IF NOT EXISTS idx_questionnaire_participants_emoji
+        ON questionnaire_participants (questionnaire_id, emoji, added_at)
+    ''')
+    
+    # 期間内のモデレーションアクション集計
+    await connection.execute('''
+        CREATE INDEX IF NOT EXISTS idx_moderation_logs_guild_created
+        ON moderation_logs (guild_id, created_at)
+    ''')
+    
+    # 期間内のユーザー統計集計
+    await connection.execute('''
+        CREATE INDEX IF NOT EXISTS idx_user_stats_guild_updated
+        ON user_stats (guild_id, last_updated)
+    ''')
+
+
+async def _migration_5_activity_buckets(connection):
+    """
+    期間集計用のアクティビティバケットテーブルの作成
+    """
+    # サーバーごとの時間単位・日単位の集計値
+    # metric: 'messages', 'tickets', 'moderation:<action_type>'
+    await connection.execute('''
+        CREATE TABLE IF NOT EXISTS activity_buckets (
+            guild_id INTEGER,
+            granularity TEXT,
+            bucket_start TEXT,
+            metric TEXT,
+            count INTEGER DEFAULT 0,
+            PRIMARY KEY (guild_id, granularity, bucket_start, metric)
+        )
+    ''')
+    
+    # 日ごとのユーザー別メッセージ数(アクティブユーザー数・ランキング用)
+    await connection.execute('''
+        CREATE TABLE IF NOT EXISTS activity_user_days (
+            guild_id INTEGER,
+            day TEXT,
+            user_id INTEGER,
+            message_count INTEGER DEFAULT 0,
+            PRIMARY KEY (guild_id, day, user_id)
+        )
+    ''')
+    
+    # 既存のモデレーションログとチケットから集計値を作成
+    # (メッセージ数は期間ごとの記録が無いため移行できません)
+    for granularity, bucket_format in (('hour', '%Y-%m-%d %H:00:00'), ('day', '%Y-%m-%d')):
+        await connection.execute(f'''
+            INSERT OR IGNORE INTO activity_buckets (guild_id, granularity, bucket_start, metric, count)
+            SELECT guild_id, '{granularity}', strftime('{bucket_format}', created_at),
+                   'moderation:' || action_type, COUNT(*)
+            FROM moderation_logs
+            WHERE created_at IS NOT NULL
+            GROUP BY guild_id, strftime('{bucket_format}', created_at), action_type
+        ''')
+        
+        await connection.execute(f'''
+            INSERT OR IGNORE INTO activity_buckets (guild_id, granularity, bucket_start, metric, count)
+            SELECT guild_id, '{granularity}', strftime('{bucket_format}', created_at),
+                   'tickets', COUNT(*)
+            FROM tickets
+            WHERE created_at IS NOT NULL
+            GROUP BY guild_id, strftime('{bucket_format}', created_at)
+        ''')
+
+
+async def _migration_6_questionnaire_tallies(connection):
+    """
+    アンケートの選択肢ごとの集計テーブルの作成とリアルタイム結果表示フラグの追加
+    """
+    await connection.execute('''
+        CREATE TABLE IF NOT EXISTS questionnaire_tallies (
+            questionnaire_id TEXT,
+            emoji TEXT,
+            count INTEGER DEFAULT 0,
+            PRIMARY KEY (questionnaire_id, emoji)
+        )
+    ''')
+    
+    # 既存の参加者記録から集計値を作成
+    await connection.execute('''
+        INSERT OR IGNORE INTO questionnaire_tallies (questionnaire_id, emoji, count)
+        SELECT questionnaire_id, emoji, COUNT(*)
+        FROM questionnaire_participants
+        GROUP BY questionnaire_id, emoji
+    ''')
+    
+    if not await _column_exists(connection, 'questionnaires', 'live_results'):
+        await connection.execute('''
+            ALTER TABLE questionnaires ADD COLUMN live_results BOOLEAN DEFAULT FALSE
+        ''')
+
+
+async def _migration_7_bot_state(connection):
+    """
+    Bot全体の状態(コマンドツリーのハッシュなど)を保存するテーブルの作成
+    """
+    await connection.execute('''
+        CREATE TABLE IF NOT EXISTS bot_state (
+            key TEXT PRIMARY KEY,
+            value TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+async def _migration_8_dm_notifications(connection):
+    """
+    DM通知の送信キューテーブルの作成
+    """
+    # status: 'pending', 'sent', 'undeliverable', 'failed'
+    await connection.execute('''
+        CREATE TABLE IF NOT EXISTS dm_notifications (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id INTEGER,
+            user_id INTEGER,
+            dedup_key TEXT,
+            embed TEXT,
+            status TEXT DEFAULT 'pending',
+            attempts INTEGER DEFAULT 0,
+            last_error TEXT,
+            created_at TIMESTAMP,
+            next_attempt_at TIMESTAMP,
+            completed_at TIMESTAMP
+        )
+    ''')
+    
+    # 送信待ちの通知の取得
+    await connection.execute('''
+        CREATE INDEX IF NOT EXISTS idx_dm_notifications_due
+        ON dm_notifications (status, next_attempt_at)
+    ''')
+    
+    # 同じ通知が送信待ちのまま重複しないようにする
+    await connection.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_dm_notifications_dedup
+        ON dm_notifications (dedup_key)
+        WHERE status = 'pending'
+    ''')
+
+
+async def _migration_9_ticket_transcript_events(connection):
+    """
+    チケットメッセージの記録テーブルの作成
+    """
+    # event: 'create', 'edit', 'delete'(追記のみ、更新・削除はしない)
+    await connection.execute('''
+        CREATE TABLE IF NOT EXISTS ticket_transcript_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ticket_id INTEGER,
+            message_id INTEGER,
+            event TEXT,
+            author_id INTEGER,
+            author_name TEXT,
+            content TEXT,
+            attachments TEXT,
+            created_at TIMESTAMP
+        )
+    ''')
+    
+    # チケットごとのメッセージの読み込み
+    await connection.execute('''
+        CREATE INDEX IF NOT EXISTS idx_ticket_transcript_events_ticket
+        ON ticket_transcript_events (ticket_id, event)
+    ''')
+    
+    # メッセージごとの編集・削除の検索
+    await connection.execute('''
+        CREATE INDEX IF NOT EXISTS idx_ticket_transcript_events_message
+        ON ticket_transcript_events (ticket_id, message_id, event)
+    ''')
+    
+    # 作成時からメッセージを記録しているチケットかどうか
+    if not await _column_exists(connection, 'tickets', 'transcript_captured'):
+        await connection.execute('''
+            ALTER TABLE tickets ADD COLUMN transcript_captured BOOLEAN DEFAULT FALSE
+        ''')
+
+
+async def _migration_10_ticket_creator_index(connection):
+    """
+    作成者ごとのオープンなチケット検索用インデックスの作成
+    """
+    await connection.execute('''
+        CREATE INDEX IF NOT EXISTS idx_tickets_creator
+        ON tickets (guild_id, creator_id, status)
+    ''')
+
+
+async def _migration_11_scheduled_jobs(connection):
+    """
+    遅延ジョブテーブルの作成
+    (既にクローズされているチケットの自動削除は、ジョブスケジューラーの起動時に登録されます)
+    """
+    # status: 'pending', 'running', 'done', 'failed', 'cancelled'
+    await connection.execute('''
+        CREATE TABLE IF NOT EXISTS scheduled_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            job_key TEXT,
+            payload TEXT,
+            status TEXT DEFAULT 'pending',
+            attempts INTEGER DEFAULT 0,
+            last_error TEXT,
+            due_at TIMESTAMP NOT NULL,
+            created_at TIMESTAMP,
+            completed_at TIMESTAMP
+        )
+    ''')
+    
+    # 期限が来たジョブの取得
+    await connection.execute('''
+        CREATE INDEX IF NOT EXISTS idx_scheduled_jobs_due
+        ON scheduled_jobs (status, due_at)
+    ''')
+    
+    # 同じジョブが実行待ちのまま重複しないようにする
+    await connection.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_scheduled_jobs_key
+        ON scheduled_jobs (kind, job_key)
+        WHERE status = 'pending'
+    ''')
+
+
+async def _migration_12_search_index(connection):
+    """
+    チケット・通報の全文検索インデックス(FTS5)の作成
+    """
+    # 日本語は単語が空白で区切られないため、部分一致で検索できるtrigramトークナイザーを使用する
+    # チケットは削除後も検索できるよう、表示に必要な情報もインデックス側に保存する(rowid = ticket_id)
+    await connection.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS ticket_search USING fts5(
+            title,
+            content,
+            guild_id UNINDEXED,
+            creator_id UNINDEXED,
+            closed_at UNINDEXED,
+            tokenize = 'trigram'
+        )
+    ''')
+    
+    # タイトル(チャンネル名)に一致したものを本文より上位にする
+    await connection.execute('''
+        INSERT INTO ticket_search (ticket_search, rank) VALUES ('rank', 'bm25(5.0, 1.0)')
+    ''')
+    
+    # 通報はreportsテーブルの内容をトリガーでインデックスに反映する(rowid = report_id)
+    await connection.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS report_search USING fts5(
+            content,
+            content = 'reports',
+            content_rowid = 'report_id',
+            tokenize = 'trigram'
+        )
+    ''')
+    await connection.execute('''
+        CREATE TRIGGER IF NOT EXISTS reports_search_insert AFTER INSERT ON reports BEGIN
+            INSERT INTO report_search (rowid, content) VALUES (new.report_id, new.content);
+        END
+    ''')
+    await connection.execute('''
+        CREATE TRIGGER IF NOT EXISTS reports_search_delete AFTER DELETE ON reports BEGIN
+            INSERT INTO report_search (report_search, rowid, content) VALUES ('delete', old.report_id, old.content);
+        END
+    ''')
+    await connection.execute('''
+        CREATE TRIGGER IF NOT EXISTS reports_search_update AFTER UPDATE OF content ON reports BEGIN
+            INSERT INTO report_search (report_search, rowid, content) VALUES ('delete', old.report_id, old.content);
+            INSERT INTO report_search (rowid, content) VALUES (new.report_id, new.content);
+        END
+    ''')
+    await connection.execute('''
+        INSERT INTO report_search (report_search) VALUES ('rebuild')
+    ''')
+    
+    # 既にクローズされているチケットを登録する(記録済みのメッセージのみ)
+    await connection.execute('''
+        INSERT INTO ticket_search (rowid, title, content, guild_id, creator_id, closed_at)
+        SELECT
+            t.ticket_id,
+            'チケット#' || t.ticket_id,
+            (
+                SELECT group_concat(COALESCE(e.author_name, '') || ': ' || e.content, char(10))
+                FROM ticket_transcript_events e
+                WHERE e.ticket_id = t.ticket_id AND e.event = 'create' AND e.content != ''
+            ),
+            t.guild_id,
+            t.creator_id,
+            t.closed_at
+        FROM tickets t
+        WHERE t.status = 'closed'
+    ''')
+
+
+async def _migration_13_panel_messages(connection):
+    """
+    パネルメッセージ登録テーブルの作成
+    """
+    # panel_type: 'ticket', 'reaction_role'
+    await connection.execute('''
+        CREATE TABLE IF NOT EXISTS panel_messages (
+            message_id INTEGER PRIMARY KEY,
+            guild_id INTEGER,
+            channel_id INTEGER,
+            panel_type TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # 既存のリアクションロールパネルを登録する
+    # (チケットパネルはメッセージIDを保存していないため、削除時にチャンネル履歴から検索する)
+    await connection.execute('''
+        INSERT OR IGNORE INTO panel_messages (message_id, guild_id, channel_id, panel_type)
+        SELECT message_id, MIN(guild_id), MIN(channel_id), 'reaction_role'
+        FROM reaction_roles
+        GROUP BY message_id
+    ''')
+
+
+
+async def _migration_14_ticket_search_guild_key(connection):
+    """
+    チケット検索インデックスのサーバー列を検索対象にする
+    """
+    # UNINDEXEDの列での絞り込みは全サーバーの一致行を読むため、サーバーを表す語(g<サーバーID>g)を
+    # 索引付きの列に保存し、MATCHの列フィルターで絞り込めるようにする(FTS5は列を変更できないため作り直す)
+    await connection.execute('''
+        CREATE VIRTUAL TABLE ticket_search_new USING fts5(
+            title,
+            content,
+            guild_key,
+            creator_id UNINDEXED,
+            closed_at UNINDEXED,
+            tokenize = 'trigram'
+        )
+    ''')
+    
+    # サーバーの列は関連度に影響させない
+    await connection.execute('''
+        INSERT INTO ticket_search_new (ticket_search_new, rank) VALUES ('rank', 'bm25(5.0, 1.0, 0.0)')
+    ''')
+    
+    await connection.execute('''
+        INSERT INTO ticket_search_new (rowid, title, content, guild_key, creator_id, closed_at)
+        SELECT rowid, title, content, 'g' || guild_id || 'g', creator_id, closed_at
+        FROM ticket_search
+    ''')
+    await connection.execute('DROP TABLE ticket_search')
+    await connection.execute('ALTER TABLE ticket_search_new RENAME TO ticket_search')
+
+
+async def _migration_15_reports_guild_index(connection):
+    """
+    通報のサーバー別インデックスの作成
+    """
+    # 短い語での部分一致検索(全文検索を使わない)でサーバーの通報のみを読む
+    await connection.execute('''
+        CREATE INDEX IF NOT EXISTS idx_reports_guild_created
+        ON reports (guild_id, created_at)
+    ''')
+
+# (バージョン, 説明, 適用関数) の順番付きリスト
+# 新しいマイグレーションは末尾に追加してください(既存のものは変更しないこと)
+MIGRATIONS = [
+    (1, '基本テーブルの作成', _migration_1_initial_tables),
+    (2, 'リアクションロールテーブルの作成', _migration_2_reaction_roles),
+    (3, 'アンケート参加者テーブルの作成', _migration_3_questionnaire_participants),
+    (4, '検索用インデックスの作成', _migration_4_lookup_indexes),
+    (5, 'アクティビティバケットテーブルの作成', _migration_5_activity_buckets),
+    (6, 'アンケート集計テーブルの作成', _migration_6_questionnaire_tallies),
+    (7, 'Bot状態テーブルの作成', _migration_7_bot_state),
+    (8, 'DM通知キューテーブルの作成', _migration_8_dm_notifications),
+    (9, 'チケットメッセージ記録テーブルの作成', _migration_9_ticket_transcript_events),
+    (10, 'チケット作成者インデックスの作成', _migration_10_ticket_creator_index),
+    (11, '遅延ジョブテーブルの作成', _migration_11_scheduled_jobs),
+    (12, '全文検索インデックスの作成', _migration_12_search_index),
+    (13, 'パネルメッセージ登録テーブルの作成', _migration_13_panel_messages),
+    (14, 'チケット検索インデックスのサーバー列の索引化', _migration_14_ticket_search_guild_key),
+    (15, '通報のサーバー別インデックスの作成', _migration_15_reports_guild_index),
+]
+
+
+async def run_migrations(connection):
+    """
+    未適用のマイグレーションを順番に適用する関数
+    
+    Args:
+        connection: データベース接続
+    """
+    await connection.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    cursor = await connection.execute('SELECT MAX(version) FROM schema_version')
+    row = await cursor.fetchone()
+    current_version = row[0] if row[0] else 0
+    
+    for version, description, migrate in MIGRATIONS:
+        if version <= current_version:
+            continue
+        
+        try:
+            await migrate(connection)
+            await connection.execute('''
+                INSERT INTO schema_version (version, description)
+                VALUES (?, ?)
+            ''', (version, description))
+            await connection.commit()
+        except Exception:
+            await connection.rollback()
+            logger.error(f'マイグレーション{version}の適用に失敗しました: {description}')
+            raise
+        
+        logger.info(f'マイグレーション{version}を適用しました: {description}')
@@ -0,0 +1,144 @@
+"""
+パネルメッセージ登録ユーティリティ
+チケットパネル・リアクションロールパネルのメッセージIDを保存し、チャンネル履歴を検索せずにパネルを特定します
+"""
+
+import discord
+from utils.logger import get_logger
+
+logger = get_logger()
+
+# パネルの種類
+PANEL_TICKET = 'ticket'
+PANEL_REACTION_ROLE = 'reaction_role'
+
+
+class PanelRegistry:
+    """
+    パネルメッセージの登録先
+    登録済みのメッセージIDをメモリ上に保持し、削除イベントはDBアクセスなしで判定します
+    """
+    
+    def __init__(self, db):
+        """
+        初期化
+        
+        Args:
+            db: 共有Databaseインスタンス
+        """
+        self.db = db
+        # message_id -> (channel_id, パネルの種類)
+        self._panels = {}
+    
+    def __len__(self) -> int:
+        """
+        登録済みのパネル数
+        
+        Returns:
+            int: パネル数
+        """
+        return len(self._panels)
+    
+    async def load(self):
+        """
+        登録済みのパネルをデータベースから読み込む
+        """
+        rows = await self.db.fetchall('''
+            SELECT message_id, channel_id, panel_type FROM panel_messages
+        ''')
+        self._panels = {message_id: (channel_id, panel_type) for message_id, channel_id, panel_type in rows}
+        logger.info(f'{len(self._panels)}件のパネルメッセージを読み込みました')
+    
+    async def register(self, guild_id: int, channel_id: int, message_id: int, panel_type: str):
+        """
+        パネルメッセージを登録する
+        
+        Args:
+            guild_id: サーバーID
+            channel_id: チャンネルID
+            message_id: メッセージID
+            panel_type: パネルの種類(PANEL_TICKET / PANEL_REACTION_ROLE)
+        """
+        await self.db.execute('''
+            INSERT OR REPLACE INTO panel_messages (guild_id, channel_id, message_id, panel_type)
+            VALUES (?, ?, ?, ?)
+        ''', (guild_id, channel_id, message_id, panel_type))
+        self._panels[message_id] = (channel_id, panel_type)
+    
+    def channel_id(self, message_id: int):
+        """
+        パネルメッセージがあるチャンネルのIDを取得する
+        
+        Args:
+            message_id: メッセージID
+        
+        Returns:
+            int: チャンネルID(登録されていない場合None)
+        """
+        panel = self._panels.get(message_id)
+        return panel[0] if panel else None
+    
+    def find(self, channel_id: int, panel_type: str) -> list:
+        """
+        チャンネルに設置されている指定の種類のパネルを取得する
+        
+        Args:
+            channel_id: チャンネルID
+            panel_type: パネルの種類
+        
+        Returns:
+            list: メッセージIDのリスト
+        """
+        return [
+            message_id for message_id, panel in self._panels.items()
+            if panel == (channel_id, panel_type)
+        ]
+    
+    async def remove(self, message_ids: list):
+        """
+        パネルメッセージの登録を解除する
+        
+        Args:
+            message_ids: メッセージIDのリスト
+        """
+        message_ids = [message_id for message_id in message_ids if message_id in self._panels]
+        if not message_ids:
+            return
+        
+        await self.db.executemany('''
+            DELETE FROM panel_messages
+            WHERE message_id = ?
+        ''', [(message_id,) for message_id in message_ids])
+        for message_id in message_ids:
+            self._panels.pop(message_id, None)
+    
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        """
+        メッセージ削除イベント(パネルが手動で削除された場合に登録を解除)
+        
+        Args:
+            payload: イベントデータ
+        """
+        if payload.message_id in self._panels:
+            await self.remove([payload.message_id])
+    
+    async def on_raw_bulk_message_delete(self, payload: discord.RawBulkMessageDeleteEvent):
+        """
+        メッセージ一括削除イベント
+        
+        Args:
+            payload: イベントデータ
+        """
+        await self.remove(list(payload.message_ids))
+    
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
+        """
+        チャンネル削除イベント(チャンネル内のパネルの登録を解除)
+        
+        Args:
+            channel: 削除されたチャンネル
+        """
+        await self.remove([
+            message_id for message_id, (channel_id, _) in self._panels.items()
+            if channel_id == channel.id
+        ])
@@ -4,7 +4,8 @@
 """
 
 import discord
-from utils.database import Database
+from utils.database import get_database
+from utils.guild_settings import LOG_CHANNEL_COLUMNS
 from utils.logger import get_logger
 
 logger = get_logger()
@@ -28,28 +29,11 @@ async def is_administrator(member: discord.Member) -> bool:
     if member.guild_permissions.administrator:
         return True
     
-    # データベースに登録された管理者ロールを持っている
-    db = Database()
-    await db.initialize()
-    
+    # データベースに登録された管理者ロールを持っている(キャッシュから取得)
     try:
-        cursor = await db.connection.execute('''
-            SELECT admin_role_ids FROM guild_settings
-            WHERE guild_id = ?
-        ''', (member.guild.id,))
-        
-        row = await cursor.fetchone()
-        
-        if row and row[0]:
-            # JSONから管理者ロールIDのリストを取得
-            import json
-            admin_role_ids = json.loads(row[0]) if row[0] else []
-            
-            # ユーザーが管理者ロールを持っているかチェック
-            user_role_ids = [role.id for role in member.roles]
-            return any(role_id in admin_role_ids for role_id in user_role_ids)
-        
-        return False
+        settings = await get_database().guild_settings.get(member.guild.id)
+        admin_role_ids = settings['admin_role_ids']
+        return any(role.id in admin_role_ids for role in member.roles)
         
     except Exception as e:
         logger.error(f'管理者チェックエラー: {e}')
@@ -66,27 +50,10 @@ async def is_bot_role(member: discord.Member) -> bool:
     Returns:
         bool: Botロールを持っている場合True
     """
-    db = Database()
-    await db.initialize()
-    
     try:
-        cursor = await db.connection.execute('''
-            SELECT bot_role_ids FROM guild_settings
-            WHERE guild_id = ?
-        ''', (member.guild.id,))
-        
-        row = await cursor.fetchone()
-        
-        if row and row[0]:
-            # JSONからBotロールIDのリストを取得
-            import json
-            bot_role_ids = json.loads(row[0]) if row[0] else []
-            
-            # ユーザーがBotロールを持っているかチェック
-            user_role_ids = [role.id for role in member.roles]
-            return any(role_id in bot_role_ids for role_id in user_role_ids)
-        
-        return False
+        settings = await get_database().guild_settings.get(member.guild.id)
+        bot_role_ids = settings['bot_role_ids']
+        return any(role.id in bot_role_ids for role in member.roles)
         
     except Exception as e:
         logger.error(f'Botロールチェックエラー: {e}')
@@ -138,30 +105,15 @@ async def get_log_channel(guild: discord.Guild, log_type: str) -> discord.TextCh
     Returns:
         discord.TextChannel: ログチャンネル(見つからない場合None)
     """
-    db = Database()
-    await db.initialize()
-    
     try:
-        column_map = {
-            'public': 'public_log_channel_id',
-            'private': 'private_log_channel_id',
-            'report': 'report_log_channel_id'
-        }
-        
-        column = column_map.get(log_type)
+        column = LOG_CHANNEL_COLUMNS.get(log_type)
         if not column:
             return None
         
-        cursor = await db.connection.execute(f'''
-            SELECT {column} FROM guild_settings
-            WHERE guild_id = ?
-        ''', (guild.id,))
-        
-        row = await cursor.fetchone()
-        
-        if row and row[0]:
-            channel = guild.get_channel(row[0])
-            return channel
+        settings = await get_database().guild_settings.get(guild.id)
+        channel_id = settings[column]
+        if channel_id:
+            return guild.get_channel(channel_id)
         
         return None
         
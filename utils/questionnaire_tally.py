@@ -0,0 +1,233 @@
+"""
+アンケート集計ユーティリティ
+リアクションイベントから選択肢ごとの票数をメモリとデータベースの両方で更新し続けます
+"""
+
+from utils.logger import get_logger
+
+logger = get_logger()
+
+# 読み込み中に投票があった場合に票数を読み直す最大回数
+_LOAD_ATTEMPTS = 3
+
+
+class QuestionnaireTally:
+    """
+    アンケートの票数の集計
+    票数はquestionnaire_talliesに保存し、受付中のアンケートはメモリ上にも保持します
+    """
+    
+    def __init__(self, db):
+        """
+        初期化
+        
+        Args:
+            db: 共有Databaseインスタンス
+        """
+        self.db = db
+        # message_id -> アンケート情報(受付中のもののみ)
+        self._questionnaires = {}
+        # questionnaire_id -> {emoji: 票数}
+        self._counts = {}
+        # questionnaire_id -> 票数を読み込んでいない間の投票の回数(読み込み中の投票を検出するために使う)
+        self._versions = {}
+    
+    def register(self, message_id: int, questionnaire_id: str, channel_id: int, live_results: bool):
+        """
+        作成したアンケートを登録する
+        
+        Args:
+            message_id: アンケートのメッセージID
+            questionnaire_id: アンケートID
+            channel_id: チャンネルID
+            live_results: 結果をリアルタイムで表示するか
+        """
+        self._questionnaires[message_id] = {
+            'questionnaire_id': questionnaire_id,
+            'channel_id': channel_id,
+            'message_id': message_id,
+            'status': 'open',
+            'live_results': bool(live_results)
+        }
+        self._counts[questionnaire_id] = {}
+    
+    async def get_by_message(self, message_id: int, guild_id: int) -> dict:
+        """
+        メッセージIDからアンケート情報を取得する
+        
+        Args:
+            message_id: メッセージID
+            guild_id: サーバーID
+        
+        Returns:
+            dict: アンケート情報(アンケートでない場合None)
+        """
+        info = self._questionnaires.get(message_id)
+        if info is not None:
+            return info
+        
+        row = await self.db.fetchone('''
+            SELECT questionnaire_id, channel_id, status, live_results FROM questionnaires
+            WHERE message_id = ? AND guild_id = ?
+        ''', (message_id, guild_id))
+        
+        if not row:
+            return None
+        
+        info = {
+            'questionnaire_id': row[0],
+            'channel_id': row[1],
+            'message_id': message_id,
+            'status': row[2],
+            'live_results': bool(row[3])
+        }
+        # 終了済みのアンケートはリアクションが少ないため、メモリに保持せず都度読み込む
+        if info['status'] == 'open':
+            self._questionnaires[message_id] = info
+        return info
+    
+    def mark_closed(self, message_id: int, questionnaire_id: str):
+        """
+        アンケートを終了済みにする
+        
+        Args:
+            message_id: メッセージID
+            questionnaire_id: アンケートID
+        """
+        # 処理中の呼び出しが持っている情報にも反映してから破棄する
+        info = self._questionnaires.pop(message_id, None)
+        if info is not None:
+            info['status'] = 'closed'
+        
+        # 終了後は票数が変わらないためメモリから破棄する
+        self._counts.pop(questionnaire_id, None)
+        self._versions.pop(questionnaire_id, None)
+    
+    async def counts(self, questionnaire_id: str) -> dict:
+        """
+        選択肢ごとの票数を取得する
+        
+        Args:
+            questionnaire_id: アンケートID
+        
+        Returns:
+            dict: {emoji: 票数}
+        """
+        counts = self._counts.get(questionnaire_id)
+        if counts is not None:
+            return dict(counts)
+        
+        for _ in range(_LOAD_ATTEMPTS):
+            version = self._versions.get(questionnaire_id, 0)
+            rows = await self.db.fetchall('''
+                SELECT emoji, count FROM questionnaire_tallies
+                WHERE questionnaire_id = ? AND count > 0
+            ''', (questionnaire_id,))
+            counts = {emoji: count for emoji, count in rows}
+            
+            cached = self._counts.get(questionnaire_id)
+            if cached is not None:
+                # 読み込み中に他の呼び出しが読み込んだ場合はそちらを使う(以降の投票が反映されている)
+                return dict(cached)
+            
+            # 読み込み中に投票があった場合は、その票を含まない可能性があるため読み直す
+            if self._versions.get(questionnaire_id, 0) == version:
+                self._counts[questionnaire_id] = counts
+                self._versions.pop(questionnaire_id, None)
+                return dict(counts)
+        
+        # 投票が続いている場合はキャッシュせずに返す(次回の取得時に読み込み直す)
+        return counts
+    
+    async def participants(self, questionnaire_id: str) -> dict:
+        """
+        選択肢ごとの参加者を1回のクエリで取得する
+        
+        Args:
+            questionnaire_id: アンケートID
+        
+        Returns:
+            dict: {emoji: [user_id, ...]}(投票順)
+        """
+        rows = await self.db.fetchall('''
+            SELECT emoji, user_id FROM questionnaire_participants
+            WHERE questionnaire_id = ?
+            ORDER BY added_at
+        ''', (questionnaire_id,))
+        
+        participants = {}
+        for emoji, user_id in rows:
+            participants.setdefault(emoji, []).append(user_id)
+        return participants
+    
+    async def add_vote(self, questionnaire_id: str, user_id: int, emoji: str) -> bool:
+        """
+        参加者を記録して票数を1加算する
+        
+        Args:
+            questionnaire_id: アンケートID
+            user_id: ユーザーID
+            emoji: 絵文字
+        
+        Returns:
+            bool: 票数が変わった場合True
+        """
+        async with self.db.transaction() as connection:
+            cursor = await connection.execute('''
+                INSERT OR IGNORE INTO questionnaire_participants
+                (questionnaire_id, user_id, emoji)
+                VALUES (?, ?, ?)
+            ''', (questionnaire_id, user_id, emoji))
+            
+            if cursor.rowcount == 0:
+                return False
+            
+            await connection.execute('''
+                INSERT INTO questionnaire_tallies (questionnaire_id, emoji, count)
+                VALUES (?, ?, 1)
+                ON CONFLICT(questionnaire_id, emoji) DO UPDATE SET
+                    count = count + 1
+            ''', (questionnaire_id, emoji))
+        
+        counts = self._counts.get(questionnaire_id)
+        if counts is not None:
+            counts[emoji] = counts.get(emoji, 0) + 1
+        else:
+            self._versions[questionnaire_id] = self._versions.get(questionnaire_id, 0) + 1
+        return True
+    
+    async def remove_vote(self, questionnaire_id: str, user_id: int, emoji: str) -> bool:
+        """
+        参加者記録を削除して票数を1減算する
+        
+        Args:
+            questionnaire_id: アンケートID
+            user_id: ユーザーID
+            emoji: 絵文字
+        
+        Returns:
+            bool: 票数が変わった場合True
+        """
+        async with self.db.transaction() as connection:
+            cursor = await connection.execute('''
+                DELETE FROM questionnaire_participants
+                WHERE questionnaire_id = ? AND user_id = ? AND emoji = ?
+            ''', (questionnaire_id, user_id, emoji))
+            
+            if cursor.rowcount == 0:
+                return False
+            
+            await connection.execute('''
+                UPDATE questionnaire_tallies
+                SET count = MAX(count - 1, 0)
+                WHERE questionnaire_id = ? AND emoji = ?
+            ''', (questionnaire_id, emoji))
+        
+        counts = self._counts.get(questionnaire_id)
+        if counts is None:
+            self._versions[questionnaire_id] = self._versions.get(questionnaire_id, 0) + 1
+        elif counts.get(emoji, 0) > 0:
+            counts[emoji] -= 1
+            if counts[emoji] == 0:
+                del counts[emoji]
+        return True
@@ -0,0 +1,167 @@
+"""
+リアクションルーターユーティリティ
+リアクションロールパネルやアンケートなど、対象メッセージへのリアクションだけを担当Cogに振り分けます
+"""
+
+from utils.logger import get_logger
+
+logger = get_logger()
+
+
+class ReactionRouter:
+    """
+    on_raw_reaction_add/removeの振り分け
+    対象メッセージIDをメモリ上に保持し、それ以外のリアクションはDBアクセスなしで破棄します
+    """
+    
+    def __init__(self, bot, db):
+        """
+        初期化
+        
+        Args:
+            bot: Botインスタンス
+            db: 共有Databaseインスタンス
+        """
+        self.bot = bot
+        self.db = db
+        # message_id -> 担当名
+        self._owners = {}
+        # 担当名 -> (追加時のハンドラー, 削除時のハンドラー)
+        self._handlers = {}
+        
+        # 振り分け状況のカウンター
+        self.stats = {
+            'dispatched': 0,
+            'dropped': 0,
+            'errors': 0
+        }
+    
+    async def load(self):
+        """
+        データベースから対象メッセージIDを読み込む
+        """
+        reaction_role_rows = await self.db.fetchall('''
+            SELECT DISTINCT message_id FROM reaction_roles
+        ''')
+        questionnaire_rows = await self.db.fetchall('''
+            SELECT message_id FROM questionnaires
+            WHERE message_id IS NOT NULL
+        ''')
+        
+        self._owners = {}
+        for (message_id,) in reaction_role_rows:
+            self._owners[message_id] = 'reaction_role'
+        for (message_id,) in questionnaire_rows:
+            self._owners[message_id] = 'questionnaire'
+        
+        logger.info(
+            f'リアクション対象メッセージを読み込みました '
+            f'(リアクションロール: {len(reaction_role_rows)}件, アンケート: {len(questionnaire_rows)}件)'
+        )
+    
+    def register(self, owner: str, on_add, on_remove):
+        """
+        担当Cogのハンドラーを登録する
+        
+        Args:
+            owner: 担当名('reaction_role', 'questionnaire')
+            on_add: リアクション追加時に呼ばれるコルーチン関数(payloadを受け取る)
+            on_remove: リアクション削除時に呼ばれるコルーチン関数(payloadを受け取る)
+        """
+        self._handlers[owner] = (on_add, on_remove)
+    
+    def unregister(self, owner: str):
+        """
+        担当Cogのハンドラーを解除する
+        
+        Args:
+            owner: 担当名
+        """
+        self._handlers.pop(owner, None)
+    
+    def track(self, message_id: int, owner: str):
+        """
+        メッセージを振り分け対象に追加する
+        
+        Args:
+            message_id: メッセージID
+            owner: 担当名
+        """
+        self._owners[message_id] = owner
+    
+    def untrack(self, message_id: int):
+        """
+        メッセージを振り分け対象から外す
+        
+        Args:
+            message_id: メッセージID
+        """
+        self._owners.pop(message_id, None)
+    
+    def is_tracked(self, message_id: int) -> bool:
+        """
+        メッセージが振り分け対象かチェック
+        
+        Args:
+            message_id: メッセージID
+        
+        Returns:
+            bool: 対象の場合True
+        """
+        return message_id in self._owners
+    
+    def __len__(self) -> int:
+        """
+        振り分け対象のメッセージ数
+        
+        Returns:
+            int: メッセージ数
+        """
+        return len(self._owners)
+    
+    async def _dispatch(self, payload, index: int):
+        """
+        リアクションイベントを担当Cogに振り分ける内部関数
+        
+        Args:
+            payload: リアクションイベント
+            index: 0なら追加、1なら削除のハンドラーを呼ぶ
+        """
+        owner = self._owners.get(payload.message_id)
+        if owner is None:
+            self.stats['dropped'] += 1
+            return
+        
+        # Bot自身のリアクションは無視
+        if payload.user_id == self.bot.user.id:
+            return
+        
+        handlers = self._handlers.get(owner)
+        if handlers is None:
+            self.stats['dropped'] += 1
+            return
+        
+        self.stats['dispatched'] += 1
+        try:
+            await handlers[index](payload)
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.error(f'リアクション処理エラー ({owner}): {e}')
+    
+    async def on_raw_reaction_add(self, payload):
+        """
+        リアクションが追加された時のイベント
+        
+        Args:
+            payload: リアクションイベント
+        """
+        await self._dispatch(payload, 0)
+    
+    async def on_raw_reaction_remove(self, payload):
+        """
+        リアクションが削除された時のイベント
+        
+        Args:
+            payload: リアクションイベント
+        """
+        await self._dispatch(payload, 1)
@@ -0,0 +1,434 @@
+"""
+REST送信スケジューラーユーティリティ
+送信・リアクション追加・削除などのDiscord REST呼び出しを1つのキューで優先度順に実行します
+"""
+
+import asyncio
+import contextvars
+import functools
+import heapq
+import os
+import random
+from datetime import timedelta
+import aiohttp
+import discord
+from utils.logger import get_logger
+
+logger = get_logger()
+
+# 優先度(小さいほど先に実行される)
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BACKGROUND = 2
+
+# 一括削除できる最大件数と、作成からの経過時間の上限(Discordの制限、境界付近は余裕を持たせる)
+BULK_DELETE_LIMIT = 100
+BULK_DELETE_MAX_AGE = timedelta(days=14) - timedelta(minutes=5)
+
+
+class _Job:
+    """
+    キューに入っている呼び出し1件
+    """
+    
+    __slots__ = ('bucket', 'factory', 'priority', 'sequence', 'future', 'context', 'attempts', 'idempotent')
+    
+    def __init__(self, bucket: str, factory, priority: int, sequence: int, future: asyncio.Future,
+                 idempotent: bool = True):
+        """
+        初期化
+        
+        Args:
+            bucket: レート制限のバケット名
+            factory: 呼び出しのコルーチンを作る関数
+            priority: 優先度
+            sequence: 投入順の連番
+            future: 結果の受け取り先
+            idempotent: 同じ呼び出しを繰り返しても結果が変わらないか
+        """
+        self.bucket = bucket
+        self.factory = factory
+        self.priority = priority
+        self.sequence = sequence
+        self.future = future
+        # 投入元のコンテキスト(トレースのスパンなど)を引き継いで実行する
+        self.context = contextvars.copy_context()
+        self.attempts = 0
+        self.idempotent = idempotent
+    
+    def __lt__(self, other):
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
+
+
+class RestScheduler:
+    """
+    Discord RESTの送信キュー
+    同じバケット(チャンネルなど)への呼び出しは1件ずつ順番に実行し、全体の同時実行数を制限します
+    バックグラウンドの呼び出しは同時実行枠を1つ空けておき、ユーザー操作への応答を妨げません
+    """
+    
+    def __init__(self, max_concurrency: int = None, max_retries: int = None, backoff: float = None):
+        """
+        初期化
+        
+        Args:
+            max_concurrency: 同時に実行する呼び出し数(省略時は環境変数REST_MAX_CONCURRENCY、既定値4)
+            max_retries: 一時的なエラーの再試行回数(省略時は環境変数REST_MAX_RETRIES、既定値3)
+            backoff: 再試行までの基本待ち時間(省略時は環境変数REST_RETRY_BACKOFF、既定値1秒)
+        """
+        self.max_concurrency = max(2, max_concurrency or int(os.getenv('REST_MAX_CONCURRENCY', '4')))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('REST_MAX_RETRIES', '3'))
+        self.backoff = backoff or float(os.getenv('REST_RETRY_BACKOFF', '1'))
+        # 実行可能な呼び出し(優先度順のヒープ)
+        self._ready = []
+        # 実行中・待機中の呼び出しがあるバケット -> 順番待ちの呼び出し(ヒープ)
+        self._buckets = {}
+        self._sequence = 0
+        self._running = 0
+        self._running_background = 0
+        # 実行中の呼び出しのタスク(ガベージコレクションで消えないよう参照を保持する)
+        self._executing = set()
+        self._pending = 0
+        self._wakeup = asyncio.Event()
+        self._task = None
+        
+        # 実行状況のカウンター
+        self.stats = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'retries': 0
+        }
+    
+    @property
+    def pending(self) -> int:
+        """
+        完了していない呼び出し数(実行中・再試行待ちを含む)
+        
+        Returns:
+            int: 完了していない呼び出し数
+        """
+        return self._pending
+    
+    def submit(self, bucket: str, factory, priority: int = PRIORITY_NORMAL, idempotent: bool = True) -> asyncio.Future:
+        """
+        呼び出しをキューに追加する
+        実行タスクが動いていない(start()の前・stop()の後)場合は、キューを通さずにその場で実行します
+        
+        Args:
+            bucket: レート制限のバケット名(例: "channel:<チャンネルID>")
+            factory: 呼び出しのコルーチンを作る引数なしの関数(再試行のたびに呼ばれます)
+            priority: 優先度(PRIORITY_INTERACTIVE / PRIORITY_NORMAL / PRIORITY_BACKGROUND)
+            idempotent: 繰り返しても結果が変わらない呼び出しか(送信などFalseの場合、反映済みの可能性があるエラーでは再試行しない)
+        
+        Returns:
+            asyncio.Future: 呼び出しの結果
+        """
+        if self._task is None:
+            return asyncio.ensure_future(factory())
+        
+        future = asyncio.get_running_loop().create_future()
+        self._sequence += 1
+        job = _Job(bucket, factory, priority, self._sequence, future, idempotent)
+        self._pending += 1
+        self.stats['submitted'] += 1
+        
+        # 同じバケットの呼び出しが実行中・待機中の場合は順番待ちにする
+        waiting = self._buckets.get(bucket)
+        if waiting is not None:
+            heapq.heappush(waiting, job)
+        else:
+            self._buckets[bucket] = []
+            heapq.heappush(self._ready, job)
+            self._wakeup.set()
+        
+        return future
+    
+    async def run(self, bucket: str, factory, priority: int = PRIORITY_NORMAL, idempotent: bool = True):
+        """
+        呼び出しをキューに追加し、完了を待つ
+        
+        Args:
+            bucket: レート制限のバケット名
+            factory: 呼び出しのコルーチンを作る引数なしの関数
+            priority: 優先度
+            idempotent: 繰り返しても結果が変わらない呼び出しか
+        
+        Returns:
+            呼び出しの戻り値
+        """
+        return await self.submit(bucket, factory, priority, idempotent)
+    
+    async def send(self, channel, priority: int = PRIORITY_NORMAL, **kwargs) -> discord.Message:
+        """
+        チャンネルにメッセージを送信する
+        送信済みの可能性があるエラー(タイムアウトなど)では、重複を避けるため再試行しません
+        
+        Args:
+            channel: 送信先(TextChannel・Member・Userなど)
+            priority: 優先度
+            **kwargs: send()の引数
+        
+        Returns:
+            discord.Message: 送信したメッセージ
+        """
+        return await self.run(_channel_bucket(channel), lambda: channel.send(**kwargs), priority, idempotent=False)
+    
+    async def add_reactions(self, message: discord.Message, emojis: list, priority: int = PRIORITY_NORMAL) -> list:
+        """
+        メッセージに複数のリアクションを順番に追加する
+        
+        Args:
+            message: 対象メッセージ
+            emojis: 追加する絵文字のリスト
+            priority: 優先度
+        
+        Returns:
+            list: 追加に失敗した(絵文字, 例外)のリスト
+        """
+        bucket = f'reaction:{message.channel.id}'
+        results = await asyncio.gather(
+            *(self.run(bucket, lambda emoji=emoji: message.add_reaction(emoji), priority) for emoji in emojis),
+            return_exceptions=True
+        )
+        return [(emoji, result) for emoji, result in zip(emojis, results) if isinstance(result, Exception)]
+    
+    async def delete_message_ids(self, channel, message_ids: list, priority: int = PRIORITY_NORMAL) -> list:
+        """
+        チャンネルのメッセージをIDで削除する(メッセージの取得は行いません)
+        メッセージの管理権限がある場合、作成から14日以内のメッセージは最大100件ずつ一括削除します
+        権限が無い場合はdiscord.Forbiddenを送出します
+        
+        Args:
+            channel: メッセージがあるチャンネル
+            message_ids: 削除するメッセージIDのリスト
+            priority: 優先度
+        
+        Returns:
+            list: 削除した(または既に削除されていた)メッセージIDのリスト
+        """
+        bulk_ids = []
+        if channel.permissions_for(channel.guild.me).manage_messages:
+            threshold = discord.utils.utcnow() - BULK_DELETE_MAX_AGE
+            bulk_ids = [message_id for message_id in message_ids if discord.utils.snowflake_time(message_id) > threshold]
+        
+        # 一括削除は2件以上の場合のみ(1件の場合は通常の削除になる)
+        groups = []
+        if len(bulk_ids) >= 2:
+            for start in range(0, len(bulk_ids), BULK_DELETE_LIMIT):
+                groups.append(bulk_ids[start:start + BULK_DELETE_LIMIT])
+        else:
+            bulk_ids = []
+        bulk_set = set(bulk_ids)
+        groups.extend([message_id] for message_id in message_ids if message_id not in bulk_set)
+        
+        bucket = f'channel:{channel.id}'
+        calls = []
+        for group in groups:
+            if len(group) > 1:
+                factory = functools.partial(channel.delete_messages, [discord.Object(id=message_id) for message_id in group])
+            else:
+                factory = channel.get_partial_message(group[0]).delete
+            calls.append(self.run(bucket, factory, priority))
+        results = await asyncio.gather(*calls, return_exceptions=True)
+        
+        deleted = []
+        for group, result in zip(groups, results):
+            if isinstance(result, discord.Forbidden):
+                raise result
+            if isinstance(result, Exception) and not isinstance(result, discord.NotFound):
+                logger.warning(f'メッセージ削除失敗: {result}')
+                continue
+            deleted.extend(group)
+        return deleted
+    
+    def _can_start(self) -> bool:
+        """
+        次の呼び出しを開始できるか判定する内部関数
+        
+        Returns:
+            bool: 開始できる場合True
+        """
+        if not self._ready or self._running >= self.max_concurrency:
+            return False
+        # ヒープの先頭がバックグラウンドなら、それより優先度の高い呼び出しは無い
+        if self._ready[0].priority >= PRIORITY_BACKGROUND:
+            return self._running_background < self.max_concurrency - 1
+        return True
+    
+    async def _run(self):
+        """
+        キューから呼び出しを取り出して実行するバックグラウンドタスク
+        """
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            
+            while self._can_start():
+                job = heapq.heappop(self._ready)
+                if job.future.done():
+                    # 呼び出し元でキャンセル済み
+                    self._finish(job)
+                    continue
+                
+                self._running += 1
+                if job.priority >= PRIORITY_BACKGROUND:
+                    self._running_background += 1
+                task = asyncio.create_task(self._execute(job), context=job.context)
+                self._executing.add(task)
+                task.add_done_callback(self._executing.discard)
+    
+    async def _execute(self, job: _Job):
+        """
+        呼び出しを1件実行する内部関数
+        
+        Args:
+            job: 実行する呼び出し
+        """
+        try:
+            result = await job.factory()
+        except Exception as e:
+            delay = self._retry_delay(e, job.attempts, job.idempotent)
+            if delay is not None and not job.future.done():
+                # バケットは押さえたまま、待ち時間の後に再投入する
+                job.attempts += 1
+                self.stats['retries'] += 1
+                logger.warning(f'REST呼び出しを{delay:.1f}秒後に再試行します ({job.bucket}): {e}')
+                asyncio.get_running_loop().call_later(delay, self._requeue, job)
+            else:
+                self.stats['failed'] += 1
+                if not job.future.done():
+                    job.future.set_exception(e)
+                self._finish(job)
+        else:
+            self.stats['completed'] += 1
+            if not job.future.done():
+                job.future.set_result(result)
+            self._finish(job)
+        finally:
+            self._running -= 1
+            if job.priority >= PRIORITY_BACKGROUND:
+                self._running_background -= 1
+            self._wakeup.set()
+    
+    def _retry_delay(self, error: Exception, attempts: int, idempotent: bool = True):
+        """
+        再試行までの待ち時間を決める内部関数
+        discord.pyが429・5xxを既に再試行しているため、ここでは反映されていないことが確実なエラーと、
+        冪等な呼び出しの通信エラーのみを再試行します
+        
+        Args:
+            error: 発生した例外
+            attempts: これまでの再試行回数
+            idempotent: 繰り返しても結果が変わらない呼び出しか
+        
+        Returns:
+            float: 待ち時間(再試行しない場合None)
+        """
+        if attempts >= self.max_retries:
+            return None
+        
+        if isinstance(error, discord.RateLimited):
+            return error.retry_after
+        
+        if isinstance(error, discord.HTTPException):
+            # レート制限で拒否された呼び出しは反映されていない(5xxはdiscord.pyの再試行後のため再試行しない)
+            transient = error.status == 429
+        elif isinstance(error, aiohttp.ClientConnectorError):
+            # 接続できなかった呼び出しは送信されていない
+            transient = True
+        else:
+            # タイムアウト・切断は反映済みの可能性があるため、冪等な呼び出しのみ再試行する
+            transient = idempotent and isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError, OSError))
+        if not transient:
+            return None
+        
+        # 指数バックオフ(同時に失敗した呼び出しがずれるよう揺らぎを加える)
+        return self.backoff * (2 ** attempts) * random.uniform(0.8, 1.2)
+    
+    def _requeue(self, job: _Job):
+        """
+        再試行待ちの呼び出しをキューに戻す内部関数
+        
+        Args:
+            job: 再試行する呼び出し
+        """
+        if self._task is None:
+            # 待っている間に停止した
+            job.future.cancel()
+            self._finish(job)
+            return
+        heapq.heappush(self._ready, job)
+        self._wakeup.set()
+    
+    def _finish(self, job: _Job):
+        """
+        呼び出しの完了後、同じバケットの次の呼び出しを実行可能にする内部関数
+        
+        Args:
+            job: 完了した呼び出し
+        """
+        self._pending -= 1
+        waiting = self._buckets.get(job.bucket)
+        if waiting:
+            heapq.heappush(self._ready, heapq.heappop(waiting))
+            self._wakeup.set()
+        else:
+            self._buckets.pop(job.bucket, None)
+    
+    def start(self):
+        """
+        バックグラウンドの実行タスクを開始する
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self, timeout: float = 10.0):
+        """
+        キューに残っている呼び出しの完了を待ってから実行タスクを停止する
+        
+        Args:
+            timeout: 完了を待つ最大秒数
+        """
+        if self._task is None:
+            return
+        
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self._pending and loop.time() < deadline:
+            await asyncio.sleep(0.1)
+        if self._pending:
+            logger.warning(f'{self._pending}件のREST呼び出しが完了しないまま停止しました')
+        
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        
+        # 開始されなかった呼び出しは、待っている呼び出し元が止まらないようキャンセルする
+        # (実行中の呼び出しはそのまま完了させる)
+        abandoned = self._ready + [job for waiting in self._buckets.values() for job in waiting]
+        self._ready = []
+        for waiting in self._buckets.values():
+            waiting.clear()
+        for job in abandoned:
+            job.future.cancel()
+            self._pending -= 1
+
+
+def _channel_bucket(channel) -> str:
+    """
+    送信先からバケット名を作る内部関数
+    
+    Args:
+        channel: 送信先(TextChannel・Member・Userなど)
+    
+    Returns:
+        str: バケット名
+    """
+    # DMはユーザーごと、それ以外はチャンネルごとにレート制限される
+    if isinstance(channel, (discord.Member, discord.User)):
+        return f'dm:{channel.id}'
+    return f'channel:{channel.id}'
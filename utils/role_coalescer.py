@@ -0,0 +1,182 @@
+"""
+ロール変更まとめ処理ユーティリティ
+短時間に発生したメンバーごとのロール付与/解除をまとめ、1回のmember.editで反映します
+"""
+
+import asyncio
+import functools
+import os
+import time
+import discord
+from utils.logger import get_logger
+from utils.rest_scheduler import PRIORITY_NORMAL
+
+logger = get_logger()
+
+
+class RoleCoalescer:
+    """
+    メンバーごとのロール変更バッファ
+    最初の変更から一定時間内の付与/解除を集め、最終的なロール一覧を1回のREST呼び出しで反映します
+    反映はメンバーごとに1つずつ順番に行い、ロール一覧は反映の直前にキャッシュから取得します
+    """
+    
+    def __init__(self, rest_scheduler, window: float = None):
+        """
+        初期化
+        
+        Args:
+            rest_scheduler: REST送信キュー(RestScheduler)
+            window: 変更をまとめる秒数(省略時は環境変数ROLE_COALESCE_WINDOW、既定値0.5秒)
+        """
+        self.rest_scheduler = rest_scheduler
+        self.window = window or float(os.getenv('ROLE_COALESCE_WINDOW', '0.5'))
+        # (guild_id, member_id) -> {role_id: (付与ならTrue, ロール, 受付時刻)}
+        self._pending = {}
+        # (guild_id, member_id) -> 受け付けた変更の件数
+        self._request_counts = {}
+        # (guild_id, member_id) -> 反映タスク(反映中もメンバーごとに1つだけ実行し、順番を保つ)
+        self._tasks = {}
+        # セットされている間は待機せずに反映する
+        self._flushing = asyncio.Event()
+        
+        # 反映状況のカウンター
+        self.stats = {
+            'requested': 0,
+            'edits': 0,
+            'calls_saved': 0,
+            'errors': 0,
+            'total_latency_ms': 0.0,
+            'max_latency_ms': 0.0
+        }
+    
+    def add(self, member: discord.Member, role: discord.Role):
+        """
+        ロール付与を予約する
+        
+        Args:
+            member: 対象メンバー
+            role: 付与するロール
+        """
+        self._queue(member, role, True)
+    
+    def remove(self, member: discord.Member, role: discord.Role):
+        """
+        ロール解除を予約する
+        
+        Args:
+            member: 対象メンバー
+            role: 解除するロール
+        """
+        self._queue(member, role, False)
+    
+    def _queue(self, member: discord.Member, role: discord.Role, grant: bool):
+        """
+        ロール変更を予約する内部関数
+        同じロールへの変更は後から来たものが優先されます
+        
+        Args:
+            member: 対象メンバー
+            role: 対象ロール
+            grant: 付与ならTrue、解除ならFalse
+        """
+        key = (member.guild.id, member.id)
+        changes = self._pending.setdefault(key, {})
+        changes[role.id] = (grant, role, time.perf_counter())
+        self._request_counts[key] = self._request_counts.get(key, 0) + 1
+        self.stats['requested'] += 1
+        
+        if key not in self._tasks:
+            self._tasks[key] = asyncio.create_task(self._apply_later(member.guild, member.id))
+    
+    async def _apply_later(self, guild: discord.Guild, member_id: int):
+        """
+        一定時間待ってからロール変更を反映する内部関数
+        反映中に受け付けた変更は、反映が終わってから次のまとまりとして反映します
+        
+        Args:
+            guild: サーバー
+            member_id: メンバーID
+        """
+        key = (guild.id, member_id)
+        try:
+            while key in self._pending:
+                try:
+                    await asyncio.wait_for(self._flushing.wait(), timeout=self.window)
+                except asyncio.TimeoutError:
+                    pass
+                await self._apply(guild, member_id)
+        finally:
+            self._tasks.pop(key, None)
+    
+    async def _apply(self, guild: discord.Guild, member_id: int):
+        """
+        予約されたロール変更を1回のmember.editで反映する内部関数
+        同じメンバーの反映は_apply_laterで1つずつ順番に行います
+        
+        Args:
+            guild: サーバー
+            member_id: メンバーID
+        """
+        changes = self._pending.pop((guild.id, member_id), None)
+        requests = self._request_counts.pop((guild.id, member_id), 0)
+        if not changes:
+            return
+        
+        member = guild.get_member(member_id)
+        if member is None:
+            return
+        
+        # 反映直前のロールに変更を適用した最終的なロール一覧を作成(@everyoneは指定できないため除外)
+        roles = {role.id: role for role in member.roles if not role.is_default()}
+        added = []
+        removed = []
+        for role_id, (grant, role, _) in changes.items():
+            if grant and role_id not in roles:
+                roles[role_id] = role
+                added.append(role.name)
+            elif not grant and role_id in roles:
+                del roles[role_id]
+                removed.append(role.name)
+        
+        if added or removed:
+            try:
+                await self.rest_scheduler.run(
+                    f'member:{guild.id}:{member_id}',
+                    functools.partial(member.edit, roles=list(roles.values()), reason="リアクションロール"),
+                    PRIORITY_NORMAL
+                )
+                self.stats['edits'] += 1
+                self.stats['calls_saved'] += requests - 1
+                logger.info(
+                    f'{member.name}のロールを更新しました '
+                    f'(付与: {", ".join(added) or "なし"}, 解除: {", ".join(removed) or "なし"})'
+                )
+            except discord.Forbidden:
+                self.stats['errors'] += 1
+                logger.error(f'ロール変更権限がありません: {member.name}')
+                return
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.error(f'ロール変更エラー: {e}')
+                return
+        else:
+            # 変更が打ち消し合った場合はREST呼び出し自体が不要
+            self.stats['calls_saved'] += requests
+        
+        # 受付から反映までの時間を記録
+        now = time.perf_counter()
+        for _, _, queued_at in changes.values():
+            latency_ms = (now - queued_at) * 1000
+            self.stats['total_latency_ms'] += latency_ms
+            self.stats['max_latency_ms'] = max(self.stats['max_latency_ms'], latency_ms)
+    
+    async def flush(self):
+        """
+        待機中のロール変更をすべて即時に反映し、反映中のものも含めて完了を待つ
+        """
+        self._flushing.set()
+        try:
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        finally:
+            self._flushing.clear()
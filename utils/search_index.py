@@ -0,0 +1,315 @@
+"""
+全文検索ユーティリティ
+クローズ・削除されたチケットのメッセージと通報内容をSQLiteのFTS5で検索できるようにします
+"""
+
+from datetime import datetime
+from utils.logger import get_logger
+
+logger = get_logger()
+
+# trigramトークナイザーで検索できる最小の文字数
+MIN_TERM_LENGTH = 3
+
+# 検索結果の抜粋に含める最大トークン数
+_SNIPPET_TOKENS = 24
+
+# 短い検索語のみで検索した場合に、抜粋として一致箇所の前後に含める文字数
+_EXCERPT_CHARS = 40
+
+
+def build_match_query(query: str) -> str:
+    """
+    入力された文字列をFTS5の検索式にする関数
+    空白で区切った語をそれぞれフレーズとして扱い、すべてを含むものを検索します
+    
+    Args:
+        query: 入力された検索文字列
+    
+    Returns:
+        str: MATCHに渡す検索式(検索できる語が無い場合は空文字)
+    """
+    terms = [term for term in query.split() if len(term) >= MIN_TERM_LENGTH]
+    return ' '.join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def short_terms(query: str) -> list:
+    """
+    全文検索インデックスでは検索できない短い語を取り出す関数
+    これらの語は部分一致(LIKE)で絞り込みます
+    
+    Args:
+        query: 入力された検索文字列
+    
+    Returns:
+        list: MIN_TERM_LENGTH文字未満の語のリスト
+    """
+    return [term for term in query.split() if len(term) < MIN_TERM_LENGTH]
+
+
+def _like_pattern(term: str) -> str:
+    """
+    語を含むものに一致するLIKEのパターンを作る内部関数(ESCAPE '\\' と組み合わせて使う)
+    
+    Args:
+        term: 検索語
+    
+    Returns:
+        str: LIKEのパターン
+    """
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
+
+
+def _excerpt(text: str, term: str) -> str:
+    """
+    短い語で検索した場合の抜粋を作る内部関数(snippetは全文検索の一致箇所しか強調できないため)
+    
+    Args:
+        text: 本文
+        term: 強調する語
+    
+    Returns:
+        str: 一致箇所の前後を含む抜粋
+    """
+    text = text or ''
+    position = text.lower().find(term.lower())
+    if position < 0:
+        return text[:_EXCERPT_CHARS * 2]
+    
+    start = max(0, position - _EXCERPT_CHARS)
+    end = position + len(term)
+    excerpt = f"{text[start:position]}**{text[position:end]}**{text[end:end + _EXCERPT_CHARS]}"
+    return ('…' if start > 0 else '') + excerpt + ('…' if end + _EXCERPT_CHARS < len(text) else '')
+
+
+def _guild_key(guild_id: int) -> str:
+    """
+    チケット検索インデックスでサーバーを表す語を作る内部関数
+    前後を区切ることで、別のサーバーIDの一部に一致しないようにします(マイグレーション14と同じ形式)
+    
+    Args:
+        guild_id: サーバーID
+    
+    Returns:
+        str: サーバーを表す語
+    """
+    return f"g{guild_id}g"
+
+
+def _normalize_ranks(results: list) -> list:
+    """
+    検索結果のbm25スコアを、同じ検索内の最上位を1.0とする相対値にする内部関数
+    チケットと通報は列の重みが異なり、bm25の値をそのまま比較できないため、それぞれで正規化してから並べます
+    
+    Args:
+        results: 関連度順の検索結果の辞書のリスト
+    
+    Returns:
+        list: 'score'(0〜1、大きいほど関連が高い)を追加した検索結果
+    """
+    # bm25は負の値で、小さいほど関連が高い
+    best = results[0]['rank'] if results else 0
+    for result in results:
+        result['score'] = result['rank'] / best if best else 1.0
+    return results
+
+
+def _parse_datetime(value):
+    """
+    データベースから読み込んだ日時をdatetimeにする内部関数
+    
+    Args:
+        value: 日時(文字列・datetime・None)
+    
+    Returns:
+        datetime: 日時(値が無い場合None)
+    """
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+
+class SearchIndex:
+    """
+    チケットと通報の全文検索インデックス
+    チケットはクローズ・削除時に最終的なメッセージ内容で登録し、通報はトリガーで自動的に登録されます
+    """
+    
+    def __init__(self, db, transcripts):
+        """
+        初期化
+        
+        Args:
+            db: 共有Databaseインスタンス
+            transcripts: チケットメッセージの記録先(TicketTranscriptStore)
+        """
+        self.db = db
+        self.transcripts = transcripts
+    
+    async def index_ticket(self, ticket_id: int, title: str = None) -> bool:
+        """
+        チケットのメッセージを検索インデックスに登録する(登録済みの場合は置き換え)
+        登録に失敗してもチケットの操作に影響しないよう、エラーは記録のみ行います
+        
+        Args:
+            ticket_id: チケットID
+            title: 検索結果に表示するタイトル(チャンネル名など)
+        
+        Returns:
+            bool: 登録した場合True
+        """
+        try:
+            row = await self.db.fetchone('''
+                SELECT guild_id, creator_id, closed_at FROM tickets
+                WHERE ticket_id = ?
+            ''', (ticket_id,))
+            if not row:
+                return False
+            guild_id, creator_id, closed_at = row
+            
+            lines = []
+            async for _, author_name, content, attachments, _ in self.transcripts.iter_messages(ticket_id):
+                parts = [content] if content else []
+                parts.extend(filename for filename, _ in attachments)
+                if parts:
+                    lines.append(f"{author_name}: {' '.join(parts)}")
+            
+            async with self.db.transaction('search_index') as connection:
+                await connection.execute('''
+                    DELETE FROM ticket_search
+                    WHERE rowid = ?
+                ''', (ticket_id,))
+                await connection.execute('''
+                    INSERT INTO ticket_search (rowid, title, content, guild_key, creator_id, closed_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (ticket_id, title or f"チケット#{ticket_id}", '\n'.join(lines), _guild_key(guild_id),
+                      creator_id, closed_at or datetime.now()))
+            return True
+        except Exception as e:
+            logger.error(f'チケット#{ticket_id}の検索インデックス登録に失敗しました: {e}')
+            return False
+    
+    async def _search_tickets(self, guild_id: int, match: str, shorts: list, limit: int) -> list:
+        """
+        チケットを検索する内部関数
+        
+        Args:
+            guild_id: サーバーID
+            match: FTS5の検索式(短い語のみの場合は空文字)
+            shorts: 部分一致で絞り込む短い語のリスト
+            limit: 最大件数
+        
+        Returns:
+            list: 検索結果の辞書のリスト(関連度順、同じ場合は新しい順)
+        """
+        # サーバーの絞り込みもMATCHに含め、検索語はタイトルと本文のみに一致させる
+        expression = f'guild_key : "{_guild_key(guild_id)}"'
+        if match:
+            expression += f' AND {{title content}} : ({match})'
+        
+        # trigramの索引は3文字未満のLIKEを扱えないため、+を付けて各行の値で比較させる
+        conditions = ''
+        params = [expression]
+        for term in shorts:
+            conditions += " AND (+title LIKE ? ESCAPE '\\' OR +content LIKE ? ESCAPE '\\')"
+            params += [_like_pattern(term)] * 2
+        
+        # 短い語のみの場合はsnippetで強調できないため、本文から抜粋を作る
+        snippet = f"snippet(ticket_search, 1, '**', '**', '…', {_SNIPPET_TOKENS})" if match else 'content'
+        rows = await self.db.fetchall(f'''
+            SELECT rowid, title, {snippet}, creator_id, closed_at, rank
+            FROM ticket_search
+            WHERE ticket_search MATCH ?{conditions}
+            ORDER BY rank, closed_at DESC
+            LIMIT ?
+        ''', (*params, limit))
+        return [
+            {
+                'source': 'ticket',
+                'id': ticket_id,
+                'title': title,
+                'snippet': snippet if match else _excerpt(snippet, shorts[0]),
+                'user_id': creator_id,
+                'timestamp': _parse_datetime(closed_at),
+                'rank': rank
+            }
+            for ticket_id, title, snippet, creator_id, closed_at, rank in rows
+        ]
+    
+    async def _search_reports(self, guild_id: int, match: str, shorts: list, limit: int) -> list:
+        """
+        通報を検索する内部関数
+        
+        Args:
+            guild_id: サーバーID
+            match: FTS5の検索式(短い語のみの場合は空文字)
+            shorts: 部分一致で絞り込む短い語のリスト
+            limit: 最大件数
+        
+        Returns:
+            list: 検索結果の辞書のリスト(関連度順、同じ場合は新しい順)
+        """
+        conditions = ''
+        params = []
+        for term in shorts:
+            conditions += " AND r.content LIKE ? ESCAPE '\\'"
+            params.append(_like_pattern(term))
+        
+        if match:
+            rows = await self.db.fetchall(f'''
+                SELECT r.report_id, r.target_type, snippet(report_search, 0, '**', '**', '…', {_SNIPPET_TOKENS}),
+                       r.reporter_id, r.created_at, report_search.rank
+                FROM report_search
+                JOIN reports r ON r.report_id = report_search.rowid
+                WHERE report_search MATCH ? AND r.guild_id = ?{conditions}
+                ORDER BY report_search.rank
+                LIMIT ?
+            ''', (match, guild_id, *params, limit))
+        else:
+            # 短い語のみの場合は全文検索を使わず、サーバーの通報を部分一致で絞り込む
+            rows = await self.db.fetchall(f'''
+                SELECT r.report_id, r.target_type, r.content, r.reporter_id, r.created_at, 0
+                FROM reports r
+                WHERE r.guild_id = ?{conditions}
+                ORDER BY r.created_at DESC
+                LIMIT ?
+            ''', (guild_id, *params, limit))
+        return [
+            {
+                'source': 'report',
+                'id': report_id,
+                'title': f"通報#{report_id} ({target_type})",
+                'snippet': snippet if match else _excerpt(snippet, shorts[0]),
+                'user_id': reporter_id,
+                'timestamp': _parse_datetime(created_at),
+                'rank': rank
+            }
+            for report_id, target_type, snippet, reporter_id, created_at, rank in rows
+        ]
+    
+    async def search(self, guild_id: int, query: str, offset: int = 0, limit: int = 5) -> tuple:
+        """
+        チケットと通報を関連度順に検索する
+        
+        Args:
+            guild_id: サーバーID
+            query: 検索文字列(空白区切りの語をすべて含むものを検索、短い語は部分一致で検索)
+            offset: 読み飛ばす件数
+            limit: 取得する件数
+        
+        Returns:
+            tuple: (検索結果の辞書のリスト, 次のページがある場合True)
+        """
+        match = build_match_query(query)
+        shorts = short_terms(query)
+        if not match and not shorts:
+            return [], False
+        
+        # 両方から上位を取得し、それぞれで正規化した関連度で並べ替える(同じ場合は新しい順)
+        needed = offset + limit + 1
+        results = _normalize_ranks(await self._search_tickets(guild_id, match, shorts, needed))
+        results += _normalize_ranks(await self._search_reports(guild_id, match, shorts, needed))
+        results.sort(key=lambda result: (result['score'], result['timestamp'] or datetime.min), reverse=True)
+        
+        return results[offset:offset + limit], len(results) > offset + limit
@@ -0,0 +1,226 @@
+"""
+チケット作成キャッシュユーティリティ
+チケットカテゴリと権限設定のテンプレートをサーバーごとに保持し、チケット作成時のチャンネル・ロールの走査を不要にします
+"""
+
+import discord
+from utils.logger import get_logger
+
+logger = get_logger()
+
+# チケットチャンネルを作成するカテゴリ名
+TICKET_CATEGORY_NAME = "Tickets"
+
+
+class TicketCache:
+    """
+    チケット作成用のキャッシュ
+    管理者ロールの一覧はロールの作成・更新・削除イベントで最新の状態に保ちます
+    """
+    
+    def __init__(self, bot, db):
+        """
+        初期化
+        
+        Args:
+            bot: Botインスタンス
+            db: 共有Databaseインスタンス
+        """
+        self.bot = bot
+        self.db = db
+        # guild_id -> チケットカテゴリのID
+        self._categories = {}
+        # guild_id -> 管理者権限を持つロールIDの集合
+        self._admin_roles = {}
+        # 作成処理中の(guild_id, user_id)
+        self._creating = set()
+    
+    def __len__(self) -> int:
+        """
+        テンプレートを保持しているサーバー数
+        
+        Returns:
+            int: サーバー数
+        """
+        return len(self._admin_roles)
+    
+    async def find_open_ticket(self, guild: discord.Guild, creator_id: int):
+        """
+        ユーザーのオープンなチケットのチャンネルを取得する
+        (tickets (guild_id, creator_id, status) のインデックスで検索します)
+        
+        Args:
+            guild: サーバー
+            creator_id: チケット作成者のID
+        
+        Returns:
+            discord.TextChannel: チケットチャンネル(オープンなチケットが無い場合None)
+        """
+        rows = await self.db.fetchall('''
+            SELECT channel_id FROM tickets
+            WHERE guild_id = ? AND creator_id = ? AND status = 'open'
+        ''', (guild.id, creator_id))
+        
+        for (channel_id,) in rows:
+            # チャンネルが手動で削除されたチケットは数えない
+            channel = guild.get_channel(channel_id)
+            if channel is not None:
+                return channel
+        return None
+    
+    def begin_creation(self, guild_id: int, user_id: int) -> bool:
+        """
+        チケット作成を開始する(ボタンの連打による二重作成を防ぐ)
+        
+        Args:
+            guild_id: サーバーID
+            user_id: チケット作成者のID
+        
+        Returns:
+            bool: 開始できた場合True(既に作成中の場合False)
+        """
+        key = (guild_id, user_id)
+        if key in self._creating:
+            return False
+        self._creating.add(key)
+        return True
+    
+    def end_creation(self, guild_id: int, user_id: int):
+        """
+        チケット作成を終了する
+        
+        Args:
+            guild_id: サーバーID
+            user_id: チケット作成者のID
+        """
+        self._creating.discard((guild_id, user_id))
+    
+    async def get_category(self, guild: discord.Guild) -> discord.CategoryChannel:
+        """
+        チケットカテゴリを取得する(存在しない場合は作成)
+        
+        Args:
+            guild: サーバー
+        
+        Returns:
+            discord.CategoryChannel: チケットカテゴリ
+        """
+        category_id = self._categories.get(guild.id)
+        category = guild.get_channel(category_id) if category_id else None
+        if category is None:
+            category = discord.utils.get(guild.categories, name=TICKET_CATEGORY_NAME)
+            if category is None:
+                category = await guild.create_category(TICKET_CATEGORY_NAME)
+            self._categories[guild.id] = category.id
+        return category
+    
+    def _get_admin_roles(self, guild: discord.Guild) -> set:
+        """
+        管理者権限を持つロールIDを取得する内部関数(初回のみロールを走査)
+        
+        Args:
+            guild: サーバー
+        
+        Returns:
+            set: ロールIDの集合
+        """
+        admin_roles = self._admin_roles.get(guild.id)
+        if admin_roles is None:
+            admin_roles = {role.id for role in guild.roles if role.permissions.administrator}
+            self._admin_roles[guild.id] = admin_roles
+        return admin_roles
+    
+    def build_overwrites(self, guild: discord.Guild, creator: discord.Member) -> dict:
+        """
+        チケットチャンネルの権限設定を作る
+        
+        Args:
+            guild: サーバー
+            creator: チケット作成者
+        
+        Returns:
+            dict: create_text_channelに渡す権限設定
+        """
+        overwrites = {
+            guild.default_role: discord.PermissionOverwrite(read_messages=False),
+            creator: discord.PermissionOverwrite(
+                read_messages=True,
+                send_messages=True,
+                attach_files=True,
+                embed_links=True
+            ),
+            guild.me: discord.PermissionOverwrite(
+                read_messages=True,
+                send_messages=True,
+                manage_channels=True
+            )
+        }
+        
+        # 管理者ロールに権限を追加
+        for role_id in self._get_admin_roles(guild):
+            role = guild.get_role(role_id)
+            if role is not None:
+                overwrites[role] = discord.PermissionOverwrite(
+                    read_messages=True,
+                    send_messages=True,
+                    manage_channels=True
+                )
+        return overwrites
+    
+    async def on_guild_role_create(self, role: discord.Role):
+        """
+        ロール作成イベント
+        
+        Args:
+            role: 作成されたロール
+        """
+        admin_roles = self._admin_roles.get(role.guild.id)
+        if admin_roles is not None and role.permissions.administrator:
+            admin_roles.add(role.id)
+    
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role):
+        """
+        ロール更新イベント
+        
+        Args:
+            before: 更新前のロール
+            after: 更新後のロール
+        """
+        admin_roles = self._admin_roles.get(after.guild.id)
+        if admin_roles is None:
+            return
+        if after.permissions.administrator:
+            admin_roles.add(after.id)
+        else:
+            admin_roles.discard(after.id)
+    
+    async def on_guild_role_delete(self, role: discord.Role):
+        """
+        ロール削除イベント
+        
+        Args:
+            role: 削除されたロール
+        """
+        admin_roles = self._admin_roles.get(role.guild.id)
+        if admin_roles is not None:
+            admin_roles.discard(role.id)
+    
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
+        """
+        チャンネル削除イベント(チケットカテゴリが削除された場合にキャッシュを破棄)
+        
+        Args:
+            channel: 削除されたチャンネル
+        """
+        if self._categories.get(channel.guild.id) == channel.id:
+            del self._categories[channel.guild.id]
+    
+    async def on_guild_remove(self, guild: discord.Guild):
+        """
+        サーバーから退出した際のイベント
+        
+        Args:
+            guild: サーバー
+        """
+        self._categories.pop(guild.id, None)
+        self._admin_roles.pop(guild.id, None)
@@ -0,0 +1,157 @@
+"""
+チケット自動削除ユーティリティ
+クローズしたチケットの削除を遅延ジョブとして登録し、期限が来たらチャンネルとデータベースの記録を削除します
+"""
+
+import functools
+import os
+from datetime import datetime, timedelta
+import discord
+from utils.logger import get_logger
+from utils.rest_scheduler import PRIORITY_BACKGROUND
+
+logger = get_logger()
+
+# チケット自動削除ジョブの種類
+TICKET_DELETE_JOB = 'ticket_delete'
+
+
+def ticket_delete_delay() -> timedelta:
+    """
+    クローズから自動削除までの期間を取得する関数
+    
+    Returns:
+        timedelta: 期間(環境変数TICKET_DELETE_AFTER_DAYS、既定値7日)
+    """
+    return timedelta(days=float(os.getenv('TICKET_DELETE_AFTER_DAYS', '7')))
+
+
+async def schedule_ticket_deletion(bot, guild_id: int, channel_id: int, closed_at: datetime) -> bool:
+    """
+    クローズしたチケットの自動削除を登録する関数
+    
+    Args:
+        bot: Botインスタンス
+        guild_id: サーバーID
+        channel_id: チケットチャンネルのID
+        closed_at: クローズした日時
+    
+    Returns:
+        bool: 登録した場合True
+    """
+    return await bot.job_scheduler.schedule(
+        TICKET_DELETE_JOB,
+        closed_at + ticket_delete_delay(),
+        {'guild_id': guild_id, 'channel_id': channel_id},
+        key=str(channel_id)
+    )
+
+
+async def cancel_ticket_deletion(bot, channel_id: int) -> bool:
+    """
+    チケットの自動削除を取り消す関数(手動で削除した場合など)
+    
+    Args:
+        bot: Botインスタンス
+        channel_id: チケットチャンネルのID
+    
+    Returns:
+        bool: 取り消した場合True
+    """
+    return await bot.job_scheduler.cancel(TICKET_DELETE_JOB, str(channel_id))
+
+
+async def delete_expired_ticket(bot, payload: dict):
+    """
+    自動削除ジョブの処理関数
+    チケットが既に削除されている・クローズされていない場合は何もしません
+    
+    Args:
+        bot: Botインスタンス
+        payload: ジョブの引数(guild_id, channel_id)
+    """
+    guild_id = payload['guild_id']
+    channel_id = payload['channel_id']
+    
+    row = await bot.db.fetchone('''
+        SELECT ticket_id, status FROM tickets
+        WHERE channel_id = ? AND guild_id = ?
+    ''', (channel_id, guild_id))
+    if not row or row[1] != 'closed':
+        return
+    ticket_id = row[0]
+    
+    # キャッシュに無い場合はAPIで確認し、チャンネルが削除済み(NotFound)の場合のみ記録だけを削除する
+    # (それ以外のエラーはチケットを残したままジョブを再試行する)
+    channel = bot.get_channel(channel_id)
+    if channel is None:
+        try:
+            channel = await bot.fetch_channel(channel_id)
+        except discord.NotFound:
+            channel = None
+    
+    if channel is not None:
+        try:
+            await bot.rest_scheduler.run(
+                f'channels:{guild_id}',
+                lambda: channel.delete(reason="チケット自動削除: クローズから期間が経過しました"),
+                PRIORITY_BACKGROUND
+            )
+        except discord.NotFound:
+            pass
+    
+    # 削除後も検索できるよう、最終的な内容で検索インデックスに登録
+    await bot.search_index.index_ticket(ticket_id, channel.name if channel is not None else None)
+    
+    await bot.db.execute('''
+        DELETE FROM tickets
+        WHERE ticket_id = ?
+    ''', (ticket_id,))
+    bot.ticket_transcripts.untrack(channel_id)
+    
+    logger.info(f'チケット#{ticket_id}(チャンネルID: {channel_id})を自動削除しました')
+
+
+async def backfill_ticket_deletions(bot) -> int:
+    """
+    自動削除ジョブが登録されていないクローズ済みチケットに自動削除を登録する関数
+    (自動削除の導入前にクローズされたチケットなど。ジョブスケジューラーの起動時に実行されます)
+    
+    Args:
+        bot: Botインスタンス
+    
+    Returns:
+        int: 登録したジョブ数
+    """
+    rows = await bot.db.fetchall('''
+        SELECT t.guild_id, t.channel_id, t.closed_at
+        FROM tickets t
+        WHERE t.status = 'closed'
+          AND NOT EXISTS (
+              SELECT 1 FROM scheduled_jobs j
+              WHERE j.kind = ? AND j.job_key = CAST(t.channel_id AS TEXT)
+                AND j.status IN ('pending', 'running', 'failed')
+          )
+    ''', (TICKET_DELETE_JOB,))
+    
+    scheduled = 0
+    for guild_id, channel_id, closed_at in rows:
+        if isinstance(closed_at, str):
+            closed_at = datetime.fromisoformat(closed_at)
+        if await schedule_ticket_deletion(bot, guild_id, channel_id, closed_at or datetime.now()):
+            scheduled += 1
+    
+    if scheduled:
+        logger.info(f'クローズ済みの{scheduled}件のチケットに自動削除を登録しました')
+    return scheduled
+
+
+def register_ticket_cleanup(bot):
+    """
+    自動削除ジョブの処理関数と起動時の登録処理をスケジューラーに登録する関数
+    
+    Args:
+        bot: Botインスタンス
+    """
+    bot.job_scheduler.register(TICKET_DELETE_JOB, functools.partial(delete_expired_ticket, bot))
+    bot.job_scheduler.on_startup(functools.partial(backfill_ticket_deletions, bot))
@@ -0,0 +1,341 @@
+"""
+チケットメッセージ記録ユーティリティ
+チケットチャンネルのメッセージ・編集・削除をon_messageから追記で記録し、ログ生成時の履歴取得を不要にします
+"""
+
+import asyncio
+import json
+import os
+from datetime import datetime
+import discord
+from utils.logger import get_logger
+
+logger = get_logger()
+
+# ログ生成時に1回で読み込むメッセージ数
+_READ_BATCH_SIZE = 500
+
+
+class TicketTranscriptStore:
+    """
+    チケットメッセージの記録先
+    記録はメモリ上に貯め、一定時間または一定件数でまとめてデータベースに追記します
+    """
+    
+    def __init__(self, db, flush_interval: float = None, max_pending: int = None):
+        """
+        初期化
+        
+        Args:
+            db: 共有Databaseインスタンス
+            flush_interval: 書き込みまでの最大遅延秒数(省略時は環境変数TRANSCRIPT_FLUSH_INTERVAL、既定値2秒)
+            max_pending: 即時書き込みを行う未書き込み件数(省略時は環境変数TRANSCRIPT_MAX_PENDING、既定値200)
+        """
+        self.db = db
+        self.flush_interval = flush_interval or float(os.getenv('TRANSCRIPT_FLUSH_INTERVAL', '2'))
+        self.max_pending = max_pending or int(os.getenv('TRANSCRIPT_MAX_PENDING', '200'))
+        # channel_id -> ticket_id
+        self._channels = {}
+        # 作成時から記録しているチケット(履歴を取得せずにログを生成できる)
+        self._complete = set()
+        self._pending = []
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._stopping = False
+    
+    @property
+    def pending(self) -> int:
+        """
+        未書き込みの記録数
+        
+        Returns:
+            int: 未書き込みの記録数
+        """
+        return len(self._pending)
+    
+    def __len__(self) -> int:
+        """
+        記録対象のチケットチャンネル数
+        
+        Returns:
+            int: チャンネル数
+        """
+        return len(self._channels)
+    
+    async def load(self):
+        """
+        記録対象のチケットチャンネルをデータベースから読み込む
+        """
+        rows = await self.db.fetchall('''
+            SELECT channel_id, ticket_id, transcript_captured FROM tickets
+        ''')
+        self._channels = {channel_id: ticket_id for channel_id, ticket_id, _ in rows}
+        self._complete = {ticket_id for _, ticket_id, captured in rows if captured}
+        logger.info(f'{len(self._channels)}件のチケットチャンネルを記録対象に読み込みました')
+    
+    def track(self, channel_id: int, ticket_id: int, complete: bool = True):
+        """
+        チケットチャンネルを記録対象に追加する
+        
+        Args:
+            channel_id: チャンネルID
+            ticket_id: チケットID
+            complete: 作成時から記録している場合True
+        """
+        self._channels[channel_id] = ticket_id
+        if complete:
+            self._complete.add(ticket_id)
+    
+    def untrack(self, channel_id: int):
+        """
+        チケットチャンネルを記録対象から外す(記録済みのメッセージは残ります)
+        
+        Args:
+            channel_id: チャンネルID
+        """
+        self._channels.pop(channel_id, None)
+    
+    def ticket_id(self, channel_id: int):
+        """
+        チャンネルのチケットIDを取得する
+        
+        Args:
+            channel_id: チャンネルID
+        
+        Returns:
+            int: チケットID(チケットチャンネルでない場合None)
+        """
+        return self._channels.get(channel_id)
+    
+    def is_complete(self, ticket_id: int) -> bool:
+        """
+        チケットの全メッセージを記録しているか
+        
+        Args:
+            ticket_id: チケットID
+        
+        Returns:
+            bool: 作成時から記録している場合True
+        """
+        return ticket_id in self._complete
+    
+    def _append(self, ticket_id: int, message_id: int, event: str, author_id: int = None, author_name: str = None,
+                content: str = None, attachments: list = None, created_at: datetime = None):
+        """
+        記録を1件追加する内部関数
+        
+        Args:
+            ticket_id: チケットID
+            message_id: メッセージID
+            event: 'create' / 'edit' / 'delete'
+            author_id: 送信者ID
+            author_name: 送信者名
+            content: メッセージ内容
+            attachments: 添付ファイルの[ファイル名, URL]のリスト
+            created_at: 日時
+        """
+        self._pending.append((
+            ticket_id,
+            message_id,
+            event,
+            author_id,
+            author_name,
+            content,
+            json.dumps(attachments, ensure_ascii=False) if attachments else None,
+            created_at or datetime.now()
+        ))
+        
+        # 件数が上限に達したら書き込みタスクを起こす
+        if len(self._pending) >= self.max_pending:
+            self._wakeup.set()
+    
+    def capture(self, message: discord.Message):
+        """
+        チケットチャンネルのメッセージを記録する(on_messageから呼ばれます、DBアクセスなし)
+        
+        Args:
+            message: メッセージ
+        """
+        ticket_id = self._channels.get(message.channel.id)
+        if ticket_id is None:
+            return
+        
+        self._append(
+            ticket_id,
+            message.id,
+            'create',
+            message.author.id,
+            f"{message.author.name}#{message.author.discriminator}",
+            message.content,
+            [[attachment.filename, attachment.url] for attachment in message.attachments],
+            message.created_at
+        )
+    
+    async def on_raw_message_edit(self, payload: discord.RawMessageUpdateEvent):
+        """
+        メッセージ編集イベント(キャッシュの有無に関係なく受け取る)
+        
+        Args:
+            payload: イベントデータ
+        """
+        ticket_id = self._channels.get(payload.channel_id)
+        if ticket_id is None:
+            return
+        
+        # リンクの埋め込み展開など、本文が編集されていない更新は記録しない
+        data = payload.data
+        if 'content' not in data or not data.get('edited_timestamp'):
+            return
+        
+        attachments = [[attachment['filename'], attachment['url']] for attachment in data.get('attachments', [])]
+        self._append(ticket_id, payload.message_id, 'edit', content=data['content'], attachments=attachments)
+    
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        """
+        メッセージ削除イベント(キャッシュの有無に関係なく受け取る)
+        
+        Args:
+            payload: イベントデータ
+        """
+        ticket_id = self._channels.get(payload.channel_id)
+        if ticket_id is not None:
+            self._append(ticket_id, payload.message_id, 'delete')
+    
+    async def on_raw_bulk_message_delete(self, payload: discord.RawBulkMessageDeleteEvent):
+        """
+        メッセージ一括削除イベント
+        
+        Args:
+            payload: イベントデータ
+        """
+        ticket_id = self._channels.get(payload.channel_id)
+        if ticket_id is not None:
+            for message_id in payload.message_ids:
+                self._append(ticket_id, message_id, 'delete')
+    
+    async def flush(self):
+        """
+        未書き込みの記録をまとめて書き込む
+        """
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            
+            # 書き込み中に追加された記録は次回に回す
+            pending, self._pending = self._pending, []
+            try:
+                await self.db.executemany('''
+                    INSERT INTO ticket_transcript_events
+                    (ticket_id, message_id, event, author_id, author_name, content, attachments, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', pending)
+            except Exception as e:
+                # 失敗した記録は次回の書き込みで再試行する
+                self._pending = pending + self._pending
+                logger.error(f'チケットメッセージの書き込みに失敗しました: {e}')
+    
+    async def iter_messages(self, ticket_id: int):
+        """
+        記録済みのメッセージを最終的な内容で順番に取得する
+        (未書き込みの記録は先に書き込みます)
+        
+        Args:
+            ticket_id: チケットID
+        
+        Yields:
+            tuple: (日時, 送信者名, 内容, 添付ファイルの[ファイル名, URL]のリスト, 補足)
+        """
+        await self.flush()
+        
+        last_id = 0
+        while True:
+            rows = await self.db.fetchall('''
+                SELECT
+                    c.id,
+                    c.created_at,
+                    c.author_name,
+                    COALESCE((
+                        SELECT e.content FROM ticket_transcript_events e
+                        WHERE e.ticket_id = c.ticket_id AND e.message_id = c.message_id AND e.event = 'edit'
+                        ORDER BY e.id DESC LIMIT 1
+                    ), c.content),
+                    c.attachments,
+                    EXISTS(
+                        SELECT 1 FROM ticket_transcript_events e
+                        WHERE e.ticket_id = c.ticket_id AND e.message_id = c.message_id AND e.event = 'edit'
+                    ),
+                    EXISTS(
+                        SELECT 1 FROM ticket_transcript_events e
+                        WHERE e.ticket_id = c.ticket_id AND e.message_id = c.message_id AND e.event = 'delete'
+                    )
+                FROM ticket_transcript_events c
+                WHERE c.ticket_id = ? AND c.event = 'create' AND c.id > ?
+                ORDER BY c.id
+                LIMIT ?
+            ''', (ticket_id, last_id, _READ_BATCH_SIZE))
+            
+            for row_id, created_at, author_name, content, attachments, edited, deleted in rows:
+                if isinstance(created_at, str):
+                    created_at = datetime.fromisoformat(created_at)
+                notes = [note for note, flag in (("編集済み", edited), ("削除済み", deleted)) if flag]
+                yield (
+                    created_at,
+                    author_name,
+                    content,
+                    json.loads(attachments) if attachments else [],
+                    "・".join(notes) or None
+                )
+                last_id = row_id
+            
+            if len(rows) < _READ_BATCH_SIZE:
+                return
+    
+    async def write_transcript(self, ticket_id: int, transcript) -> int:
+        """
+        記録済みのメッセージをトランスクリプトに書き込む
+        メッセージは最終的な内容で書き込み、編集・削除されたものには補足を付けます
+        
+        Args:
+            ticket_id: チケットID
+            transcript: 書き込み先のTranscriptWriter
+        
+        Returns:
+            int: 書き込んだメッセージ数
+        """
+        count = 0
+        async for created_at, author_name, content, attachments, note in self.iter_messages(ticket_id):
+            transcript.write_message(created_at, author_name, content, attachments, note)
+            count += 1
+        return count
+    
+    async def _run(self):
+        """
+        定期的に書き込みを行うバックグラウンドタスク
+        """
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+    
+    def start(self):
+        """
+        バックグラウンドの書き込みタスクを開始する
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """
+        書き込みタスクを停止し、残っている記録をすべて書き込む
+        """
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        
+        await self.flush()
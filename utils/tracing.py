@@ -0,0 +1,261 @@
+"""
+トレーシングユーティリティ
+インタラクションごとにスパンを記録し、コマンド内のどの処理(DB・Discord REST)が遅いかを追跡します
+"""
+
+import contextvars
+import heapq
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from utils.logger import get_logger
+
+logger = get_logger()
+
+# 実行中のスパン(asyncioのタスク間でも引き継がれる)
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+
+class Span:
+    """
+    処理1つ分の計測区間
+    """
+    
+    __slots__ = ('name', 'attributes', 'start', 'end', 'children', 'root', 'error')
+    
+    def __init__(self, name: str, attributes: dict = None, root=None):
+        """
+        初期化
+        
+        Args:
+            name: スパン名
+            attributes: 付加情報
+            root: ルートスパン(自身がルートの場合None)
+        """
+        self.name = name
+        self.attributes = attributes or {}
+        self.start = time.perf_counter()
+        self.end = None
+        self.children = []
+        self.root = root or self
+        self.error = None
+    
+    @property
+    def duration_ms(self) -> float:
+        """
+        スパンの所要時間(ミリ秒、終了前は現在までの時間)
+        
+        Returns:
+            float: 所要時間
+        """
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000
+    
+    def format(self, indent: int = 0) -> list:
+        """
+        スパンをツリー形式の文字列にする
+        
+        Args:
+            indent: インデントの深さ
+        
+        Returns:
+            list: 1スパン1行の文字列
+        """
+        offset_ms = (self.start - self.root.start) * 1000
+        attributes = ' '.join(f'{key}={value}' for key, value in self.attributes.items())
+        line = f"{'  ' * indent}{self.name} {self.duration_ms:.1f}ms (+{offset_ms:.1f}ms)"
+        if attributes:
+            line += f' {attributes}'
+        if self.error:
+            line += f' !{self.error}'
+        
+        lines = [line]
+        for child in self.children:
+            lines.extend(child.format(indent + 1))
+        return lines
+
+
+class Tracer:
+    """
+    トレースの記録先
+    直近のトレースをリングバッファに、最も遅いトレースを別枠で保持します
+    """
+    
+    def __init__(self, buffer_size: int = None, keep_slowest: int = None):
+        """
+        初期化
+        
+        Args:
+            buffer_size: 直近のトレースを保持する件数(省略時は環境変数TRACE_BUFFER_SIZE、既定値100)
+            keep_slowest: 最も遅いトレースを保持する件数(省略時は環境変数TRACE_KEEP_SLOWEST、既定値10)
+        """
+        self.buffer_size = buffer_size or int(os.getenv('TRACE_BUFFER_SIZE', '100'))
+        self.keep_slowest = keep_slowest or int(os.getenv('TRACE_KEEP_SLOWEST', '10'))
+        self._recent = deque(maxlen=self.buffer_size)
+        # (所要時間, 連番, ルートスパン)の最小ヒープ
+        self._slowest = []
+        self._sequence = 0
+    
+    @contextmanager
+    def trace(self, name: str, **attributes):
+        """
+        ルートスパンを開始する
+        
+        Args:
+            name: スパン名(コマンド名など)
+            **attributes: 付加情報
+        
+        Yields:
+            Span: ルートスパン
+        """
+        span = Span(name, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            span.end = time.perf_counter()
+            _current_span.reset(token)
+            self._record(span)
+    
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """
+        子スパンを開始する
+        トレース中でない場合は何もしません
+        
+        Args:
+            name: スパン名
+            **attributes: 付加情報
+        
+        Yields:
+            Span: 子スパン(トレース中でない場合None)
+        """
+        parent = _current_span.get()
+        # トレース外、または終了済みのトレースから作られたタスクでは記録しない
+        if parent is None or parent.root.end is not None:
+            yield None
+            return
+        
+        span = Span(name, attributes, parent.root)
+        parent.children.append(span)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            span.end = time.perf_counter()
+            _current_span.reset(token)
+    
+    def current(self):
+        """
+        実行中のスパンを取得する
+        
+        Returns:
+            Span: 実行中のスパン(トレース中でない場合None)
+        """
+        return _current_span.get()
+    
+    def _record(self, span: Span):
+        """
+        終了したトレースを保存する内部関数
+        
+        Args:
+            span: ルートスパン
+        """
+        self._recent.append(span)
+        
+        self._sequence += 1
+        entry = (span.duration_ms, self._sequence, span)
+        if len(self._slowest) < self.keep_slowest:
+            heapq.heappush(self._slowest, entry)
+        elif entry[0] > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, entry)
+    
+    def recent(self, count: int = 5) -> list:
+        """
+        直近のトレースを取得する
+        
+        Args:
+            count: 件数
+        
+        Returns:
+            list: ルートスパンのリスト(新しい順)
+        """
+        return list(reversed(self._recent))[:count]
+    
+    def slowest(self, count: int = 5) -> list:
+        """
+        最も遅いトレースを取得する
+        
+        Args:
+            count: 件数
+        
+        Returns:
+            list: ルートスパンのリスト(遅い順)
+        """
+        return [span for _, _, span in sorted(self._slowest, reverse=True)][:count]
+
+
+# Bot全体で共有するトレーサー
+tracer = Tracer()
+
+
+def _route_name(route) -> str:
+    """
+    スパンに記録するルート名を作る内部関数
+    (パスはトークンを含まないテンプレートのまま記録します)
+    
+    Args:
+        route: discord.pyのRoute
+    
+    Returns:
+        str: "METHOD /path" 形式の文字列
+    """
+    return f"{getattr(route, 'method', '?')} {getattr(route, 'path', '?')}"
+
+
+def install_http_tracing(http_client):
+    """
+    Discord RESTのリクエストごとにスパンを記録する関数
+    Bot用のHTTPクライアントと、インタラクション応答に使われるWebhookアダプターの両方を対象にします
+    
+    Args:
+        http_client: bot.http(discord.http.HTTPClient)
+    """
+    if getattr(http_client, '_tracing_installed', False):
+        return
+    
+    original_request = http_client.request
+    
+    async def request(route, **kwargs):
+        with tracer.span('http', route=_route_name(route)):
+            return await original_request(route, **kwargs)
+    
+    http_client.request = request
+    http_client._tracing_installed = True
+    
+    # interaction.responseやfollowupはWebhookアダプター経由で送信される
+    try:
+        from discord.webhook import async_ as webhook_async
+    except ImportError:
+        logger.warning('Webhookアダプターが見つからないため、インタラクション応答はトレースされません')
+        return
+    
+    adapter_class = webhook_async.AsyncWebhookAdapter
+    if getattr(adapter_class, '_tracing_installed', False):
+        return
+    
+    original_webhook_request = adapter_class.request
+    
+    async def webhook_request(self, route, *args, **kwargs):
+        with tracer.span('http', route=_route_name(route)):
+            return await original_webhook_request(self, route, *args, **kwargs)
+    
+    adapter_class.request = webhook_request
+    adapter_class._tracing_installed = True
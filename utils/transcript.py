@@ -0,0 +1,177 @@
+"""
+チケットログ(トランスクリプト)ユーティリティ
+メッセージを1件ずつgzip圧縮しながら一時ファイルに書き込み、長いチケットでもメモリ使用量を一定に保ちます
+"""
+
+import gzip
+import html
+import os
+import tempfile
+from datetime import datetime
+import discord
+
+# HTML形式のトランスクリプトのヘッダー
+_HTML_HEADER = """<!DOCTYPE html>
+<html lang="ja">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+body {{ font-family: sans-serif; background: #313338; color: #dbdee1; margin: 2em; }}
+.message {{ padding: 4px 0; border-bottom: 1px solid #3f4147; }}
+.time {{ color: #949ba4; font-size: 0.8em; margin-right: 0.5em; }}
+.author {{ font-weight: bold; color: #f2f3f5; }}
+.note {{ color: #949ba4; font-size: 0.8em; margin-left: 0.5em; }}
+.content {{ white-space: pre-wrap; margin-top: 2px; }}
+.attachment a {{ color: #00a8fc; }}
+</style>
+</head>
+<body>
+<h1>{title}</h1>
+"""
+
+_HTML_FOOTER = """<p class="time">{count}件のメッセージ</p>
+</body>
+</html>
+"""
+
+
+class TranscriptWriter:
+    """
+    トランスクリプトの書き込み先
+    小さいうちはメモリ上、一定サイズを超えるとディスク上の一時ファイルに圧縮済みのデータを書き込みます
+    """
+    
+    def __init__(self, title: str, html_format: bool = False, spool_size: int = None):
+        """
+        初期化
+        
+        Args:
+            title: トランスクリプトのタイトル(チャンネル名など)
+            html_format: HTML形式で出力する場合True(Falseの場合はテキスト形式)
+            spool_size: ディスクに書き出すまでのサイズ(省略時は環境変数TRANSCRIPT_SPOOL_BYTES、既定値1MB)
+        """
+        self.title = title
+        self.html_format = html_format
+        self.message_count = 0
+        # 添付ファイル名("ticket_log_<タイトル>_<日時>.txt.gz" 形式)
+        extension = 'html' if html_format else 'txt'
+        self.filename = f"ticket_log_{title}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}.gz"
+        self._file = tempfile.SpooledTemporaryFile(
+            max_size=spool_size or int(os.getenv('TRANSCRIPT_SPOOL_BYTES', str(1024 * 1024)))
+        )
+        self._gzip = gzip.GzipFile(filename=self.filename[:-3], mode='wb', fileobj=self._file)
+        
+        if self.html_format:
+            self._write(_HTML_HEADER.format(title=html.escape(title)))
+    
+    def _write(self, text: str):
+        """
+        文字列を圧縮して書き込む内部関数
+        
+        Args:
+            text: 書き込む文字列
+        """
+        self._gzip.write(text.encode('utf-8'))
+    
+    def write_message(self, created_at: datetime, author: str, content: str, attachments: list = (), note: str = None):
+        """
+        メッセージを1件書き込む
+        
+        Args:
+            created_at: 送信日時
+            author: 送信者名
+            content: メッセージ内容
+            attachments: 添付ファイルの(ファイル名, URL)のリスト
+            note: 補足("編集済み"など)
+        """
+        self.message_count += 1
+        timestamp = created_at.strftime('%Y-%m-%d %H:%M:%S')
+        
+        if self.html_format:
+            parts = [
+                '<div class="message">',
+                f'<span class="time">{timestamp}</span><span class="author">{html.escape(author)}</span>'
+            ]
+            if note:
+                parts.append(f'<span class="note">({html.escape(note)})</span>')
+            if content:
+                parts.append(f'<div class="content">{html.escape(content)}</div>')
+            for filename, url in attachments:
+                parts.append(
+                    f'<div class="attachment">📎 <a href="{html.escape(url, quote=True)}">{html.escape(filename)}</a></div>'
+                )
+            parts.append('</div>\n')
+            self._write(''.join(parts))
+            return
+        
+        if not content and not attachments:
+            content = "[添付ファイルまたはEmbed]"
+        line = f"[{timestamp}] {author}: {content}"
+        if note:
+            line += f" ({note})"
+        lines = [line]
+        for filename, url in attachments:
+            lines.append(f"    📎 {filename}: {url}")
+        self._write("\n".join(lines) + "\n")
+    
+    def add_message(self, message: discord.Message):
+        """
+        Discordのメッセージを1件書き込む
+        
+        Args:
+            message: メッセージ
+        """
+        self.write_message(
+            message.created_at,
+            f"{message.author.name}#{message.author.discriminator}",
+            message.content,
+            [(attachment.filename, attachment.url) for attachment in message.attachments],
+            "編集済み" if message.edited_at else None
+        )
+    
+    def finish(self):
+        """
+        書き込みを終了し、送信用のファイルを返す
+        
+        Returns:
+            先頭にシークした圧縮済みの一時ファイル
+        """
+        if self.html_format:
+            self._write(_HTML_FOOTER.format(count=self.message_count))
+        self._gzip.close()
+        self._file.seek(0)
+        return self._file
+    
+    def to_file(self) -> discord.File:
+        """
+        書き込みを終了し、Discordに添付できるファイルを作る
+        (送信に失敗した場合は再度呼び出すと先頭から送信できます)
+        
+        Returns:
+            discord.File: 添付ファイル
+        """
+        if not self._gzip.closed:
+            self.finish()
+        self._file.seek(0)
+        return discord.File(self._file, filename=self.filename)
+    
+    def close(self):
+        """
+        一時ファイルを削除する
+        """
+        if not self._gzip.closed:
+            self._gzip.close()
+        self._file.close()
+    
+    def __enter__(self):
+        """
+        with文の開始
+        """
+        return self
+    
+    def __exit__(self, *exc_info):
+        """
+        with文の終了時に一時ファイルを削除する
+        """
+        self.close()